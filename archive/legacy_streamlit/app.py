@@ -18,47 +18,71 @@ from archive.legacy_streamlit.ui.step_ranking import render_step_ranking
 # Page Config
 st.set_page_config(page_title="Pre-Market Analyst (Context Engine)", page_icon="🧠", layout="wide")
 
+CORE_INTERMARKET_TICKERS = ("SPY", "NDAQ", "IWM", "PAXGUSDT", "BTCUSDT", "EURUSDT", "CL=F", "UUP", "TLT", "SMH", "^VIX", "XLF", "XLK", "XLV", "XLE", "XLI", "XLP", "XLY", "XLC", "XLB", "XLU")
+
 # ==============================================================================
 # INITIALIZATION
 # ==============================================================================
+# Factories, not values: nothing is constructed on reruns where the key already exists,
+# and every session gets its own fresh list/dict/DataFrame.
+_SESSION_DEFAULTS = {
+    'market_timezone': lambda: pytz.timezone('US/Eastern'),
+    'detailed_premarket_cards': dict,
+    'db_plans': dict,
+    'macro_missing_tickers': list,
+    'unified_missing_tickers': list,
+    'macro_analysis_failures': list,
+    'unified_analysis_failures': list,
+    'macro_audit_log': list,
+    'unified_audit_log': list,
+    'glassbox_raw_cards': dict,
+    'glassbox_etf_data': list,
+    'proximity_scan_results': list,
+    'glassbox_etf_df': pd.DataFrame,
+    'proximity_scan_df': pd.DataFrame,
+    'macro_index_df': pd.DataFrame,
+    'step1_data_ready': lambda: False,
+    'watchlist': lambda: None,
+    'watchlist_dirty': lambda: False,
+    'app_logger': lambda: AppLogger(None),
+}
+
 def init_session_state():
-    defaults = {
-        'market_timezone': pytz.timezone('US/Eastern'),
-        'detailed_premarket_cards': {},
-        'db_plans': {},
-        'macro_missing_tickers': [],
-        'unified_missing_tickers': [],
-        'macro_analysis_failures': [],
-        'unified_analysis_failures': [],
-        'macro_audit_log': [],
-        'unified_audit_log': [],
-        'glassbox_raw_cards': {},
-        'glassbox_etf_data': [],
-        'proximity_scan_results': [],
-        'step1_data_ready': False,
-        'app_logger': AppLogger(None)
-    }
-    for k, v in defaults.items():
-        if k not in st.session_state: st.session_state[k] = v
+    state = st.session_state
+    for k, factory in _SESSION_DEFAULTS.items():
+        if k not in state: state[k] = factory()
+
+@st.cache_resource(show_spinner=False)
+def _connect_turso():
+    """
+    Resolves credentials, opens the Turso client and ensures the schema exists.
+    Cached as a resource, so this runs once per server process instead of on
+    every widget-triggered rerun.
+    """
+    db_url, auth_token = get_turso_credentials()
+    client = get_db_connection(db_url, auth_token)
+    if client:
+        init_db_schema(client, AppLogger(None))
+    return db_url, auth_token, client
 
 def main():
     init_session_state()
     
     # 1. Database & Key Manager
-    db_url, auth_token = get_turso_credentials()
-    turso = get_db_connection(db_url, auth_token)
+    db_url, auth_token, turso = _connect_turso()
     if not turso:
+        _connect_turso.clear()  # don't pin a failed connection for the life of the server
         st.error("❌ Database Connection Failed."); st.stop()
-    init_db_schema(turso, st.session_state.app_logger)
 
     if 'key_manager_instance' not in st.session_state:
-        st.session_state.key_manager_instance = KeyManager(db_url, auth_token)
+        st.session_state.key_manager_instance = KeyManager(db_url, auth_token, db_client=turso)
 
     # 2. Local Sync Logic
     if st.session_state.get('trigger_sync'):
         with st.spinner("Syncing Turso to Local..."):
             sync_turso_to_local(turso, "data/local_turso.db", st.session_state.app_logger)
             st.session_state.trigger_sync = False
+            st.session_state.watchlist_dirty = True
             st.toast("Sync Complete", icon="✅"); st.rerun()
 
     # 3. Sidebar / Mission Config
@@ -75,7 +99,6 @@ def main():
     tab1, tab2, tab3 = st.tabs(["Step 1: Macro Context", "Step 2: Selection Hub", "Step 3: Stock Ranking"])
 
     with tab1:
-        CORE_INTERMARKET_TICKERS = ["SPY", "NDAQ", "IWM", "PAXGUSDT", "BTCUSDT", "EURUSDT", "CL=F", "UUP", "TLT", "SMH", "^VIX", "XLF", "XLK", "XLV", "XLE", "XLI", "XLP", "XLY", "XLC", "XLB", "XLU"]
         render_step_macro(turso, logic_mode, sim_cutoff_dt, sim_cutoff_str, benchmark_date_str, selected_model, CORE_INTERMARKET_TICKERS)
 
     with tab2:
@@ -6,6 +6,12 @@ from datetime import datetime, timezone
 import pytz
 from streamlit_lightweight_charts import renderLightweightCharts
 
+# Column configs for the freshness tables, built once at import rather than on every rerun
+FRESHNESS_COLUMN_CONFIG = {
+    "Freshness": st.column_config.ProgressColumn("Freshness", min_value=0.0, max_value=1.0, format="%.2f"),
+    "Lag (m)": st.column_config.TextColumn("Lag (m)"),
+}
+
 # ==============================================================================
 # HELPER: VISUALIZE STRUCTURE FOR USER
 # ==============================================================================
@@ -258,13 +264,12 @@ def render_tradingview_chart(turso_client, ticker, cutoff_str, mode="Simulation"
         if df is None or df.empty: return None
         df = df.tail(150)
         
-        candles = []
-        for _, row in df.iterrows():
-            ts = int(row['timestamp'].timestamp())
-            candles.append({
-                "time": ts,
-                "open": row['open'], "high": row['high'], "low": row['low'], "close": row['close']
-            })
+        # Column-wise: one epoch conversion for the whole frame instead of a Series per row
+        ts = pd.to_datetime(df['timestamp'], utc=True)
+        candles = pd.DataFrame({
+            "time": (ts - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1),
+            "open": df['open'], "high": df['high'], "low": df['low'], "close": df['close'],
+        }).to_dict('records')
 
         series = [{"type": "Candlestick", "data": candles, "options": {"upColor": "#26a69a", "downColor": "#ef5350", "borderVisible": False, "wickUpColor": "#26a69a", "wickDownColor": "#ef5350"}}]
         
@@ -300,6 +305,20 @@ def render_tradingview_chart(turso_client, ticker, cutoff_str, mode="Simulation"
         st.error(f"Chart Error ({ticker}): {e}")
         return None
 
+# Every candle is JSON-encoded and shipped to the browser; the macro tab draws ~20 of
+# these charts per rerun, so cap the payload and let coarser candles cover the span.
+CHART_MAX_BARS = 500
+
+def downsample_ohlc(df, max_bars=CHART_MAX_BARS):
+    """Resamples lowercase OHLC rows into whole-minute buckets so at most ~max_bars remain."""
+    if len(df) <= max_bars:
+        return df
+    span = df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]
+    bucket = max(pd.Timedelta(minutes=1), (span / max_bars).ceil('min'))
+    agg = {c: f for c, f in (('open', 'first'), ('high', 'max'), ('low', 'min'), ('close', 'last'), ('volume', 'sum')) if c in df.columns}
+    out = df.resample(bucket, on='timestamp').agg(agg).dropna(subset=['open'])
+    return out.reset_index()
+
 # ==============================================================================
 # VISUALIZATION: SIMPLE LIGHTWEIGHT CHART
 # ==============================================================================
@@ -319,11 +338,12 @@ def render_lightweight_chart_simple(df, ticker, height=300):
         df_norm.sort_values('timestamp', inplace=True)
         df_norm.drop_duplicates(subset='timestamp', keep='last', inplace=True)
         if df_norm.empty: return
-        candles = []
-        for _, row in df_norm.iterrows():
-            ts = int(row['timestamp'].timestamp())
-            if pd.isna(row['open']): continue
-            candles.append({"time": ts, "open": row.get('open', 0), "high": row.get('high', 0), "low": row.get('low', 0), "close": row.get('close', 0)})
+        df_norm = downsample_ohlc(df_norm)
+        epoch = pd.Timestamp(0, tz=df_norm['timestamp'].dt.tz)
+        candles = pd.DataFrame({
+            "time": (df_norm['timestamp'] - epoch) // pd.Timedelta(seconds=1),
+            "open": df_norm['open'], "high": df_norm['high'], "low": df_norm['low'], "close": df_norm['close'],
+        }).to_dict('records')
         series = [{"type": "Candlestick", "data": candles, "options": {"upColor": "#26a69a", "downColor": "#ef5350", "borderVisible": False, "wickUpColor": "#26a69a", "wickDownColor": "#ef5350"}}]
         chart_options = {"layout": {"textColor": "#d1d4dc", "background": {"type": "solid", "color": "#131722"}}, "grid": {"vertLines": {"color": "rgba(42, 46, 57, 0.5)"}, "horzLines": {"color": "rgba(42, 46, 57, 0.5)"}}, "height": height, "timeScale": { "timeVisible": True, "secondsVisible": False }}
         safe_ticker = ticker.replace("=", "_").replace("^", "").replace(".", "_")
@@ -1,17 +1,31 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import time
 import concurrent.futures
 import re
-from backend.engine.time_utils import to_et, now_et, get_staleness_score, format_time_et
-from archive.legacy_streamlit.ui.common import AuditLogger, display_view_economy_card, render_lightweight_chart_simple
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from backend.engine.time_utils import to_et, now_et, get_staleness_scores, format_time_et
+from archive.legacy_streamlit.ui.common import AuditLogger, display_view_economy_card, render_lightweight_chart_simple, FRESHNESS_COLUMN_CONFIG
 from backend.engine.database import get_latest_economy_card_date, get_eod_economy_card
-from backend.engine.processing import get_session_bars_routed, get_previous_session_stats
+from backend.engine.processing import get_session_bars_routed, get_previous_session_stats, get_previous_session_stats_bulk
 from backend.engine.sentiment_engine import analyze_headline_sentiment
 from backend.engine.gemini import call_gemini_with_rotation
+from backend.engine.utils import dumps_json
 
-def analyze_macro_worker(ticker, df, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt=None):
+_JSON_RE = re.compile(r"(\{.*\})", re.DOTALL)
+
+def fetch_macro_worker(ticker, turso, benchmark_date_str, simulation_cutoff_str, mode, logger, db_fallback, st_ctx=None):
+    """Worker for Macro data ingestion (I/O bound, run in a thread pool)."""
+    if st_ctx: add_script_run_ctx(ctx=st_ctx)
+    try:
+        df, _ = get_session_bars_routed(turso, ticker, benchmark_date_str, simulation_cutoff_str, mode=mode, logger=logger, db_fallback=db_fallback, days=2.9, resolution="MINUTE_5")
+        return ticker, df
+    except Exception:
+        return ticker, None
+
+def analyze_macro_worker(ticker, df, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt=None, ref_levels=None):
     """Worker for Macro Indices."""
     try:
         from backend.engine.processing import analyze_market_context
@@ -19,28 +33,21 @@ def analyze_macro_worker(ticker, df, turso, benchmark_date_str, simulation_cutof
         latest_price = latest_row['Close']
         p_ts = latest_row['timestamp']
         
-        ref_levels = get_previous_session_stats(turso, ticker, benchmark_date_str, logger=None)
+        if ref_levels is None:
+            ref_levels = get_previous_session_stats(turso, ticker, benchmark_date_str, logger=None)
         card = analyze_market_context(df, ref_levels, ticker=ticker, session_start_dt=session_start_dt)
         
         mig_count = len(card.get('value_migration_log', []))
         imp_count = len(card.get('key_level_rejections', []))
         
-        freshness = 0.0
-        lag_min = 999.0
-        try:
-            if p_ts:
-                lag_min = get_staleness_score(p_ts)
-                freshness = max(0.0, 1.0 - (lag_min / 60.0))
-        except Exception: pass
-
         data_source = df['source'].iloc[0] if 'source' in df.columns else ('Capital.com' if mode == 'Live' else 'DB')
         ts_utc = str(df['dt_utc'].iloc[-1]) if 'dt_utc' in df.columns else str(p_ts)
-        freshness_progress = max(0.0, 1.0 - (lag_min / 60.0))
         
+        # Freshness is scored for all tickers at once in render_step_macro
         return {
             "ticker": ticker, "card": card, "latest_price": latest_price, "latest_ts_utc": ts_utc,
             "data_source": data_source, "mig_count": mig_count, "imp_count": imp_count,
-            "freshness_score": freshness_progress, "lag_min": lag_min, "df": df
+            "latest_ts": p_ts, "df": df
         }
     except Exception as e:
         return {"ticker": ticker, "error": str(e), "failed_analysis": True}
@@ -54,7 +61,7 @@ def run_macro_synthesis(status_obj, eod_card, news_text, bench_date, logger_obj,
     summarized_context = None
     if len(rolling_log) > 10:
         status_obj.write("   📜 Summarizing Long Market History...")
-        summary_prompt = f"Summarize the following market log into a concise 'Macro Arc':\n{json.dumps(rolling_log, indent=2)}"
+        summary_prompt = f"Summarize the following market log into a concise 'Macro Arc':\n{dumps_json(rolling_log, indent=True)}"
         try:
             sum_resp, _ = call_gemini_with_rotation(summary_prompt, "Summarize History", logger_obj, model_name, km_instance)
             if sum_resp: summarized_context = sum_resp
@@ -84,7 +91,7 @@ def run_macro_synthesis(status_obj, eod_card, news_text, bench_date, logger_obj,
     resp, error_msg = call_gemini_with_rotation(macro_prompt, macro_system, logger_obj, model_name, km_instance)
     if resp:
         try:
-            clean = re.search(r"(\{.*\})", resp, re.DOTALL).group(1)
+            clean = _JSON_RE.search(resp).group(1)
             st.session_state.premarket_economy_card = json.loads(clean)
             st.session_state.latest_macro_date = st.session_state.analysis_date.isoformat()
             logger_obj.log("✅ Step 1: Synthesis Complete.")
@@ -92,8 +99,13 @@ def run_macro_synthesis(status_obj, eod_card, news_text, bench_date, logger_obj,
         except Exception as e: st.error(f"JSON Parse Error: {e}")
     else: st.error(error_msg)
 
+@st.fragment
 def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str, benchmark_date_str, selected_model, CORE_INTERMARKET_TICKERS):
-    """Renders Step 1: Macro Context Tab."""
+    """
+    Renders Step 1: Macro Context Tab.
+    Runs as a fragment: widgets in this tab rerun only this tab, while the
+    st.rerun() calls after synthesis still refresh the whole app for Step 2/3.
+    """
     st.header("Step 1: Macro Context Analysis")
     st.caption("📝 Overnight News / Context")
     pm_news = st.text_area("Paste relevant headlines/catalysts here...", height=100, key="pm_news_input", label_visibility="collapsed")
@@ -101,6 +113,7 @@ def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str,
     
     def clear_step1_state():
         st.session_state.macro_index_data = []
+        st.session_state.macro_index_df = pd.DataFrame()
         st.session_state.macro_raw_dfs = {}
         st.session_state.macro_etf_structures = []
         st.session_state.macro_context_alerts = {}
@@ -134,26 +147,34 @@ def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str,
                 st.stop()
             st.session_state.glassbox_eod_card = eod_card
 
-            status.write("2. Gathering Market Data (Sequential Fetches)...")
+            status.write("2. Gathering Market Data (Parallel Fetches)...")
             raw_datafeeds = {}
             st.session_state.macro_missing_tickers = []
             progress_bar = st.progress(0)
-            for idx, t in enumerate(CORE_INTERMARKET_TICKERS):
-                df, staleness = get_session_bars_routed(turso, t, benchmark_date_str, simulation_cutoff_str, mode=mode, logger=a_logger, db_fallback=st.session_state.get('db_fallback', False), days=2.9, resolution="MINUTE_5")
-                if df is not None and not df.empty: raw_datafeeds[t] = df
-                else:
-                    st.session_state.macro_missing_tickers.append(t)
-                    a_logger.error(f"{t}: Failed to fetch data.")
-                
-                if mode == "Live" and not st.session_state.get('db_fallback', False): time.sleep(1)
-                progress_bar.progress((idx + 1) / len(CORE_INTERMARKET_TICKERS))
+            db_fallback = st.session_state.get('db_fallback', False)
+            ctx = get_script_run_ctx()
+            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                futures = [executor.submit(fetch_macro_worker, t, turso, benchmark_date_str, simulation_cutoff_str, mode, a_logger, db_fallback, ctx) for t in CORE_INTERMARKET_TICKERS]
+                last_render = 0.0
+                for idx, future in enumerate(concurrent.futures.as_completed(futures)):
+                    t, df = future.result()
+                    if df is not None and not df.empty: raw_datafeeds[t] = df
+                    else:
+                        st.session_state.macro_missing_tickers.append(t)
+                        a_logger.error(f"{t}: Failed to fetch data.")
+                    # Each progress() call is a websocket round trip; push at most every 100ms, plus the final state
+                    now = time.monotonic()
+                    if now - last_render > 0.1 or idx + 1 == len(futures):
+                        progress_bar.progress((idx + 1) / len(CORE_INTERMARKET_TICKERS))
+                        last_render = now
 
             status.write("3. Analyzing Market Structure (Parallel Engine)...")
             session_start_dt = simulation_cutoff_dt.replace(hour=4, minute=0, second=0, microsecond=0)
             macro_results = []
             st.session_state.macro_analysis_failures = []
+            ref_levels_by_ticker = get_previous_session_stats_bulk(turso, list(raw_datafeeds), benchmark_date_str)
             with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(analyze_macro_worker, t, df, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt) for t, df in raw_datafeeds.items()]
+                futures = [executor.submit(analyze_macro_worker, t, df, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt, ref_levels_by_ticker.get(t)) for t, df in raw_datafeeds.items()]
                 for future in concurrent.futures.as_completed(futures):
                     res = future.result()
                     if res:
@@ -163,6 +184,11 @@ def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str,
                         else: macro_results.append(res)
             
             macro_results = sorted(macro_results, key=lambda x: x['ticker'])
+            lag_arr = get_staleness_scores([r['latest_ts'] for r in macro_results])
+            lag_arr = np.where(np.isfinite(lag_arr), lag_arr, 999.0)
+            fresh_arr = np.clip(1.0 - lag_arr / 60.0, 0.0, 1.0)
+            for r, lag, fresh in zip(macro_results, lag_arr, fresh_arr):
+                r['lag_min'] = float(lag); r['freshness_score'] = float(fresh)
             analysis_date_str = st.session_state.analysis_date.strftime('%Y-%m-%d')
             context_map = {}
             for r in macro_results:
@@ -178,9 +204,18 @@ def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str,
             if stale_1h: st.session_state.macro_stale_alerts = stale_1h
 
             for res in macro_results:
-                st.session_state.macro_etf_structures.append(json.dumps(res['card']))
+                st.session_state.macro_etf_structures.append(dumps_json(res['card']))
                 st.session_state.macro_raw_dfs[res['ticker']] = res['df']
                 st.session_state.macro_index_data.append({"Ticker": res['ticker'], "Freshness": res['freshness_score'], "Price": f"${res['latest_price']:.2f}", "Timestamp (UTC)": res['latest_ts_utc'], "Lag (m)": f"{res['lag_min']:.1f}", "Source": res['data_source']})
+            # Columnar construction: pandas skips the row-dict -> column pivot
+            st.session_state.macro_index_df = pd.DataFrame({
+                "Ticker": [r['ticker'] for r in macro_results],
+                "Freshness": [r['freshness_score'] for r in macro_results],
+                "Price": [f"${r['latest_price']:.2f}" for r in macro_results],
+                "Timestamp (UTC)": [r['latest_ts_utc'] for r in macro_results],
+                "Lag (m)": [f"{r['lag_min']:.1f}" for r in macro_results],
+                "Source": [r['data_source'] for r in macro_results],
+            })
 
             if not st.session_state.macro_etf_structures:
                 status.update(label="Aborted: No Data", state="error")
@@ -219,8 +254,9 @@ def render_step_macro(turso, mode, simulation_cutoff_dt, simulation_cutoff_str,
         if st.session_state.premarket_economy_card:
             display_view_economy_card(st.session_state.premarket_economy_card)
             with st.expander("📝 Summary Table & Details", expanded=False):
-                st.dataframe(pd.DataFrame(st.session_state.macro_index_data))
-                if st.session_state.macro_raw_dfs:
+                st.dataframe(st.session_state.macro_index_df, column_config=FRESHNESS_COLUMN_CONFIG)
+                # Expander bodies run even while collapsed, so the ~20 charts are opt-in
+                if st.session_state.macro_raw_dfs and st.toggle("Show index charts", key="macro_show_charts"):
                     for t, df in st.session_state.macro_raw_dfs.items():
                         st.markdown(f"**{t}**")
                         render_lightweight_chart_simple(df, t, height=200)
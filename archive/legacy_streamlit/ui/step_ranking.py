@@ -5,6 +5,15 @@ import re
 from archive.legacy_streamlit.ui.common import render_tradingview_chart
 from backend.engine.gemini import call_gemini_with_rotation, AVAILABLE_MODELS
 from backend.engine.time_utils import now_et
+from backend.engine.utils import dumps_json
+from backend.engine.database import get_db_connection
+
+_JSON_LIST_RE = re.compile(r"(\[[\s\S]*\])")
+
+_SYS_TRADER = "You are a Head Trader."
+_ROLE_TMPL = "[ROLE]\nYou are Head Trader.\n[GLOBAL MACRO CONTEXT]\n{macro}"
+_BATCH_TMPL = "[CANDIDATE ANALYSIS - BATCH {n}]\n{batch}"
+_TASK_TMPL = "[TASK]\nRank Candidates. Return TOP 5 JSON LIST.\n**PARAMS**: setup={setup}, confluence={confluence}{rr}{prox}\n[JSON SCHEMA]..."
 
 def fetch_plan_safe(client_obj, ticker, full_context_mode=False):
     """Safe Fetch Function for Strategic Plans."""
@@ -74,16 +83,17 @@ def render_step_ranking(turso, db_url, auth_token, mode, simulation_cutoff_dt, s
 
             strategic_plans = {}
             fetch_errors = [] 
+            fresh_db = None
             for tkr in selected_tickers:
                 result = fetch_plan_safe(turso, tkr, use_full_context)
                 if isinstance(result, Exception):
                     try: 
-                        from libsql_client import create_client_sync
                         fresh_url = db_url.replace("libsql://", "https://")
                         if not fresh_url.startswith("https://"): fresh_url = f"https://{fresh_url}"
-                        fresh_db = create_client_sync(url=fresh_url, auth_token=auth_token)
+                        # Replace the cached HTTPS client once (it may be the one that just failed);
+                        # later failing tickers then reuse the fresh one instead of reconnecting
+                        fresh_db = get_db_connection(fresh_url, auth_token, refresh=fresh_db is None)
                         retry_res = fetch_plan_safe(fresh_db, tkr, use_full_context)
-                        fresh_db.close()
                         if isinstance(retry_res, Exception): raise retry_res 
                         else: strategic_plans[tkr] = retry_res 
                     except Exception as final_e:
@@ -101,14 +111,13 @@ def render_step_ranking(turso, db_url, auth_token, mode, simulation_cutoff_dt, s
                 pm_migration = [b for b in card['value_migration_log'] if b['time_window'].split(' - ')[0].strip() < simulation_cutoff_dt.strftime('%H:%M')]
                 context_packet.append({"ticker": t, "THE_ANCHOR (Strategic Plan)": strategic_plans.get(t, "No Plan Found"), "THE_DELTA (Live Tape)": {"current_price": card['reference_levels']['current_price'], "session_delta_structure": pm_migration, "new_impact_zones_detected": card['key_level_rejections']}})
             
-            p1 = f"[ROLE]\nYou are Head Trader.\n[GLOBAL MACRO CONTEXT]\n{json.dumps(macro_summary, indent=2)}"
-            chunks = [f"[CANDIDATE ANALYSIS - BATCH {i//3 + 1}]\n{json.dumps(context_packet[i:i+3], indent=2)}" for i in range(0, len(context_packet), 3)]
-            p2_full = "\n".join(chunks)
+            p1 = _ROLE_TMPL.format(macro=dumps_json(macro_summary, indent=True))
+            chunks = [_BATCH_TMPL.format(n=i//3 + 1, batch=dumps_json(context_packet[i:i+3], indent=True)) for i in range(0, len(context_packet), 3)]
             rr_i = "\n- **OVERRIDE: HIGH R/R**: YES." if prioritize_rr else ""
             prox_i = "\n- **OVERRIDE: PROXIMITY**: YES." if prioritize_prox else ""
-            p3 = f"[TASK]\nRank Candidates. Return TOP 5 JSON LIST.\n**PARAMS**: setup={setup_type}, confluence={confluence_mode}{rr_i}{prox_i}\n[JSON SCHEMA]..."
+            p3 = _TASK_TMPL.format(setup=setup_type, confluence=confluence_mode, rr=rr_i, prox=prox_i)
             
-            full_prompt = p1 + "\n" + p2_full + "\n" + p3
+            full_prompt = "\n".join((p1, *chunks, p3))
             st.session_state.ht_prompt_parts = {"p1": p1, "p2_chunks": chunks, "p3": p3, "full": full_prompt}
             st.session_state.ht_ready = True
 
@@ -117,10 +126,10 @@ def render_step_ranking(turso, db_url, auth_token, mode, simulation_cutoff_dt, s
                 log_expander = st.expander("📝 Live Execution Logs", expanded=True)
                 ht_logger = AppLogger(log_expander.empty())
                 with st.spinner(f"Head Trader Analyzing..."):
-                    ht_resp, err = call_gemini_with_rotation(full_prompt, "You are a Head Trader.", ht_logger, ht_model, st.session_state.key_manager_instance)
+                    ht_resp, err = call_gemini_with_rotation(full_prompt, _SYS_TRADER, ht_logger, ht_model, st.session_state.key_manager_instance)
                     if ht_resp:
                         try:
-                            match = re.search(r"(\[[\s\S]*\])", ht_resp)
+                            match = _JSON_LIST_RE.search(ht_resp)
                             recommendations = json.loads(match.group(1)) if match else json.loads(ht_resp)
                             
                             st.markdown("### 🏆 Head Trader's Top 5")
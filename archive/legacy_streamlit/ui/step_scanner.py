@@ -1,15 +1,24 @@
 import streamlit as st
 import pandas as pd
-import json
+import numpy as np
 import concurrent.futures
-from backend.engine.time_utils import to_et, now_et, get_staleness_score
+from backend.engine.time_utils import to_et, now_et, get_staleness_scores
 from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
-from archive.legacy_streamlit.ui.common import AuditLogger, render_market_structure_chart
+from archive.legacy_streamlit.ui.common import AuditLogger, render_market_structure_chart, FRESHNESS_COLUMN_CONFIG
 from backend.engine.database import get_eod_card_data_for_screener, save_deep_dive_card
-from backend.engine.processing import get_session_bars_routed, get_previous_session_stats
-from backend.engine.analysis.detail_engine import update_company_card
+from backend.engine.processing import get_session_bars_routed, get_previous_session_stats, get_previous_session_stats_bulk
+from backend.engine.analysis.detail_engine import update_company_cards_batch
+from backend.engine.utils import dumps_json
 
-def analyze_ticker_unified_worker(ticker_to_scan, turso, benchmark_date_str, simulation_cutoff_str, simulation_cutoff_dt, mode, scan_threshold, st_ctx=None):
+# Tickers per Gemini request in Deep Preparation; bounded by the reply's output-token budget.
+DEEP_DIVE_BATCH_SIZE = 4
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_screener_plans(_turso, ticker_tuple, benchmark_date, _logger=None):
+    """Company-card plans rarely change intra-session; reuse them across scans for 5 minutes."""
+    return get_eod_card_data_for_screener(_turso, ticker_tuple, benchmark_date, _logger)
+
+def analyze_ticker_unified_worker(ticker_to_scan, turso, benchmark_date_str, simulation_cutoff_str, simulation_cutoff_dt, mode, scan_threshold, st_ctx=None, ref_levels=None):
     """Unified Worker: Fetches AND analyzes data in parallel."""
     if st_ctx: add_script_run_ctx(ctx=st_ctx)
     try:
@@ -21,108 +30,146 @@ def analyze_ticker_unified_worker(ticker_to_scan, turso, benchmark_date_str, sim
         l_price = float(latest_row['Close'])
         p_ts = latest_row['timestamp'] if 'timestamp' in df.columns else latest_row.get('dt_eastern')
         
-        ref_levels = get_previous_session_stats(turso, ticker_to_scan, benchmark_date_str, logger=None)
+        if ref_levels is None:
+            ref_levels = get_previous_session_stats(turso, ticker_to_scan, benchmark_date_str, logger=None)
         card = analyze_market_context(df, ref_levels, ticker=ticker_to_scan, session_start_dt=simulation_cutoff_dt.replace(hour=4, minute=0, second=0, microsecond=0))
         
         mig_count = len(card.get('value_migration_log', []))
         imp_count = len(card.get('key_level_rejections', []))
         
-        l_minutes = 999.0; freshness_p = 0.0
-        if p_ts:
-            l_minutes = get_staleness_score(p_ts)
-            freshness_p = max(0.0, 1.0 - (l_minutes / 60.0))
-
         prox_alert = None
         plan_data = st.session_state.db_plans.get(ticker_to_scan)
         if plan_data:
             levels = [(lvl, "SUPPORT") for lvl in plan_data.get('s_levels', [])] + [(lvl, "RESISTANCE") for lvl in plan_data.get('r_levels', [])]
+            # |price - l| / price <= t  <=>  l lies in [price * (1 - t), price * (1 + t)]:
+            # levels outside the band are rejected by two comparisons, no division.
+            band = l_price * scan_threshold / 100
+            lo, hi = l_price - band, l_price + band
             best_dist = float('inf')
             for lvl, l_type in levels:
+                if not lo <= lvl <= hi:
+                    continue
                 dist_pct = abs(l_price - lvl) / l_price * 100
-                if dist_pct <= scan_threshold and dist_pct < best_dist:
+                if dist_pct < best_dist:
                     best_dist = dist_pct
                     prox_alert = {"Ticker": ticker_to_scan, "Price": f"${l_price:.2f}", "Type": l_type, "Level": lvl, "Dist %": round(dist_pct, 2), "Source": f"Plan {plan_data.get('plan_date')}"}
 
         ts_u = str(df['dt_utc'].iloc[-1]) if 'dt_utc' in df.columns else str(p_ts)
         return {
-            "ticker": ticker_to_scan, "card": card, "prox_alert": prox_alert, "lag_min": l_minutes, "latest_ts_utc": ts_u,
-            "table_row": {"Ticker": ticker_to_scan, "Freshness": freshness_p, "Price": f"${l_price:.2f}", "Timestamp (UTC)": ts_u, "Lag (m)": f"{l_minutes:.1f}" if p_ts else "N/A", "Migration Blocks": mig_count, "Impact Levels": imp_count}
+            "ticker": ticker_to_scan, "card": card, "prox_alert": prox_alert, "latest_ts": p_ts, "latest_ts_utc": ts_u,
+            "table_row": {"Ticker": ticker_to_scan, "Freshness": 0.0, "Price": f"${l_price:.2f}", "Timestamp (UTC)": ts_u, "Lag (m)": "N/A", "Migration Blocks": mig_count, "Impact Levels": imp_count}
         }
     except Exception as e: return {"ticker": ticker_to_scan, "error": str(e), "failed_analysis": True}
 
-def process_deep_dive(ticker, turso, key_mgr, macro_summary, date_obj, model, static_data, st_status, st_ctx):
-    """Worker for Deep Dive AI Analysis."""
+class StreamlitThreadLogger:
+    def __init__(self, tkr, status): self.ticker = tkr; self.status = status
+    def log(self, msg):
+        colors = ["blue", "green", "orange", "red", "violet", "gray"]
+        t_color = colors[hash(self.ticker) % len(colors)]
+        self.status.write(f"**:{t_color}[{self.ticker}]** {msg}")
+
+def process_deep_dive_batch(tickers, turso, key_mgr, macro_summary, date_obj, model, static_data, st_status, st_ctx):
+    """Worker for Deep Dive AI Analysis: one Gemini request per batch of tickers."""
     if st_ctx: add_script_run_ctx(ctx=st_ctx)
-    class StreamlitThreadLogger:
-        def __init__(self, tkr, status): self.ticker = tkr; self.status = status
-        def log(self, msg):
-            colors = ["blue", "green", "orange", "red", "violet", "gray"]
-            t_color = colors[hash(self.ticker) % len(colors)]
-            self.status.write(f"**:{t_color}[{self.ticker}]** {msg}")
-    local_logger = StreamlitThreadLogger(ticker, st_status)
+    local_logger = StreamlitThreadLogger(", ".join(tickers), st_status)
     try:
-        data = static_data.get(ticker, {})
-        json_result = update_company_card(ticker=ticker, previous_card_json=data.get("previous_card", "{}"), previous_card_date=str(date_obj - timedelta(days=1)), historical_notes="", new_eod_summary="", new_eod_date=date_obj, model_name=model, key_manager=key_mgr, pre_fetched_context=data.get("impact_context", "{}"), market_context_summary=macro_summary, logger=local_logger)
-        if json_result: save_deep_dive_card(turso, ticker, str(date_obj), json_result, local_logger)
-        return ticker, json_result
+        payloads = {t: static_data.get(t, {}) for t in tickers}
+        results = update_company_cards_batch(payloads, new_eod_date=date_obj, model_name=model, key_manager=key_mgr, market_context_summary=macro_summary, logger=local_logger)
+        for ticker, card in results.items():
+            if card: save_deep_dive_card(turso, ticker, str(date_obj), card, local_logger)
+        return results
     except Exception as e:
         local_logger.log(f"❌ Worker EXCEPTION: {e}")
-        return ticker, None
+        return {t: None for t in tickers}
+
+def session_watchlist(turso, fetch_watchlist, logger):
+    """Sorted, de-duplicated watchlist fetched once per session; refetched when empty or marked dirty."""
+    if not st.session_state.get('watchlist') or st.session_state.get('watchlist_dirty'):
+        st.session_state.watchlist = sorted(set(fetch_watchlist(turso, logger)))
+        st.session_state.watchlist_dirty = False
+    return st.session_state.watchlist
 
 def render_step_scanner(turso, mode, simulation_cutoff_dt, simulation_cutoff_str, benchmark_date_str, selected_model, fetch_watchlist):
     """Renders Step 2: Selection Hub Tab."""
     st.title("Step 2: Selection Hub")
     with st.expander("🧠 Deep Preparation: Masterclass Model (Optional)"):
-        watchlist = fetch_watchlist(turso, st.session_state.app_logger)
-        selected_deep_dive = st.multiselect("Tickers for deep-dive Preparation:", sorted(list(set(watchlist))), key="deep_dive_multiselect")
+        watchlist = session_watchlist(turso, fetch_watchlist, st.session_state.app_logger)
+        selected_deep_dive = st.multiselect("Tickers for deep-dive Preparation:", watchlist, key="deep_dive_multiselect")
         if st.button("Generate Detailed Preparation Cards"):
             if not st.session_state.premarket_economy_card: st.warning("⚠️ Step 1 first."); st.stop()
             pre_fetched_data = {}
             from backend.engine.analysis.impact_engine import get_or_compute_context
             with st.status("Fetching Data Context...") as status_io:
-                for ticker in selected_deep_dive:
-                    context_card = get_or_compute_context(turso, ticker, str(st.session_state.analysis_date), st.session_state.app_logger)
-                    pre_fetched_data[ticker] = {"impact_context": json.dumps(context_card), "previous_card": "{}"}
+                # Bar fetches are I/O bound: run them side by side, then serialize in the main thread
+                trade_date, app_logger = str(st.session_state.analysis_date), st.session_state.app_logger
+                with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                    context_cards = executor.map(lambda t: get_or_compute_context(turso, t, trade_date, app_logger), selected_deep_dive)
+                    for ticker, context_card in zip(selected_deep_dive, context_cards):
+                        pre_fetched_data[ticker] = {"impact_context": dumps_json(context_card), "previous_card": "{}"}
             
             deep_results = {}
             ctx = get_script_run_ctx()
             with st.status("Generating Cards...") as status_deep:
-                with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-                    futures = {executor.submit(process_deep_dive, t, turso, st.session_state.key_manager_instance, json.dumps(st.session_state.premarket_economy_card), st.session_state.analysis_date, selected_model, pre_fetched_data, status_deep, ctx): t for t in selected_deep_dive}
+                batches = [selected_deep_dive[i:i + DEEP_DIVE_BATCH_SIZE] for i in range(0, len(selected_deep_dive), DEEP_DIVE_BATCH_SIZE)]
+                macro_summary = dumps_json(st.session_state.premarket_economy_card)
+                key_mgr = st.session_state.key_manager_instance
+                # Gemini calls are pure network waits; a few in flight per key keeps every key busy without piling onto KeyManager waits
+                n_workers = max(1, min(len(getattr(key_mgr, 'available_keys', ())) * 4, 16, len(batches)))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    futures = [executor.submit(process_deep_dive_batch, b, turso, key_mgr, macro_summary, st.session_state.analysis_date, selected_model, pre_fetched_data, status_deep, ctx) for b in batches]
                     for future in concurrent.futures.as_completed(futures):
-                        tkr, res = future.result()
-                        if res: deep_results[tkr] = json.loads(res)
+                        for tkr, res in future.result().items():
+                            if res: deep_results[tkr] = res
             st.session_state.detailed_premarket_cards.update(deep_results); st.rerun()
 
     st.subheader("Unified Selection Scanner")
-    prox_col1, prox_col2 = st.columns([2, 1])
+    prox_col1, prox_col2, prox_col3 = st.columns([2, 1, 1])
     scan_threshold = prox_col1.slider("Proximity %", 0.1, 5.0, 2.5)
+    if prox_col3.button("🔄 Refresh Plans", width="stretch"):
+        cached_screener_plans.clear()
+        st.session_state.watchlist_dirty = True
     if prox_col2.button("Run Unified Selection Scan", type="primary", width="stretch"):
         if not st.session_state.premarket_economy_card: st.warning("⚠️ Step 1 first.")
         else:
             st.session_state.glassbox_etf_data = []; st.session_state.glassbox_raw_cards = {}; st.session_state.proximity_scan_results = []
             with st.status("Running Unified Scan...") as status:
                 u_logger = AuditLogger('unified_audit_log')
-                watchlist = fetch_watchlist(turso, u_logger)
-                full_ticker_list = sorted(list(set(watchlist)))
-                st.session_state.db_plans = get_eod_card_data_for_screener(turso, tuple(full_ticker_list), st.session_state.analysis_date.strftime('%Y-%m-%d'), u_logger)
+                full_ticker_list = session_watchlist(turso, fetch_watchlist, u_logger)
+                st.session_state.db_plans = cached_screener_plans(turso, tuple(full_ticker_list), st.session_state.analysis_date.strftime('%Y-%m-%d'), u_logger)
                 ctx = get_script_run_ctx()
+                latest_ts = {}
+                ref_levels_by_ticker = get_previous_session_stats_bulk(turso, full_ticker_list, benchmark_date_str)
                 with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                    futures = {executor.submit(analyze_ticker_unified_worker, t, turso, benchmark_date_str, simulation_cutoff_str, simulation_cutoff_dt, mode, scan_threshold, ctx): t for t in full_ticker_list}
+                    futures = {executor.submit(analyze_ticker_unified_worker, t, turso, benchmark_date_str, simulation_cutoff_str, simulation_cutoff_dt, mode, scan_threshold, ctx, ref_levels_by_ticker.get(t)): t for t in full_ticker_list}
                     for future in concurrent.futures.as_completed(futures):
                         res = future.result()
                         if res and not res.get('error'):
                             st.session_state.glassbox_raw_cards[res['ticker']] = res['card']
                             st.session_state.glassbox_etf_data.append(res['table_row'])
+                            latest_ts[res['ticker']] = res['latest_ts']
                             if res['prox_alert']: st.session_state.proximity_scan_results.append(res['prox_alert'])
-            st.session_state.glassbox_etf_data = sorted(st.session_state.glassbox_etf_data, key=lambda x: x['Ticker']); st.rerun()
+            st.session_state.glassbox_etf_data = sorted(st.session_state.glassbox_etf_data, key=lambda x: x['Ticker'])
+            rows = st.session_state.glassbox_etf_data
+            lag_arr = get_staleness_scores([latest_ts.get(r['Ticker']) for r in rows])
+            fresh_arr = np.clip(1.0 - lag_arr / 60.0, 0.0, 1.0)
+            for row, lag, fresh in zip(rows, lag_arr, fresh_arr):
+                if np.isfinite(lag): row['Freshness'] = float(fresh); row['Lag (m)'] = f"{lag:.1f}"
+            # Build the display frames once per scan instead of on every rerun
+            st.session_state.glassbox_etf_df = pd.DataFrame(st.session_state.glassbox_etf_data)
+            hits = st.session_state.proximity_scan_results
+            order = np.argsort(np.fromiter((h["Dist %"] for h in hits), dtype=np.float64, count=len(hits)), kind="stable")
+            st.session_state.proximity_scan_results = [hits[i] for i in order]
+            st.session_state.proximity_scan_df = pd.DataFrame(st.session_state.proximity_scan_results)
+            st.rerun()
 
     if st.session_state.glassbox_etf_data:
-        st.dataframe(pd.DataFrame(st.session_state.glassbox_etf_data), width="stretch")
+        st.dataframe(st.session_state.glassbox_etf_df, width="stretch", column_config=FRESHNESS_COLUMN_CONFIG)
     if st.session_state.proximity_scan_results:
         st.success(f"🎯 {len(st.session_state.proximity_scan_results)} Proximity Alerts")
-        st.dataframe(pd.DataFrame(st.session_state.proximity_scan_results).sort_values("Dist %"), width="stretch")
+        st.dataframe(st.session_state.proximity_scan_df, width="stretch")
     if st.session_state.glassbox_raw_cards:
         with st.expander("🔍 View Charts"):
-            for tkr in sorted(st.session_state.glassbox_raw_cards.keys()):
-                st.plotly_chart(render_market_structure_chart(st.session_state.glassbox_raw_cards[tkr]), width="stretch")
+            # Collapsed expanders still execute; only build the figures once asked for
+            if st.toggle("Render structure charts", key="scanner_show_charts"):
+                for tkr in sorted(st.session_state.glassbox_raw_cards.keys()):
+                    st.plotly_chart(render_market_structure_chart(st.session_state.glassbox_raw_cards[tkr]), width="stretch")
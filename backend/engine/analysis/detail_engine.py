@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-import requests
+import copy
+import functools
 import json
 import re
+import threading
 import time
 import logging
 from datetime import date, datetime
@@ -10,9 +12,9 @@ from datetime import date, datetime
 
 # --- Core Module Imports ---
 # Adjusted to match actual project structure
-from backend.engine.gemini import API_BASE_URL 
+from backend.engine.gemini import API_BASE_URL, GEMINI_CONNECT_TIMEOUT, _GEMINI_SESSION
 from backend.engine.key_manager import KeyManager
-from backend.engine.utils import AppLogger
+from backend.engine.utils import AppLogger, dumps_json, encode_json, loads_json
 from backend.engine.database import get_db_connection
 
 # We need to resolve where get_or_compute_context comes from. 
@@ -105,185 +107,63 @@ DEFAULT_ECONOMY_CARD_JSON = """
 }
 """
 
-from typing import Optional
-# --- The Robust API Caller (V8) ---
-def call_gemini_api(prompt: str, system_prompt: str, logger: AppLogger, model_name: str, key_manager: KeyManager, max_retries=3) -> Optional[str]:
-    """
-    Calls Gemini API using dynamic model selection and quota management.
-    Requires an explicit KeyManager instance for thread-safety.
-    """
-    if not key_manager:
-        logger.log("❌ ERROR: KeyManager not provided.")
-        return None
-    
-    # Estimate tokens for quota check
-    est_tok = key_manager.estimate_tokens(prompt + system_prompt)
-    logger.log(f"📝 Request Size Estimate: ~{est_tok} tokens")
-
-    for i in range(max_retries):
-        current_api_key = None
-        key_name = "Unknown"
-
-        try:
-            # 1. ACQUIRE: Request key specifically for this model's bucket
-            # Returns: (key_name, key_value, wait_time, real_model_id)
-            key_name, current_api_key, wait_time, real_model_id = key_manager.get_key(config_id=model_name, estimated_tokens=est_tok)
-            
-            if not current_api_key:
-                if wait_time == -1.0:
-                    logger.log(f"❌ FATAL: Prompt too large for {model_name} limits.")
-                    return None
-                
-                logger.log(f"⏳ All keys exhausted for {model_name}. Waiting {wait_time:.0f}s... (Attempt {i+1})")
-                if wait_time > 0 and i < max_retries - 1:
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logger.log(f"❌ ERROR: Global rate limit reached for {model_name}.")
-                    return None
-            
-            logger.log(f"🔑 Acquired '{key_name}' | Model: {model_name} (ID: {real_model_id}) (Attempt {i+1})")
-            
-            # 2. USE: Construct Dynamic URL using the internal model ID
-            gemini_url = f"{API_BASE_URL}/{real_model_id}:generateContent?key={current_api_key}"
-            
-            payload = {
-                "contents": [{"parts": [{"text": prompt}]}], 
-                "systemInstruction": {"parts": [{"text": system_prompt}]}
-            }
-            headers = {'Content-Type': 'application/json'}
-            
-            response = requests.post(gemini_url, headers=headers, data=json.dumps(payload), timeout=60)
-            
-            # 3. REPORT: Pass internal model_id for correct counter increment
-            if response.status_code == 200:
-                result = response.json()
-                
-                # V8 FIX: Use REAL usage data if available
-                usage_meta = result.get("usageMetadata", {})
-                real_tokens = usage_meta.get("totalTokenCount", est_tok) # fallback to estimate
-                
-                # Log the correction if significant
-                if real_tokens > est_tok * 1.2:
-                    logger.log(f"   ...Usage Correction: Est {est_tok} -> Real {real_tokens}")
-                    
-                key_manager.report_usage(current_api_key, tokens=real_tokens, model_id=real_model_id)
-
-                try:
-                    return result["candidates"][0]["content"]["parts"][0]["text"].strip()
-                except (KeyError, IndexError):
-                    logger.log(f"⚠️ Invalid JSON Structure: {result}")
-                    key_manager.report_failure(current_api_key, is_info_error=True)
-                    continue 
-
-            elif response.status_code == 429:
-                err_text = response.text
-                if "limit: 0" in err_text or "Quota exceeded" in err_text:
-                    logger.log(f"⛔ BILLING ISSUE on '{key_name}'. Google says Quota is 0.")
-                    key_manager.report_failure(current_api_key, is_info_error=False) 
-                else:
-                    logger.log(f"⛔ 429 Rate Limit on '{key_name}'. Triggering 60s Cooldown.")
-                    key_manager.report_failure(current_api_key, is_info_error=False)
-            elif response.status_code >= 500:
-                logger.log(f"☁️ {response.status_code} Server Error. Waiting 10s...")
-                key_manager.report_failure(current_api_key, is_info_error=True)
-                time.sleep(10) # Give the server breathing room
-            else:
-                logger.log(f"⚠️ API Error {response.status_code}: {response.text}")
-                key_manager.report_failure(current_api_key, is_info_error=True)
-
-        except Exception as e:
-            logger.log(f"💥 Exception: {str(e)}")
-            if current_api_key:
-                key_manager.report_failure(current_api_key, is_info_error=True)
-        
-        if i < max_retries - 1:
-            time.sleep(2 ** i)
+# Parsed once; default_company_card hands out copies with the ticker filled in.
+# strict=False: the screener_briefing literal holds raw newlines, which strict parsers reject.
+_DEFAULT_COMPANY_CARD = json.loads(DEFAULT_COMPANY_OVERVIEW_JSON, strict=False)
 
-    logger.log("❌ FATAL: Max retries exhausted.")
-    return None
-    
+def default_company_card(ticker: str) -> dict:
+    """Fresh copy of the default company card for `ticker` (safe for the caller to mutate)."""
+    card = copy.deepcopy(_DEFAULT_COMPANY_CARD)
+    card["marketNote"] = f"Executor's Battle Card: {ticker}"
+    card["basicContext"]["tickerDate"] = f"{ticker} | Date"
+    return card
 
-# --- REFACTORED: update_company_card (PROMPT IS GOOD) ---
-def update_company_card(
-    ticker: str, 
-    previous_card_json: str, 
-    previous_card_date: str, 
-    historical_notes: str, 
-    new_eod_summary: str, 
-    new_eod_date: date, 
-    model_name: str,
-    key_manager: KeyManager, # Explicit
-    pre_fetched_context: str, # JSON String passed from main thread
-    market_context_summary: str, 
-    logger: AppLogger = None
-):
-    """
-    Generates an updated company overview card using AI.
-    """
-    if logger is None:
-        logger = AppLogger(None)
-
-    logger.log(f"--- Starting Company Card AI update for {ticker} ---")
-
-    try:
-        previous_overview_card_dict = json.loads(previous_card_json)
-        logger.log("1. Parsed previous company card.")
-    except (json.JSONDecodeError, TypeError):
-        logger.log("   ...Warn: Could not parse previous card. Starting from default.")
-        previous_overview_card_dict = json.loads(DEFAULT_COMPANY_OVERVIEW_JSON.replace("TICKER", ticker))
-
-    # --- Extract the keyActionLog from the previous card ---
-    previous_action_log = previous_overview_card_dict.get("technicalStructure", {}).get("keyActionLog", [])
-    if isinstance(previous_action_log, list):
-        recent_log_entries = previous_action_log[-5:]
-    else:
-        recent_log_entries = []
-
-    logger.log("2. Building EOD Note Generator Prompt...")
-    
-    # --- FINAL System Prompt ---
-    system_prompt = (
-        "You are an expert market structure analyst. Your *only* job is to apply the specific 4-Participant Trading Model provided in the user's prompt. "
-        "Your logic must *strictly* follow this model. You will be given a 'Masterclass' in the prompt that defines the model's philosophy. "
-        "Your job has **four** distinct analytical tasks: "
-        "1. **Analyze `behavioralSentiment` (The 'Micro'):** You MUST provide a full 'Proof of Reasoning' for the `emotionalTone` field. "
-        "2. **Analyze `technicalStructure` (The 'Macro'):** Use *repeated* participant behavior to define and evolve the *key structural zones*. "
-        "3. **Calculate `confidence` (The 'Story'):** You MUST combine the lagging 'Trend_Bias' with the 'Story_Confidence' (H/M/L) and provide a full justification. "
-        "4. **Calculate `screener_briefing` (The 'Tactic'):** You MUST synthesize your *entire* analysis to calculate a *new, separate, actionable* 'Setup_Bias' and assemble the final Python-readable data packet. "
-        "Do not use any of your own default logic. Your sole purpose is to be a processor for the user's provided framework."
-    )
-
-    
-    trade_date_str = new_eod_date.isoformat()
-
-    # --- IMPACT ENGINE INTEGRATION (Pre-Fetched) ---
-    impact_context_json = pre_fetched_context
-    logger.log(f"✅ Using Pre-Fetched Context for {ticker} (Length: {len(impact_context_json)})")
+from typing import Optional
 
-    # --- FINAL Main 'Masterclass' Prompt ---
-    prompt = f"""
+# ```json fenced block in an AI reply
+_JSON_FENCE_RE = re.compile(r"```json\s*([\s\S]+?)\s*```")
+
+# 4-Participant model persona for the EOD note generator; identical on every call.
+_SYS_EOD_NOTE = (
+    "You are an expert market structure analyst. Your *only* job is to apply the specific 4-Participant Trading Model provided in the user's prompt. "
+    "Your logic must *strictly* follow this model. You will be given a 'Masterclass' in the prompt that defines the model's philosophy. "
+    "Your job has **four** distinct analytical tasks: "
+    "1. **Analyze `behavioralSentiment` (The 'Micro'):** You MUST provide a full 'Proof of Reasoning' for the `emotionalTone` field. "
+    "2. **Analyze `technicalStructure` (The 'Macro'):** Use *repeated* participant behavior to define and evolve the *key structural zones*. "
+    "3. **Calculate `confidence` (The 'Story'):** You MUST combine the lagging 'Trend_Bias' with the 'Story_Confidence' (H/M/L) and provide a full justification. "
+    "4. **Calculate `screener_briefing` (The 'Tactic'):** You MUST synthesize your *entire* analysis to calculate a *new, separate, actionable* 'Setup_Bias' and assemble the final Python-readable data packet. "
+    "Do not use any of your own default logic. Your sole purpose is to be a processor for the user's provided framework."
+)
+
+# 'Masterclass' EOD prompt. Built once at import; the per-ticker slots are filled
+# with format_map, so literal JSON braces stay doubled as in the old f-string.
+# Split in three so the batch prompt can repeat only the per-ticker block.
+_EOD_MARKET_TEMPLATE = """
     [Raw Market Context for Today]
     (This contains RAW, unstructured news headlines and snippets from various sources. You must synthesize the macro "Headwind" or "Tailwind" yourself from this data. It also contains company-specific news.)
-    {market_context_summary or "No raw market news was provided."}
+    {market_context_summary}
+"""
 
+_EOD_TICKER_TEMPLATE = """
     [Historical Notes for {ticker}]
     (CRITICAL STATIC CONTEXT: These are the MAJOR structural levels. LEVELS ARE PARAMOUNT.)
-    {historical_notes or "No historical notes provided."}
+    {historical_notes}
     
     [Previous Card (Read-Only)]
     (This is established structure, plans, and `keyActionLog` so far. Read this for the 3-5 day context AND to find the previous 'recentCatalyst' and 'fundamentalContext' data.) 
-    {json.dumps(previous_overview_card_dict, indent=2)}
+    {previous_card_json}
 
     [Log of Recent Key Actions (Read-Only)]
     (This is the day-by-day story so far. Use this for context.)
-    {json.dumps(recent_log_entries, indent=2)}
+    {recent_log_json}
 
     [Today's New Price Action Summary (IMPACT CONTEXT CARD)]
     (Use this structured 'Value Migration Log' and 'Impact Levels' to determine the 'Nature' of the session.)
     {impact_context_json}
 
-    [Your Task for {trade_date_str}]
+"""
+
+_EOD_TASK_TEMPLATE = """    [Your Task for {trade_date_str}]
     Your task is to populate the JSON template below. You MUST use the following trading model to generate your analysis.
 
     --- START MASTERCLASS: THE 4-PARTICIPANT MODEL ---
@@ -461,30 +341,391 @@ def update_company_card(
       "todaysAction": "A single, detailed log entry for *only* today's action, *using the language from your Masterclass analysis*."
     }}
     """
-    
-    logger.log(f"3. Calling EOD AI Analyst for {ticker}...");
-    print(f"[DEBUG] {ticker}: Prompt Length: {len(prompt)} chars. KeyManager Provided: {key_manager is not None}")
-    
-    ai_response_text = call_gemini_api(prompt, system_prompt, logger, model_name=model_name, key_manager=key_manager)
-    
-    if not ai_response_text: 
-        print(f"[DEBUG] {ticker}: NO AI RESPONSE RECEIVED.")
-        logger.log(f"Error: No AI response for {ticker}."); 
+
+_EOD_PROMPT_TEMPLATE = _EOD_MARKET_TEMPLATE + _EOD_TICKER_TEMPLATE + _EOD_TASK_TEMPLATE
+
+# Appended to the batch prompt in place of a single-card reply.
+_EOD_BATCH_OUTPUT_NOTE = """
+    [Batch Output Constraint]
+    The sections above cover several tickers; <TICKER> in the template stands for each one.
+    Output ONLY a single JSON object whose keys are exactly these tickers: {tickers}.
+    Each value is that ticker's card in the format above, built only from that ticker's own section.
+    """
+
+# --- Gemini explicit context cache (cachedContents) ---
+# The static batch instructions are uploaded once per (key, model) and referenced by
+# handle, so each request only ships the per-ticker sections.
+_CACHED_CONTENTS_URL = API_BASE_URL.rsplit("/", 1)[0] + "/cachedContents"
+_CONTEXT_CACHE_TTL = 3600
+_CONTEXT_CACHE: dict = {}  # (api_key, model_id, hash(system), hash(static)) -> (name | None, expires_at)
+_CONTEXT_CACHE_LOCK = threading.Lock()
+# cache_key -> Event set once the in-flight create for that key finishes. The POST runs
+# outside _CONTEXT_CACHE_LOCK, so only callers after the same handle wait on it.
+_CONTEXT_CACHE_PENDING: dict = {}
+
+
+def _context_cache_key(api_key: str, model_id: str, system_prompt: str, static_prompt: str) -> tuple:
+    return (api_key, model_id, hash(system_prompt), hash(static_prompt))
+
+
+def _cached_content_name(api_key: str, model_id: str, system_prompt: str, static_prompt: str, logger: AppLogger) -> Optional[str]:
+    """
+    Returns the cachedContents handle holding system_prompt + static_prompt for this
+    key/model, creating it on first use. None when the key or model cannot cache
+    (e.g. free tier, or too few tokens); that answer is remembered for the TTL too.
+    """
+    cache_key = _context_cache_key(api_key, model_id, system_prompt, static_prompt)
+    while True:
+        with _CONTEXT_CACHE_LOCK:
+            entry = _CONTEXT_CACHE.get(cache_key)
+            if entry and entry[1] > time.time():
+                return entry[0]
+            pending = _CONTEXT_CACHE_PENDING.get(cache_key)
+            if pending is None:
+                # Reserve the key: this caller creates the handle, same-key callers wait
+                pending = _CONTEXT_CACHE_PENDING[cache_key] = threading.Event()
+                break
+        if not pending.wait(timeout=GEMINI_CONNECT_TIMEOUT + 60):
+            return None  # creator is stuck: send the full prompt rather than wait longer
+
+    name = None
+    now = time.time()
+    try:
+        response = _GEMINI_SESSION.post(
+            f"{_CACHED_CONTENTS_URL}?key={api_key}",
+            data=encode_json({
+                "model": f"models/{model_id}",
+                "systemInstruction": {"parts": [{"text": system_prompt}]},
+                "contents": [{"role": "user", "parts": [{"text": static_prompt}]}],
+                "ttl": f"{_CONTEXT_CACHE_TTL}s",
+            }),
+            timeout=(GEMINI_CONNECT_TIMEOUT, 60),
+        )
+        if response.status_code == 200:
+            name = loads_json(response.content).get("name")
+            logger.log(f"   ...Cached static prompt for {model_id} as {name}.")
+        else:
+            logger.log(f"   ...Context cache unavailable for {model_id} ({response.status_code}). Sending full prompt.")
+    except Exception as e:
+        logger.log(f"   ...Context cache request failed: {e}. Sending full prompt.")
+    finally:
+        with _CONTEXT_CACHE_LOCK:
+            # Expire our handle a minute before the server does
+            _CONTEXT_CACHE[cache_key] = (name, now + _CONTEXT_CACHE_TTL - 60)
+            _CONTEXT_CACHE_PENDING.pop(cache_key, None)
+        pending.set()
+    return name
+
+
+def _read_sse_text(response) -> tuple[Optional[str], dict]:
+    """
+    Collects the reply text from a streamGenerateContent (alt=sse) response as the
+    events arrive. Text after the first top-level JSON object has closed is dropped,
+    but the stream is read to its end: usageMetadata can arrive in a later event.
+    """
+    chunks, usage_meta, seen_text = [], {}, False
+    depth, in_str, escaped, started = 0, False, False, False
+    for line in response.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        event = loads_json(line[5:])
+        usage_meta = event.get("usageMetadata", usage_meta)
+        if started and depth == 0:
+            continue  # reply complete: only the usage counts matter now
+        candidates = event.get("candidates") or [{}]
+        for part in candidates[0].get("content", {}).get("parts", []):
+            text = part.get("text", "")
+            seen_text = True
+            chunks.append(text)
+            for ch in text:
+                if in_str:
+                    if escaped:
+                        escaped = False
+                    elif ch == "\\":
+                        escaped = True
+                    elif ch == '"':
+                        in_str = False
+                elif ch == '"':
+                    in_str = started
+                elif ch == "{":
+                    depth += 1
+                    started = True
+                elif ch == "}" and started:
+                    depth -= 1
+    return ("".join(chunks) if seen_text else None), usage_meta
+
+
+def _drop_cached_content(api_key: str, model_id: str, system_prompt: str, static_prompt: str) -> None:
+    with _CONTEXT_CACHE_LOCK:
+        _CONTEXT_CACHE.pop(_context_cache_key(api_key, model_id, system_prompt, static_prompt), None)
+
+
+# --- The Robust API Caller (V8) ---
+def call_gemini_api(prompt: str, system_prompt: str, logger: AppLogger, model_name: str, key_manager: KeyManager, max_retries=3, generation_config: Optional[dict] = None, static_prompt: Optional[str] = None, stream: bool = False) -> Optional[str]:
+    """
+    Calls Gemini API using dynamic model selection and quota management.
+    Requires an explicit KeyManager instance for thread-safety.
+    `generation_config` is passed through as the request's generationConfig
+    (e.g. {"responseMimeType": "application/json"}).
+    `static_prompt` is instruction text that precedes `prompt` and never changes
+    between calls; it is served from a Gemini context cache when the key allows it.
+    `stream` reads the reply over SSE and returns once its JSON object is complete.
+    """
+    if not key_manager:
+        logger.log("❌ ERROR: KeyManager not provided.")
         return None
     
-    print(f"[DEBUG] {ticker}: AI Response Received ({len(ai_response_text)} chars). Parsing...")
-    logger.log(f"4. Received EOD Card for {ticker}. Parsing & Validating...")
+    # Estimate tokens for quota check
+    est_tok = key_manager.estimate_tokens((static_prompt or "") + prompt + system_prompt)
+    logger.log(f"📝 Request Size Estimate: ~{est_tok} tokens")
+
+    # Payload is identical for every retry, so serialize it once up front
+    parts = [{"text": static_prompt}, {"text": prompt}] if static_prompt else [{"text": prompt}]
+    payload = {
+        "contents": [{"parts": parts}], 
+        "systemInstruction": {"parts": [{"text": system_prompt}]}
+    }
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    body = encode_json(payload)
+    cached_payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if generation_config:
+        cached_payload["generationConfig"] = generation_config
+
+    for i in range(max_retries):
+        current_api_key = None
+        key_name = "Unknown"
+        backoff = True
+
+        try:
+            # 1. ACQUIRE: Request key specifically for this model's bucket
+            # Returns: (key_name, key_value, wait_time, real_model_id)
+            key_name, current_api_key, wait_time, real_model_id = key_manager.get_key(config_id=model_name, estimated_tokens=est_tok)
+            
+            if not current_api_key:
+                if wait_time == -1.0:
+                    logger.log(f"❌ FATAL: Prompt too large for {model_name} limits.")
+                    return None
+                
+                logger.log(f"⏳ All keys exhausted for {model_name}. Waiting {wait_time:.0f}s... (Attempt {i+1})")
+                if wait_time > 0 and i < max_retries - 1:
+                    time.sleep(wait_time)
+                    continue
+                else:
+                    logger.log(f"❌ ERROR: Global rate limit reached for {model_name}.")
+                    return None
+            
+            logger.log(f"🔑 Acquired '{key_name}' | Model: {model_name} (ID: {real_model_id}) (Attempt {i+1})")
+            
+            # 2. USE: Construct Dynamic URL using the internal model ID
+            if stream:
+                gemini_url = f"{API_BASE_URL}/{real_model_id}:streamGenerateContent?alt=sse&key={current_api_key}"
+            else:
+                gemini_url = f"{API_BASE_URL}/{real_model_id}:generateContent?key={current_api_key}"
+
+            cache_name = None
+            if static_prompt:
+                cache_name = _cached_content_name(current_api_key, real_model_id, system_prompt, static_prompt, logger)
+            if cache_name:
+                request_body = encode_json({**cached_payload, "cachedContent": cache_name})
+            else:
+                request_body = body
+            
+            response = _GEMINI_SESSION.post(gemini_url, data=request_body, timeout=(GEMINI_CONNECT_TIMEOUT, 60), stream=stream)
+            
+            # Every branch releases the pooled connection, including unread streamed bodies
+            try:
+                # 3. REPORT: Pass internal model_id for correct counter increment
+                if response.status_code == 200:
+                    if stream:
+                        text, usage_meta = _read_sse_text(response)
+                        result = None
+                    else:
+                        result = loads_json(response.content)
+                        usage_meta = result.get("usageMetadata", {})
+                        try:
+                            text = result["candidates"][0]["content"]["parts"][0]["text"]
+                        except (KeyError, IndexError):
+                            text = None
+                
+                    # V8 FIX: Use REAL usage data if available
+                    real_tokens = usage_meta.get("totalTokenCount", est_tok) # fallback to estimate
+                
+                    # Log the correction if significant
+                    if real_tokens > est_tok * 1.2:
+                        logger.log(f"   ...Usage Correction: Est {est_tok} -> Real {real_tokens}")
+                    
+                    key_manager.report_usage(current_api_key, tokens=real_tokens, model_id=real_model_id)
+
+                    if text is None:
+                        if stream:
+                            logger.log(f"⚠️ Empty stream from '{key_name}': no reply text arrived.")
+                        else:
+                            logger.log(f"⚠️ Invalid JSON Structure: {result}")
+                        key_manager.report_failure(current_api_key, is_info_error=True)
+                        continue 
+                    return text.strip()
+
+                elif response.status_code == 429:
+                    err_text = response.text
+                    if "limit: 0" in err_text or "Quota exceeded" in err_text:
+                        logger.log(f"⛔ BILLING ISSUE on '{key_name}'. Google says Quota is 0.")
+                        key_manager.report_failure(current_api_key, is_info_error=False) 
+                    else:
+                        logger.log(f"⛔ 429 Rate Limit on '{key_name}'. Triggering 60s Cooldown.")
+                        key_manager.report_failure(current_api_key, is_info_error=False)
+                    # The key is cooling down; get_key() hands out another one (or a wait_time)
+                    backoff = False
+                elif response.status_code >= 500:
+                    logger.log(f"☁️ {response.status_code} Server Error. Waiting 10s...")
+                    key_manager.report_failure(current_api_key, is_info_error=True)
+                    time.sleep(10) # Give the server breathing room
+                    backoff = False
+                elif cache_name and response.status_code in (400, 403, 404):
+                    # Cache expired or was evicted server-side: rebuild it on the next attempt
+                    logger.log(f"⚠️ Cached context rejected ({response.status_code}). Rebuilding.")
+                    _drop_cached_content(current_api_key, real_model_id, system_prompt, static_prompt)
+                    key_manager.report_failure(current_api_key, is_info_error=True)
+                    backoff = False
+                else:
+                    logger.log(f"⚠️ API Error {response.status_code}: {response.text}")
+                    key_manager.report_failure(current_api_key, is_info_error=True)
+            finally:
+                response.close()
+
+        except Exception as e:
+            logger.log(f"💥 Exception: {str(e)}")
+            if current_api_key:
+                key_manager.report_failure(current_api_key, is_info_error=True)
+        
+        if backoff and i < max_retries - 1:
+            time.sleep(2 ** i)
+
+    logger.log("❌ FATAL: Max retries exhausted.")
+    return None
     
-    json_match = re.search(r"```json\s*([\s\S]+?)\s*```", ai_response_text)
+
+def deep_update(dst: dict, src: dict) -> dict:
+    """Merges `src` into `dst` in place, walking nested dicts with an explicit stack.
+
+    Nested dicts missing from `dst` are rebuilt as new dicts, so `dst` never shares
+    a subtree with `src`.
+    """
+    stack = [(dst, src)]
+    while stack:
+        d, u = stack.pop()
+        for k, v in u.items():
+            if isinstance(v, dict):
+                if not isinstance(d.get(k), dict):
+                    d[k] = {}
+                stack.append((d[k], v))
+            else:
+                d[k] = v
+    return dst
+
+
+# Each recent log entry is cut to this many characters in the prompt.
+_LOG_ACTION_MAX_CHARS = 500
+
+
+def _project_previous_card(card: dict) -> dict:
+    """
+    Prompt view of a stored card. The keyActionLog grows by one entry per session and
+    its last entries already go out as their own section, so the card copy drops it.
+    """
+    tech = card.get("technicalStructure")
+    if not isinstance(tech, dict) or "keyActionLog" not in tech:
+        return card
+    return {**card, "technicalStructure": {k: v for k, v in tech.items() if k != "keyActionLog"}}
+
+
+def _summarize_log_entries(entries: list) -> list:
+    return [
+        {"date": e.get("date"), "action": str(e.get("action", ""))[:_LOG_ACTION_MAX_CHARS]}
+        for e in entries if isinstance(e, dict)
+    ]
+
+
+@functools.lru_cache(maxsize=128)
+def _previous_card_text(card_json: str) -> str:
+    """Indented prompt copy of a stored card, memoized on the raw JSON so a re-run skips re-serializing."""
+    return dumps_json(_project_previous_card(loads_json(card_json)), indent=True)
+
+
+def build_ticker_payload(
+    ticker: str,
+    previous_card_json: str,
+    historical_notes: str,
+    pre_fetched_context: str,
+    logger: AppLogger,
+) -> tuple[dict, dict]:
+    """
+    Parses the previous card and returns (previous_card_dict, prompt_slots), where
+    prompt_slots holds only the per-ticker parts of the EOD prompt.
+    """
+    try:
+        previous_overview_card_dict = loads_json(previous_card_json)
+        previous_card_text = _previous_card_text(previous_card_json)
+        logger.log("1. Parsed previous company card.")
+    except (json.JSONDecodeError, TypeError):
+        logger.log("   ...Warn: Could not parse previous card. Starting from default.")
+        previous_overview_card_dict = default_company_card(ticker)
+        previous_card_text = dumps_json(_project_previous_card(previous_overview_card_dict), indent=True)
+
+    # --- Extract the keyActionLog from the previous card ---
+    previous_action_log = previous_overview_card_dict.get("technicalStructure", {}).get("keyActionLog", [])
+    if isinstance(previous_action_log, list):
+        recent_log_entries = _summarize_log_entries(previous_action_log[-5:])
+    else:
+        recent_log_entries = []
+    if isinstance(previous_card_json, str) and previous_card_json:
+        logger.log(f"   ...Previous card for prompt: {len(previous_card_json)} -> {len(previous_card_text)} chars.")
+
+    # --- IMPACT ENGINE INTEGRATION (Pre-Fetched) ---
+    logger.log(f"✅ Using Pre-Fetched Context for {ticker} (Length: {len(pre_fetched_context)})")
+
+    return previous_overview_card_dict, {
+        "ticker": ticker,
+        "historical_notes": historical_notes or "No historical notes provided.",
+        "previous_card_json": previous_card_text,
+        "recent_log_json": dumps_json(recent_log_entries, indent=True),
+        "impact_context_json": pre_fetched_context,
+    }
+
+
+def _parse_reply_object(ai_response_text: str, label: str, logger: AppLogger) -> Optional[dict]:
+    """
+    Parses an AI reply into a JSON object, stripping an optional ```json fence.
+    Shared by the single-card and batched paths; logs and returns None on bad JSON.
+    """
+    # Bare JSON (the usual structured-output reply) needs no regex pass
+    stripped = ai_response_text.strip()
+    json_match = None if stripped.startswith("{") else _JSON_FENCE_RE.search(ai_response_text)
     if json_match:
-        print(f"[DEBUG] {ticker}: JSON Code Block Found.")
-        ai_response_text = json_match.group(1)
+        print(f"[DEBUG] {label}: JSON Code Block Found.")
+        stripped = json_match.group(1)
     else:
-        print(f"[DEBUG] {ticker}: No JSON Block. Attempting raw parse.")
-        ai_response_text = ai_response_text.strip()
-    
+        print(f"[DEBUG] {label}: No JSON Block. Attempting raw parse.")
+    try:
+        ai_data = loads_json(stripped)
+    except json.JSONDecodeError as e:
+        logger.log(f"Error: Failed to decode AI response JSON for {label}. Details: {e}")
+        return None
+    if not isinstance(ai_data, dict):
+        logger.log(f"Unexpected error validating AI response for {label}: reply is not a JSON object")
+        return None
+    return ai_data
+
+
+def _finalize_company_card(
+    ticker: str,
+    previous_overview_card_dict: dict,
+    ai_data: dict,
+    trade_date_str: str,
+    logger: AppLogger,
+) -> Optional[dict]:
+    """Merges one AI card update into the previous card and appends today's log entry."""
     try:
-        ai_data = json.loads(ai_response_text)
         new_action = ai_data.pop("todaysAction", None)
         
         if not new_action:
@@ -499,14 +740,6 @@ def update_company_card(
         
         # 2. **Deeply update** the card with the new AI data
         # This merges the new data (plans, sentiment) while preserving read-only fields
-        def deep_update(d, u):
-            for k, v in u.items():
-                if isinstance(v, dict):
-                    d[k] = deep_update(d.get(k, {}), v)
-                else:
-                    d[k] = v
-            return d
-        
         final_card = deep_update(final_card, ai_data)
         
         # 3. Manually update fields the AI shouldn't control
@@ -522,29 +755,196 @@ def update_company_card(
         if 'keyAction' in final_card['technicalStructure']:
             del final_card['technicalStructure']['keyAction']
 
-        # Prevent duplicate entries if re-running
-        if not any(entry.get('date') == trade_date_str for entry in final_card['technicalStructure']['keyActionLog']):
-            final_card['technicalStructure']['keyActionLog'].append({
-                "date": trade_date_str,
-                "action": new_action
-            })
+        # Prevent duplicate entries if re-running (one dict lookup instead of two list scans)
+        log = final_card['technicalStructure']['keyActionLog']
+        idx_by_date = {}
+        for i, entry in enumerate(log):
+            if isinstance(entry, dict):
+                idx_by_date.setdefault(entry.get('date'), i)
+        new_entry = {"date": trade_date_str, "action": new_action}
+        i = idx_by_date.get(trade_date_str)
+        if i is None:
+            log.append(new_entry)
         else:
             logger.log("   ...Log entry for this date already exists. Overwriting.")
-            # Find and overwrite the existing entry
-            for i, entry in enumerate(final_card['technicalStructure']['keyActionLog']):
-                if entry.get('date') == trade_date_str:
-                    final_card['technicalStructure']['keyActionLog'][i] = {
-                        "date": trade_date_str,
-                        "action": new_action
-                    }
-                    break
+            log[i] = new_entry
 
         logger.log(f"--- Success: AI update for {ticker} complete. ---")
-        return json.dumps(final_card, indent=4) # Return the full, new card
+        return final_card # Return the full, new card
 
-    except json.JSONDecodeError as e:
-        logger.log(f"Error: Failed to decode AI response JSON for {ticker}. Details: {e}")
-        return None
     except Exception as e:
         logger.log(f"Unexpected error validating AI response for {ticker}: {e}")
         return None
+
+
+# --- REFACTORED: update_company_card (PROMPT IS GOOD) ---
+def update_company_card(
+    ticker: str, 
+    previous_card_json: str, 
+    previous_card_date: str, 
+    historical_notes: str, 
+    new_eod_summary: str, 
+    new_eod_date: date, 
+    model_name: str,
+    key_manager: KeyManager, # Explicit
+    pre_fetched_context: str, # JSON String passed from main thread
+    market_context_summary: str, 
+    logger: AppLogger = None,
+    *,
+    as_dict: bool = False,
+):
+    """
+    Generates an updated company overview card using AI.
+    Returns the card as indented JSON, or as the dict itself when `as_dict` is set
+    so callers that store it can serialize once at the DB boundary.
+    """
+    if logger is None:
+        logger = AppLogger(None)
+
+    logger.log(f"--- Starting Company Card AI update for {ticker} ---")
+
+    previous_overview_card_dict, slots = build_ticker_payload(
+        ticker, previous_card_json, historical_notes, pre_fetched_context, logger
+    )
+
+    logger.log("2. Building EOD Note Generator Prompt...")
+    
+    system_prompt = _SYS_EOD_NOTE
+    trade_date_str = new_eod_date.isoformat()
+
+    # --- FINAL Main 'Masterclass' Prompt ---
+    prompt = _EOD_PROMPT_TEMPLATE.format_map({
+        **slots,
+        "trade_date_str": trade_date_str,
+        "market_context_summary": market_context_summary or "No raw market news was provided.",
+    })
+    
+    logger.log(f"3. Calling EOD AI Analyst for {ticker}...");
+    print(f"[DEBUG] {ticker}: Prompt Length: {len(prompt)} chars. KeyManager Provided: {key_manager is not None}")
+    
+    ai_response_text = call_gemini_api(prompt, system_prompt, logger, model_name=model_name, key_manager=key_manager, stream=True)
+    
+    if not ai_response_text: 
+        print(f"[DEBUG] {ticker}: NO AI RESPONSE RECEIVED.")
+        logger.log(f"Error: No AI response for {ticker}."); 
+        return None
+    
+    print(f"[DEBUG] {ticker}: AI Response Received ({len(ai_response_text)} chars). Parsing...")
+    logger.log(f"4. Received EOD Card for {ticker}. Parsing & Validating...")
+    
+    ai_data = _parse_reply_object(ai_response_text, ticker, logger)
+    if ai_data is None:
+        return None
+    final_card = _finalize_company_card(ticker, previous_overview_card_dict, ai_data, trade_date_str, logger)
+    if final_card is None or as_dict:
+        return final_card
+    return dumps_json(final_card, indent=True)
+
+
+# Output budget for one card in a batched reply (a finished card runs ~1.5k tokens), and
+# the most one reply may ask for: the smallest output limit among the routed models.
+_CARD_OUTPUT_TOKENS = 2048
+_BATCH_OUTPUT_TOKEN_CAP = 8192
+
+
+def update_company_cards_batch(
+    tickers_payloads: dict[str, dict],
+    new_eod_date: date,
+    model_name: str,
+    key_manager: KeyManager,
+    market_context_summary: str,
+    logger: AppLogger = None,
+) -> dict[str, Optional[dict]]:
+    """
+    Generates company cards for several tickers with ONE Gemini request.
+
+    `tickers_payloads` maps ticker -> {"previous_card": str, "impact_context": str,
+    "historical_notes": str}. The market context and the masterclass instructions are
+    sent once instead of once per ticker, and the reply is a JSON object keyed by
+    ticker. Tickers missing from (or malformed in) the reply fall back to
+    update_company_card. Returns ticker -> card dict (None on failure).
+    """
+    if logger is None:
+        logger = AppLogger(None)
+    if not tickers_payloads:
+        return {}
+
+    tickers = list(tickers_payloads)
+    per_request = max(1, _BATCH_OUTPUT_TOKEN_CAP // _CARD_OUTPUT_TOKENS)
+    if len(tickers) > per_request:
+        # A reply cut off at the output limit would send every card to the single path
+        results = {}
+        for i in range(0, len(tickers), per_request):
+            chunk = {t: tickers_payloads[t] for t in tickers[i:i + per_request]}
+            results.update(update_company_cards_batch(
+                chunk, new_eod_date, model_name, key_manager, market_context_summary, logger
+            ))
+        return results
+
+    logger.log(f"--- Starting batched Company Card AI update for {', '.join(tickers)} ---")
+    trade_date_str = new_eod_date.isoformat()
+
+    previous_cards, blocks = {}, []
+    for ticker in tickers:
+        data = tickers_payloads[ticker]
+        previous_cards[ticker], slots = build_ticker_payload(
+            ticker, data.get("previous_card", "{}"), data.get("historical_notes", ""),
+            data.get("impact_context", "{}"), logger
+        )
+        blocks.append(f"\n    ===== TICKER: {ticker} ====={_EOD_TICKER_TEMPLATE.format_map(slots)}")
+
+    # The masterclass/task block names no ticker, so it is the cacheable prefix;
+    # the market context, ticker sections and output keys follow it.
+    static_prompt = _EOD_TASK_TEMPLATE.format_map({"ticker": "<TICKER>", "trade_date_str": trade_date_str})
+    prompt = (
+        _EOD_MARKET_TEMPLATE.format_map({
+            "market_context_summary": market_context_summary or "No raw market news was provided.",
+        })
+        + "".join(blocks)
+        + _EOD_BATCH_OUTPUT_NOTE.format(tickers=dumps_json(tickers))
+    )
+
+    logger.log(f"3. Calling EOD AI Analyst for {len(tickers)} tickers in one request...")
+    ai_response_text = call_gemini_api(
+        prompt, _SYS_EOD_NOTE, logger, model_name=model_name, key_manager=key_manager,
+        generation_config={
+            "responseMimeType": "application/json",
+            "maxOutputTokens": len(tickers) * _CARD_OUTPUT_TOKENS,
+        },
+        static_prompt=static_prompt,
+        stream=True,
+    )
+
+    ai_cards = {}
+    if ai_response_text:
+        ai_cards = _parse_reply_object(ai_response_text, "batch", logger) or {}
+    else:
+        logger.log("Error: No AI response for batch.")
+
+    results = {}
+    for ticker in tickers:
+        ai_data = ai_cards.get(ticker)
+        if isinstance(ai_data, dict):
+            results[ticker] = _finalize_company_card(ticker, previous_cards[ticker], ai_data, trade_date_str, logger)
+            if results[ticker] is None:
+                logger.log(f"   ...{ticker}'s batched card failed validation. Falling back to a single-ticker call.")
+        else:
+            results[ticker] = None
+            logger.log(f"   ...{ticker} missing from batched reply. Falling back to a single-ticker call.")
+        if results[ticker] is None:
+            data = tickers_payloads[ticker]
+            results[ticker] = update_company_card(
+                ticker=ticker,
+                previous_card_json=data.get("previous_card", "{}"),
+                previous_card_date="",
+                historical_notes=data.get("historical_notes", ""),
+                new_eod_summary="",
+                new_eod_date=new_eod_date,
+                model_name=model_name,
+                key_manager=key_manager,
+                pre_fetched_context=data.get("impact_context", "{}"),
+                market_context_summary=market_context_summary,
+                logger=logger,
+                as_dict=True,
+            )
+    return results
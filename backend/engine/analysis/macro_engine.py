@@ -1,10 +1,28 @@
 from __future__ import annotations
-import json
 import re
 from datetime import date
-from backend.engine.utils import AppLogger
+from backend.engine.utils import AppLogger, dumps_json
 from backend.engine.key_manager import KeyManager
 
+# Static 'Senior Market Analyst' persona; only the user prompt varies per run.
+_SYS_MACRO = (
+    "You are a Senior Market Analyst and Trading Desk Lead. Your mission is to provide a high-level 'Executive Briefing' of the market session by synthesizing global news and price data.\n\n"
+    
+    "**WRITING STYLE GUIDELINES:**\n"
+    "1. **Professional & Accessible:** Sound like a professional trader or Bloomberg analyst. Avoid heavy technical jargon or academic tone.\n"
+    "2. **The 'Why':** Explain the connection between the major News (Trigger) and the Price Action (Verdict). Did the news surprise the market? Was it accepted or rejected?\n"
+    "3. **Narrative Clarity:** Instead of technical terms like 'Committed/Desperate' or 'Closing the Ledger', use descriptive professional language such as 'Institutional Support,' 'Aggressive Selling,' 'Price discovery,' or 'Risk-off rotation.'\n"
+    "4. **Synthesis:** Combine bond yields, currencies, and sector flow into a single cohesive story that explains the current market regime.\n\n"
+
+    "**DATA INTEGRITY PROTOCOL (CRITICAL):**\n"
+    "- **No Hallucinations:** Only analyze the data provided in the sections below.\n"
+    "- **Acknowledge Missing Data:** If a ticker or sector mentioned in the schema (e.g., QQQ, Bonds, VIX) is missing from the input data, do NOT assume its state. Explicitly state 'Data not provided' or 'Ticker missing from scan' in the relevant field.\n"
+    "- **Focus on Evidence:** Your narrative must be grounded in the provided price action and news. If the evidence is thin, be neutral and state that the trend is unclear due to lack of participation.\n\n"
+
+    "**YOUR OUTPUT: A PROFESSIONAL BRIEFING**\n"
+    "Produce a cohesive `marketNarrative` paragraph that explains current market dynamics. It should be punchy, insightful, and easy for a trader to process in 30 seconds.\n"
+)
+
 # --- DEFAULT MACRO TEMPLATE (Narrative Compliant) ---
 DEFAULT_ECONOMY_CARD_JSON = """
 {
@@ -37,6 +55,62 @@ DEFAULT_ECONOMY_CARD_JSON = """
 }
 """
 
+# User prompt for the economy card; only the slots change between runs.
+_ECONOMY_PROMPT_TEMPLATE = """
+    [1. Previous Closing Context (The Anchor)]
+    {anchor}
+    {history_section}
+    [3. Raw Market News (THE TRIGGER)]
+    {news}
+    
+    [4. Automated Sentiment Analysis (THE TONE)]
+    {sentiment}
+
+    [5. Core Indices Structure (THE VERDICT)]
+    {scaling_notes}
+    {etf_structures}
+
+    [Your Task for {analysis_date}]
+    Synthesize the above data into a Global Economy Card.
+    
+    - **marketNarrative**: A rich, paragraph-length executive summary. Explain the 'Why' using professional financial reasoning, focusing on institutional flow and market sentiment.
+    - **marketBias**: Bullish/Bearish/Neutral/Volatile.
+    - **indexAnalysis/sectorRotation**: Analyze the flow of money.
+    - **todaysAction**: A single, punchy sentence for the log.
+
+    [Output Format Constraint]
+    Output ONLY a single, valid JSON object matching the schema below:
+    
+    {{
+        "marketNarrative": "The story of the session...",
+        "marketBias": "Neutral",
+        "keyEconomicEvents": {{
+            "last_24h": "...",
+            "next_24h": "..."
+        }},
+        "sectorRotation": {{
+            "leadingSectors": [],
+            "laggingSectors": [],
+            "rotationAnalysis": "..."
+        }},
+        "indexAnalysis": {{
+            "pattern": "U-Shape / Spike / ...",
+            "SPY": "...",
+            "QQQ": "..."
+        }},
+        "interMarketAnalysis": {{
+            "bonds": "Analysis of TLT/Yields.",
+            "commodities": "Analysis of Oil/Gold.",
+            "currencies": "Analysis of DXY.",
+            "crypto": "Analysis of BTC."
+        }},
+        "marketInternals": {{
+            "volatility": "Analysis of VIX."
+        }},
+        "todaysAction": "A single sentence summary."
+    }}
+    """
+
 def summarize_rolling_log(log: list[dict], logger: AppLogger) -> str:
     """
     Summarizes a long list of key actions into a concise 'Macro Arc'.
@@ -46,7 +120,7 @@ def summarize_rolling_log(log: list[dict], logger: AppLogger) -> str:
         return "No prior market action logged."
     
     if len(log) <= 7:
-        return json.dumps(log, indent=2)
+        return dumps_json(log, indent=True)
     
     # Structural Summarization (preserving the Arc)
     start_point = log[:2]
@@ -85,32 +159,20 @@ def generate_economy_card_prompt(
     if rolling_log is None: rolling_log = []
     
     # --- V8 SINGLE PATH HISTORY LOGIC ---
+    # The anchor card never carries its keyActionLog: it grows by one entry per session,
+    # so history goes out once, as the AI summary or the structural arc below.
     summarized_log = None
-    clean_eod = eod_card.copy() if eod_card else {}
+    clean_eod = {k: v for k, v in eod_card.items() if k != "keyActionLog"} if eod_card else {}
 
     if pre_summarized_context:
         summarized_log = f"### HISTORICAL MACRO ARC (AI Summary) ###\n{pre_summarized_context}\n### END HISTORICAL ARC ###"
-        if "keyActionLog" in clean_eod:
-            del clean_eod["keyActionLog"]
+    else:
+        log_entries = rolling_log or (eod_card or {}).get("keyActionLog") or []
+        if log_entries:
+            summarized_log = summarize_rolling_log(log_entries, logger)
 
     # --- 1. Construct System Prompt (The Senior Market Analyst) ---
-    system_prompt = (
-        "You are a Senior Market Analyst and Trading Desk Lead. Your mission is to provide a high-level 'Executive Briefing' of the market session by synthesizing global news and price data.\n\n"
-        
-        "**WRITING STYLE GUIDELINES:**\n"
-        "1. **Professional & Accessible:** Sound like a professional trader or Bloomberg analyst. Avoid heavy technical jargon or academic tone.\n"
-        "2. **The 'Why':** Explain the connection between the major News (Trigger) and the Price Action (Verdict). Did the news surprise the market? Was it accepted or rejected?\n"
-        "3. **Narrative Clarity:** Instead of technical terms like 'Committed/Desperate' or 'Closing the Ledger', use descriptive professional language such as 'Institutional Support,' 'Aggressive Selling,' 'Price discovery,' or 'Risk-off rotation.'\n"
-        "4. **Synthesis:** Combine bond yields, currencies, and sector flow into a single cohesive story that explains the current market regime.\n\n"
-
-        "**DATA INTEGRITY PROTOCOL (CRITICAL):**\n"
-        "- **No Hallucinations:** Only analyze the data provided in the sections below.\n"
-        "- **Acknowledge Missing Data:** If a ticker or sector mentioned in the schema (e.g., QQQ, Bonds, VIX) is missing from the input data, do NOT assume its state. Explicitly state 'Data not provided' or 'Ticker missing from scan' in the relevant field.\n"
-        "- **Focus on Evidence:** Your narrative must be grounded in the provided price action and news. If the evidence is thin, be neutral and state that the trend is unclear due to lack of participation.\n\n"
-
-        "**YOUR OUTPUT: A PROFESSIONAL BRIEFING**\n"
-        "Produce a cohesive `marketNarrative` paragraph that explains current market dynamics. It should be punchy, insightful, and easy for a trader to process in 30 seconds.\n"
-    )
+    system_prompt = _SYS_MACRO
 
     # --- 2. Construct Sections ---
     history_section = ""
@@ -118,59 +180,14 @@ def generate_economy_card_prompt(
         history_section = f"\n    [2. Log of Recent Key Actions (Historical Context)]\n    {summarized_log}\n"
 
     # --- 3. Construct Main Prompt ---
-    prompt = f"""
-    [1. Previous Closing Context (The Anchor)]
-    {json.dumps(clean_eod, indent=2)}
-    {history_section}
-    [3. Raw Market News (THE TRIGGER)]
-    {news_input or "No news provided."}
-    
-    [4. Automated Sentiment Analysis (THE TONE)]
-    {json.dumps(sentiment_data, indent=2) if sentiment_data else "No sentiment analysis provided."}
-
-    [5. Core Indices Structure (THE VERDICT)]
-    {scaling_notes or ""}
-    {json.dumps(etf_structures, indent=2)}
-
-    [Your Task for {analysis_date_str}]
-    Synthesize the above data into a Global Economy Card.
-    
-    - **marketNarrative**: A rich, paragraph-length executive summary. Explain the 'Why' using professional financial reasoning, focusing on institutional flow and market sentiment.
-    - **marketBias**: Bullish/Bearish/Neutral/Volatile.
-    - **indexAnalysis/sectorRotation**: Analyze the flow of money.
-    - **todaysAction**: A single, punchy sentence for the log.
-
-    [Output Format Constraint]
-    Output ONLY a single, valid JSON object matching the schema below:
-    
-    {{
-        "marketNarrative": "The story of the session...",
-        "marketBias": "Neutral",
-        "keyEconomicEvents": {{
-            "last_24h": "...",
-            "next_24h": "..."
-        }},
-        "sectorRotation": {{
-            "leadingSectors": [],
-            "laggingSectors": [],
-            "rotationAnalysis": "..."
-        }},
-        "indexAnalysis": {{
-            "pattern": "U-Shape / Spike / ...",
-            "SPY": "...",
-            "QQQ": "..."
-        }},
-        "interMarketAnalysis": {{
-            "bonds": "Analysis of TLT/Yields.",
-            "commodities": "Analysis of Oil/Gold.",
-            "currencies": "Analysis of DXY.",
-            "crypto": "Analysis of BTC."
-        }},
-        "marketInternals": {{
-            "volatility": "Analysis of VIX."
-        }},
-        "todaysAction": "A single sentence summary."
-    }}
-    """
+    prompt = _ECONOMY_PROMPT_TEMPLATE.format(
+        anchor=dumps_json(clean_eod, indent=True),
+        history_section=history_section,
+        news=news_input or "No news provided.",
+        sentiment=dumps_json(sentiment_data, indent=True) if sentiment_data else "No sentiment analysis provided.",
+        scaling_notes=scaling_notes or "",
+        etf_structures=dumps_json(etf_structures, indent=True),
+        analysis_date=analysis_date_str,
+    )
     
     return prompt, system_prompt
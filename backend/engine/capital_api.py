@@ -1,5 +1,6 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
 import pytz
 from backend.engine.infisical_manager import InfisicalManager
@@ -10,10 +11,16 @@ BAHRAIN_TZ = pytz.timezone('Asia/Bahrain')
 UTC = pytz.utc
 US_EASTERN = pytz.timezone('US/Eastern')
 
+_HTTP_SESSION = None
+
 def get_retry_session():
-    """Simple requests session to mimic the user's helper."""
-    s = requests.Session()
-    return s
+    """Shared keep-alive session so every Capital.com call reuses pooled TLS connections."""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        s = requests.Session()
+        s.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        _HTTP_SESSION = s
+    return _HTTP_SESSION
 
 # Manual Singleton Cache for FastAPI/Non-Streamlit environments
 _CAPITAL_SESSION_CACHE = {"cst": None, "xst": None, "expiry": None}
@@ -81,27 +88,36 @@ def clear_capital_session():
     global _CAPITAL_SESSION_CACHE
     _CAPITAL_SESSION_CACHE = {"cst": None, "xst": None, "expiry": None}
 
-def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc, logger, resolution: str = "MINUTE") -> pd.DataFrame:
-    """Fetches Capital.com data for a specific epic and UTC time window with custom resolution."""
-    now_utc = datetime.now(UTC)
-    
-    # Capital.com Free API has lookback limits relative to granularity:
-    # MINUTE: ~16h | HOUR: ~1 month | DAY: Years
-    res_upper = resolution.upper()
-    if res_upper == "MINUTE":
-        limit_lookback = now_utc - timedelta(hours=16)
-    elif res_upper == "MINUTE_5":
-        limit_lookback = now_utc - timedelta(days=3) # ~864 bars
-    elif res_upper == "MINUTE_15":
-        limit_lookback = now_utc - timedelta(days=7) # ~672 bars
-    elif res_upper == "MINUTE_30":
-        limit_lookback = now_utc - timedelta(days=14) # ~672 bars
-    elif res_upper == "HOUR":
-        limit_lookback = now_utc - timedelta(days=31) # ~744 bars
-    elif res_upper == "HOUR_4":
-        limit_lookback = now_utc - timedelta(days=31) # ~186 bars
-    else: # DAY or others
-        limit_lookback = now_utc - timedelta(days=365)
+# Capital.com Free API has lookback limits relative to granularity:
+# MINUTE: ~16h | HOUR: ~1 month | DAY: Years
+_RESOLUTION_LOOKBACK = {
+    "MINUTE": timedelta(hours=16),
+    "MINUTE_5": timedelta(days=3),    # ~864 bars
+    "MINUTE_15": timedelta(days=7),   # ~672 bars
+    "MINUTE_30": timedelta(days=14),  # ~672 bars
+    "HOUR": timedelta(days=31),       # ~744 bars
+    "HOUR_4": timedelta(days=31),     # ~186 bars
+}
+_DEFAULT_LOOKBACK = timedelta(days=365)  # DAY or others
+
+_SNAPSHOT_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# Flattened Capital.com price fields -> engine column names (bid side only)
+_PRICE_FIELDS = {
+    'snapshotTime': 'SnapshotTime',
+    'openPrice.bid': 'Open',
+    'highPrice.bid': 'High',
+    'lowPrice.bid': 'Low',
+    'closePrice.bid': 'Close',
+    'lastTradedVolume': 'Volume',
+}
+
+def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc, logger, resolution: str = "MINUTE", now_utc=None) -> pd.DataFrame:
+    """Fetches Capital.com data for a specific epic and UTC time window with custom resolution.
+    Pass `now_utc` to reuse one clock reading across a batch of fetches."""
+    if now_utc is None:
+        now_utc = datetime.now(UTC)
+    limit_lookback = now_utc - _RESOLUTION_LOOKBACK.get(resolution.upper(), _DEFAULT_LOOKBACK)
     
     if start_utc < limit_lookback:
         if logger: logger.log(f"   ⚠️ Start time clamped to {resolution} limit.")
@@ -119,6 +135,7 @@ def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc,
     
     session = get_retry_session()
     max_retries = 3
+    reauthed = False
     import time
     
     for attempt in range(max_retries):
@@ -130,10 +147,17 @@ def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc,
                 timeout=15
             )
             
-            # SESSION SELF-HEALING: If we are unauthorized, clear the cache to force relogin
+            # SESSION SELF-HEALING: tokens expired mid-session -> log in again once and
+            # replay the request, so an idle session doesn't cost the caller a whole fetch.
             if response.status_code == 401:
-                if logger: logger.log(f"   ⚠️ 401 Unauthorized for {epic}. Clearing session cache.")
                 clear_capital_session()
+                if not reauthed:
+                    reauthed = True
+                    cst, xst = create_capital_session_v2()
+                    if cst and xst:
+                        if logger: logger.log(f"   🔑 401 Unauthorized for {epic}. Session refreshed, retrying.")
+                        continue
+                if logger: logger.log(f"   ⚠️ 401 Unauthorized for {epic}. Clearing session cache.")
                 return pd.DataFrame() # Caller should handle empty DF by checking auth again if needed
 
             response.raise_for_status()
@@ -141,25 +165,11 @@ def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc,
             if not prices:
                 return pd.DataFrame()
             
-            extracted = [
-                {
-                    'SnapshotTime': p.get('snapshotTime'), 
-                    'Open': p.get('openPrice', {}).get('bid'), 
-                    'High': p.get('highPrice', {}).get('bid'), 
-                    'Low': p.get('lowPrice', {}).get('bid'), 
-                    'Close': p.get('closePrice', {}).get('bid'), 
-                    'Volume': p.get('lastTradedVolume')
-                } for p in prices
-            ]
-            df = pd.DataFrame(extracted)
+            df = pd.json_normalize(prices).reindex(columns=list(_PRICE_FIELDS)).rename(columns=_PRICE_FIELDS)
             
-            # Timezone Logic
-            df['SnapshotTime'] = pd.to_datetime(df['SnapshotTime'])
-            
-            if df['SnapshotTime'].dt.tz is None:
-                df['SnapshotTime'] = df['SnapshotTime'].dt.tz_localize(BAHRAIN_TZ)
-            else:
-                df['SnapshotTime'] = df['SnapshotTime'].dt.tz_convert(BAHRAIN_TZ)
+            # Timezone Logic: snapshotTime is always naive account-local (Bahrain) ISO time,
+            # so parse with a fixed format and localize once.
+            df['SnapshotTime'] = pd.to_datetime(df['SnapshotTime'], format=_SNAPSHOT_TIME_FORMAT).dt.tz_localize(BAHRAIN_TZ)
             
             df['dt_utc'] = df['SnapshotTime'].dt.tz_convert(UTC)
             df['dt_eastern'] = df['SnapshotTime'].dt.tz_convert(US_EASTERN)
@@ -174,3 +184,4 @@ def fetch_capital_data_range(epic: str, cst: str, xst: str, start_utc, end_utc,
             else:
                 if logger: logger.log(f"   ❌ Final error fetching Capital data for {epic}: {e}")
                 return pd.DataFrame()
+    return pd.DataFrame()
@@ -18,7 +18,7 @@ Extracts:
 import json
 import re
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union
 
 log = logging.getLogger(__name__)
 
@@ -32,6 +32,19 @@ _RESISTANCE_KEYWORDS = [
     "breakdown", "markdown", "continuation", "distribution", "look above and fail"
 ]
 
+# ── Patterns for string-format briefings, compiled once per process ──
+_PRICE_RE = re.compile(r'[\d.]+')
+# Every field in one sweep. Each alternative sits inside a lookahead, so a match consumes
+# nothing and a field embedded in another field's line is still found.
+_BRIEFING_FIELDS_RE = re.compile(
+    r'(?=Plan_A_Level:\s*\$?(?P<plan_a_level>[\d.]+)'
+    r'|Plan_B_Level:\s*\$?(?P<plan_b_level>[\d.]+)'
+    r'|Plan_A:\s*(?P<plan_a_text>.+?)(?:\n|$)'
+    r'|Plan_B:\s*(?P<plan_b_text>.+?)(?:\n|$)'
+    r'|Setup_Bias:\s*(?P<setup_bias>[^\n]+))'
+)
+_BRIEFING_FIELD_COUNT = _BRIEFING_FIELDS_RE.groups
+
 
 def classify_plan_nature(plan_text: str) -> str:
     """
@@ -75,13 +88,14 @@ def _extract_price(value: Any) -> Optional[float]:
     if isinstance(value, (int, float)):
         return float(value)
     s = str(value).strip()
-    match = re.search(r'[\d.]+', s)
+    match = _PRICE_RE.search(s)
     return float(match.group()) if match else None
 
 
-def extract_screener_briefing(card_json_str: str) -> Dict[str, Any]:
+def extract_screener_briefing(card_json_str: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
     """
-    Main entry point. Given a raw card JSON string, extract all screener briefing fields.
+    Main entry point. Given a raw card JSON string (or an already-parsed card dict),
+    extract all screener briefing fields.
     
     Returns dict with:
       - plan_a_level: float | None
@@ -105,11 +119,14 @@ def extract_screener_briefing(card_json_str: str) -> Dict[str, Any]:
     if not card_json_str:
         return result
 
-    try:
-        card_data = json.loads(card_json_str)
-    except (json.JSONDecodeError, TypeError):
-        log.warning("card_extractor: Failed to parse card JSON, treating as empty.")
-        return result
+    if isinstance(card_json_str, dict):
+        card_data = card_json_str
+    else:
+        try:
+            card_data = json.loads(card_json_str)
+        except (json.JSONDecodeError, TypeError):
+            log.warning("card_extractor: Failed to parse card JSON, treating as empty.")
+            return result
 
     briefing = card_data.get("screener_briefing")
     if not briefing:
@@ -148,30 +165,20 @@ def _extract_from_dict(obj: dict, result: dict) -> dict:
 def _extract_from_string(text: str, result: dict) -> dict:
     """Extract fields from a raw string-format screener briefing using regex."""
 
-    # Plan A Level: $255.84 or Plan_A_Level: 255.84
-    m = re.search(r'Plan_A_Level:\s*\$?([\d.]+)', text)
-    if m:
-        result["plan_a_level"] = float(m.group(1))
-
-    # Plan B Level: $269.13 or Plan_B_Level: 269.13
-    m = re.search(r'Plan_B_Level:\s*\$?([\d.]+)', text)
-    if m:
-        result["plan_b_level"] = float(m.group(1))
-
-    # Plan A text: everything between "Plan_A: " and the next line
-    m = re.search(r'Plan_A:\s*(.+?)(?:\n|$)', text)
-    if m:
-        result["plan_a_text"] = m.group(1).strip()
-
-    # Plan B text: everything between "Plan_B: " and the next line
-    m = re.search(r'Plan_B:\s*(.+?)(?:\n|$)', text)
-    if m:
-        result["plan_b_text"] = m.group(1).strip()
-
-    # Setup Bias (can be multiple words like "Neutral Bullish Lean")
-    m = re.search(r'Setup_Bias:\s*([^\n]+)', text)
-    if m:
-        result["setup_bias"] = m.group(1).strip()
+    # One pass over the text; the first occurrence of each field wins, as with per-field search.
+    # Plan_A_Level: $255.84 | Plan_A: Long Support Defense | Setup_Bias: Neutral Bullish Lean
+    found = {}
+    for m in _BRIEFING_FIELDS_RE.finditer(text):
+        found.setdefault(m.lastgroup, m.group(m.lastgroup))
+        if len(found) == _BRIEFING_FIELD_COUNT:
+            break
+
+    for key in ("plan_a_level", "plan_b_level"):
+        if key in found:
+            result[key] = float(found[key])
+    for key in ("plan_a_text", "plan_b_text", "setup_bias"):
+        if key in found:
+            result[key] = found[key].strip()
 
     # Classify natures from plan text
     result["plan_a_nature"] = classify_plan_nature(result["plan_a_text"])
@@ -1,27 +1,37 @@
 import json
 import re
+import functools
+import gzip
+import math
 import sqlite3
+import threading
 import os
+import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from typing import Optional
 from libsql_client import create_client_sync, LibsqlError
-from backend.engine.utils import AppLogger
+from backend.engine.utils import AppLogger, dumps_json
 
 class LocalDBClient:
     """Wrapper to make sqlite3 look like libsql_client"""
+    # Applied once per connection instead of paying connect + defaults on every query
+    PRAGMAS = ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA temp_store=MEMORY")
+
     def __init__(self, path):
         self.path = path
+        self._lock = threading.Lock()
+        # Autocommit, shared across the worker threads that fan out DB reads
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        for pragma in self.PRAGMAS:
+            self._conn.execute(pragma)
     
     def execute(self, query, params=None):
-        conn = sqlite3.connect(self.path)
-        cursor = conn.cursor()
-        if params:
-            cursor.execute(query.replace('?', '?'), params)
-        else:
-            cursor.execute(query)
-        
-        rows = cursor.fetchall()
-        cols = [description[0] for description in cursor.description] if cursor.description else []
-        conn.close()
+        with self._lock:
+            cursor = self._conn.execute(query, params or ())
+            rows = cursor.fetchall()
+            cols = [description[0] for description in cursor.description] if cursor.description else []
         
         class ResultSet:
             def __init__(self, rows, columns):
@@ -29,7 +39,94 @@ class LocalDBClient:
                 self.columns = columns
         return ResultSet(rows, cols)
 
-def get_db_connection(db_url: str, auth_token: str, local_mode=False, local_path="data/local_turso.db"):
+    def close(self):
+        self._conn.close()
+
+class ClientPool:
+    """
+    Bounded pool of libsql sync clients behind the same execute/batch interface.
+    A single ClientSync runs its queries one at a time on its own event-loop thread,
+    so threads sharing one client queue behind each other. The pool hands each query
+    an idle client, opens another (up to `size`) only when all are busy, and makes
+    callers wait once the bound is reached.
+    """
+
+    def __init__(self, factory, size: int, first_client=None):
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        if first_client is not None:
+            self._idle.append(first_client)
+            self._opened = 1
+
+    @contextmanager
+    def checkout(self):
+        with self._cond:
+            while not self._idle and self._opened >= self._size:
+                self._cond.wait()
+            if self._idle:
+                client = self._idle.pop()
+            else:
+                client = None
+                self._opened += 1
+        if client is None:
+            try:
+                client = self._factory()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._cond.notify()
+                raise
+        try:
+            yield client
+        finally:
+            with self._cond:
+                closed = self._closed
+                if closed:
+                    self._opened -= 1
+                else:
+                    self._idle.append(client)
+                self._cond.notify()
+            if closed:
+                try:
+                    client.close()
+                except Exception:
+                    pass
+
+    def execute(self, stmt, args=None):
+        with self.checkout() as client:
+            return client.execute(stmt, args)
+
+    def batch(self, stmts):
+        with self.checkout() as client:
+            return client.batch(stmts)
+
+    def close(self):
+        """Closes the idle clients; clients checked out right now close when they are returned."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._opened -= len(idle)
+        for client in idle:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+# One remote client pool per (url, token) for the whole process. Each new client pays
+# a TLS handshake to Turso, so the pool is shared by every caller and opens lazily.
+_REMOTE_CLIENTS = {}
+_REMOTE_CLIENTS_LOCK = threading.Lock()
+TURSO_POOL_SIZE = int(os.environ.get("TURSO_POOL_SIZE", min(8, max(4, os.cpu_count() or 4))))
+
+def get_db_connection(db_url: str, auth_token: str, local_mode=False, local_path="data/local_turso.db", refresh=False):
+    """
+    Returns a libsql-compatible client. Remote clients are a shared ClientPool: callers
+    must not close them. Pass refresh=True to swap in a new pool after a connection error.
+    """
     if local_mode:
         if not os.path.exists(local_path):
             print(f"[WARN] Local database not found at {local_path}.")
@@ -45,60 +142,73 @@ def get_db_connection(db_url: str, auth_token: str, local_mode=False, local_path
         print("[ERROR] Turso credentials missing.")
         return None
         
-    try:
-        return create_client_sync(url=db_url, auth_token=auth_token)
-    except Exception as e:
-        print(f"[ERROR] Failed to connect to DB: {e}")
-        return None
+    key = (db_url, auth_token)
+    with _REMOTE_CLIENTS_LOCK:
+        client = _REMOTE_CLIENTS.get(key)
+        if client is not None and not refresh:
+            return client
+        try:
+            # The first client is opened eagerly so a bad URL/token still fails here
+            first = create_client_sync(url=db_url, auth_token=auth_token)
+        except Exception as e:
+            print(f"[ERROR] Failed to connect to DB: {e}")
+            return None
+        stale = _REMOTE_CLIENTS.get(key)
+        client = ClientPool(lambda: create_client_sync(url=db_url, auth_token=auth_token), TURSO_POOL_SIZE, first)
+        _REMOTE_CLIENTS[key] = client
+    if stale is not None:
+        # Threads mid-query on the old pool keep their client until they return it
+        stale.close()
+    return client
+
+# Idempotent schema, sent to Turso as one batch (one round trip, applied atomically)
+_SCHEMA_DDL = (
+    """CREATE TABLE IF NOT EXISTS premarket_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run_timestamp TEXT NOT NULL,
+        input_news_snapshot TEXT,
+        economy_card_snapshot TEXT,
+        live_stats_snapshot BLOB,
+        final_briefing TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS deep_dive_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        card_json TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_deep_dive_cards_ticker_date ON deep_dive_cards(ticker, date, timestamp)",
+    """CREATE TABLE IF NOT EXISTS daily_inputs (
+        target_date TEXT PRIMARY KEY NOT NULL,
+        news_text TEXT NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS aw_economy_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL UNIQUE,
+        economy_card_json TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS aw_company_cards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticker TEXT NOT NULL,
+        date TEXT NOT NULL,
+        company_card_json TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(ticker, date)
+    )""",
+)
 
 def init_db_schema(client, logger: AppLogger):
     if not client or isinstance(client, LocalDBClient):
         return
     try:
-        client.execute("""
-            CREATE TABLE IF NOT EXISTS premarket_snapshots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                run_timestamp TEXT NOT NULL,
-                input_news_snapshot TEXT,
-                economy_card_snapshot TEXT,
-                live_stats_snapshot TEXT,
-                final_briefing TEXT
-            );
-        """)
-        client.execute("""
-            CREATE TABLE IF NOT EXISTS deep_dive_cards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticker TEXT NOT NULL,
-                date TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                card_json TEXT NOT NULL
-            );
-        """)
-        client.execute("""
-            CREATE TABLE IF NOT EXISTS daily_inputs (
-                target_date TEXT PRIMARY KEY NOT NULL,
-                news_text TEXT NOT NULL,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        client.execute("""
-            CREATE TABLE IF NOT EXISTS aw_economy_cards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL UNIQUE,
-                economy_card_json TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-        client.execute("""
-            CREATE TABLE IF NOT EXISTS aw_company_cards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticker TEXT NOT NULL,
-                date TEXT NOT NULL,
-                company_card_json TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(ticker, date)
-            );
-        """)
+        if hasattr(client, "batch"):
+            client.batch(list(_SCHEMA_DDL))
+        else:
+            for stmt in _SCHEMA_DDL:
+                client.execute(stmt)
         if logger: logger.log("DB: Schema verified.")
     except Exception as e:
         if logger: logger.log(f"DB Error: {e}")
@@ -114,14 +224,37 @@ def fetch_watchlist(client, logger: AppLogger) -> list[str]:
         if logger: logger.log(f"Watchlist Fetch Error: {e}")
         return []
 
+# In-process cache for lookups that change at most once a day (ticker list, latest
+# economy card date). Keyed per client so local/remote modes never share entries.
+_QUERY_CACHE = {}
+_QUERY_CACHE_TTL_SECONDS = 5 * 60
+
+def _query_cache_get(key):
+    entry = _QUERY_CACHE.get(key)
+    if entry and time.time() < entry[1]:
+        return entry[0]
+    return None
+
+def _query_cache_put(key, value):
+    _QUERY_CACHE[key] = (value, time.time() + _QUERY_CACHE_TTL_SECONDS)
+
+def clear_query_cache():
+    _QUERY_CACHE.clear()
+
 def get_latest_economy_card_date(_client, cutoff_str: str, _logger: AppLogger) -> str:
     try:
         cutoff_date_part = cutoff_str.split(" ")[0]
+        cache_key = ("latest_economy_card_date", id(_client), cutoff_date_part)
+        cached = _query_cache_get(cache_key)
+        if cached is not None:
+            return cached
         rs = _client.execute(
             "SELECT MAX(date) FROM aw_economy_cards WHERE date <= ?",
             [cutoff_date_part]
         )
-        return rs.rows[0][0] if rs.rows and rs.rows[0][0] else None
+        latest = rs.rows[0][0] if rs.rows and rs.rows[0][0] else None
+        if latest: _query_cache_put(cache_key, latest)
+        return latest
     except Exception:
         return None
 
@@ -133,41 +266,96 @@ def get_eod_economy_card(_client, benchmark_date: str, _logger: AppLogger) -> di
         if _logger: _logger.log(f"DB Error (EOD Card): {e}")
         return None
 
-def _parse_levels_from_json_blob(card_json_blob: str, logger: AppLogger) -> tuple[list[float], list[float]]:
-    s_levels, r_levels = [], []
+# Ultra-robust: handles **S_Levels**, S-Levels, S Levels, multi-line brackets, or no brackets
+_S_LEVELS_RE = re.compile(r"(?:\*\*|__)?S[_\-\s]Levels?(?:\*\*|__)?[:\-\=]?\s*(?:\[([\s\S]*?)\]|([^\n\r]+))", re.IGNORECASE)
+_R_LEVELS_RE = re.compile(r"(?:\*\*|__)?R[_\-\s]Levels?(?:\*\*|__)?[:\-\=]?\s*(?:\[([\s\S]*?)\]|([^\n\r]+))", re.IGNORECASE)
+_NUM_RE = re.compile(r"[\d\.]+")
+
+def _to_price(value) -> Optional[float]:
+    try:
+        price = float(str(value).replace('$', ''))
+    except ValueError:
+        return None
+    return price if math.isfinite(price) else None
+
+def _parse_briefing_dict(briefing_obj: dict) -> tuple[list[float], list[float]]:
+    s_levels = [v for v in map(_to_price, briefing_obj.get('S_Levels', [])) if v is not None]
+    r_levels = [v for v in map(_to_price, briefing_obj.get('R_Levels', [])) if v is not None]
+    return s_levels, r_levels
+
+def _parse_briefing_str(briefing_data: str) -> tuple[list[float], list[float]]:
+    # JSON-encoded briefings are tried first; plain-text briefings skip straight to regex
+    if briefing_data.lstrip().startswith('{'):
+        try:
+            return _parse_briefing_dict(json.loads(briefing_data))
+        except json.JSONDecodeError:
+            pass
+    s_match = _S_LEVELS_RE.search(briefing_data)
+    r_match = _R_LEVELS_RE.search(briefing_data)
+    s_str = (s_match.group(1) or s_match.group(2)) if s_match else ""
+    r_str = (r_match.group(1) or r_match.group(2)) if r_match else ""
+    s_levels = [float(x) for x in _NUM_RE.findall(s_str)]
+    r_levels = [float(x) for x in _NUM_RE.findall(r_str)]
+    return s_levels, r_levels
+
+def _parse_briefing_other(briefing_data) -> tuple[list[float], list[float]]:
+    return [], []
+
+_BRIEFING_PARSERS = {dict: _parse_briefing_dict, str: _parse_briefing_str}
+
+def _parse_levels_from_card(card_data: dict) -> tuple[list[float], list[float]]:
     try:
-        card_data = json.loads(card_json_blob)
         briefing_data = card_data.get('screener_briefing')
-        if isinstance(briefing_data, str):
-            try:
-                briefing_obj = json.loads(briefing_data)
-            except json.JSONDecodeError:
-                # Ultra-robust: handles **S_Levels**, S-Levels, S Levels, multi-line brackets, or no brackets
-                s_match = re.search(r"(?:\*\*|__)?S[_\-\s]Levels?(?:\*\*|__)?[:\-\=]?\s*(?:\[([\s\S]*?)\]|([^\n\r]+))", briefing_data, re.IGNORECASE)
-                r_match = re.search(r"(?:\*\*|__)?R[_\-\s]Levels?(?:\*\*|__)?[:\-\=]?\s*(?:\[([\s\S]*?)\]|([^\n\r]+))", briefing_data, re.IGNORECASE)
-                s_str = (s_match.group(1) or s_match.group(2)) if s_match else ""
-                r_str = (r_match.group(1) or r_match.group(2)) if r_match else ""
-                s_levels = [float(x) for x in re.findall(r"[\d\.]+", s_str)]
-                r_levels = [float(x) for x in re.findall(r"[\d\.]+", r_str)]
-                return s_levels, r_levels
-        elif isinstance(briefing_data, dict):
-            briefing_obj = briefing_data
-        else:
-            return [], []
-
-        s_levels = [
-            float(str(l).replace('$', ''))
-            for l in briefing_obj.get('S_Levels', [])
-            if str(l).replace('$', '').replace('.', '', 1).isdigit()
-        ]
-        r_levels = [
-            float(str(l).replace('$', ''))
-            for l in briefing_obj.get('R_Levels', [])
-            if str(l).replace('$', '').replace('.', '', 1).isdigit()
-        ]
+        parser = _BRIEFING_PARSERS.get(type(briefing_data), _parse_briefing_other)
+        return parser(briefing_data)
     except Exception:
-        pass
-    return s_levels, r_levels
+        return [], []
+
+def _parse_levels_from_json_blob(card_json_blob: str, logger: AppLogger) -> tuple[list[float], list[float]]:
+    try:
+        return _parse_levels_from_card(json.loads(card_json_blob))
+    except Exception:
+        return [], []
+
+@functools.lru_cache(maxsize=4096)
+def _parse_screener_card(ticker: str, card_date: str, card_json: str) -> tuple[str, tuple, tuple]:
+    """
+    Parses a stored company card once per (ticker, date, blob).
+    Repeat scans hit the cache instead of re-running json.loads + regex on the same card.
+    The blob is part of the key so an edited card on the same date is re-parsed.
+    """
+    card_data = json.loads(card_json)
+    s_levels, r_levels = _parse_levels_from_card(card_data)
+    briefing_data = card_data.get('screener_briefing')
+    briefing_text = json.dumps(briefing_data, indent=2, ensure_ascii=False) if isinstance(briefing_data, dict) else str(briefing_data)
+    return briefing_text, tuple(s_levels), tuple(r_levels)
+
+def _screener_rows_to_dict(rows) -> dict:
+    db_data = {}
+    for row in rows:
+        ticker, card_json, actual_date = row[0], row[1], row[2]
+        try:
+            briefing_text, s_levels, r_levels = _parse_screener_card(ticker, actual_date, card_json)
+            db_data[ticker] = {
+                "screener_briefing_text": briefing_text,
+                "s_levels": list(s_levels),
+                "r_levels": list(r_levels),
+                "card_date": actual_date,
+                "is_live": False,
+                "raw_card_json": card_json
+            }
+        except: pass
+    return db_data
+
+_LATEST_CARDS_SQL = """
+    WITH LatestCards AS (
+        SELECT ticker, company_card_json, date,
+        ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) as rn
+        FROM aw_company_cards
+        WHERE ticker IN ({tickers})
+    )
+    SELECT ticker, company_card_json, date FROM LatestCards WHERE rn = 1
+"""
 
 def get_eod_card_data_for_screener(_client, ticker_tuple: tuple, benchmark_date: str, _logger: AppLogger) -> dict:
     """
@@ -176,66 +364,126 @@ def get_eod_card_data_for_screener(_client, ticker_tuple: tuple, benchmark_date:
     Always fetches the most recent card regardless of date.
     """
     ticker_list = list(ticker_tuple)
-    db_data = {}
     if not ticker_list or not _client:
-        return db_data
+        return {}
 
     try:
         placeholders = ','.join(['?'] * len(ticker_list))
-        query = f"""
-            WITH LatestCards AS (
-                SELECT ticker, company_card_json, date,
-                ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) as rn
-                FROM aw_company_cards
-                WHERE ticker IN ({placeholders})
-            )
-            SELECT ticker, company_card_json, date FROM LatestCards WHERE rn = 1
-        """
-        rs = _client.execute(query, ticker_list)
-        for row in rs.rows:
-            ticker, card_json, actual_date = row[0], row[1], row[2]
-            s_levels, r_levels = _parse_levels_from_json_blob(card_json, _logger)
-            try:
-                card_data = json.loads(card_json)
-                briefing_data = card_data.get('screener_briefing')
-                briefing_text = json.dumps(briefing_data, indent=2) if isinstance(briefing_data, dict) else str(briefing_data)
-                db_data[ticker] = {
-                    "screener_briefing_text": briefing_text,
-                    "s_levels": s_levels,
-                    "r_levels": r_levels,
-                    "card_date": actual_date,
-                    "is_live": False,
-                    "raw_card_json": card_json
-                }
-            except: pass
-
-        return db_data
+        rs = _client.execute(_LATEST_CARDS_SQL.format(tickers=placeholders), ticker_list)
+        return _screener_rows_to_dict(rs.rows)
     except Exception as e:
         if _logger: _logger.log(f"DB Error (Card Fetch): {e}")
         return {}
 
+def prefetch_scan_context(_client, benchmark_date: str, _logger: AppLogger) -> tuple[list[str], dict]:
+    """
+    Loads everything the proximity scan needs from Turso in a single batch round-trip:
+    the watchlist and the latest company card for every watchlist ticker.
+    Falls back to fetch_watchlist + get_eod_card_data_for_screener if batching is unavailable.
+    """
+    if not _client:
+        return [], {}
+    if not isinstance(_client, LocalDBClient):
+        try:
+            watchlist_rs, cards_rs = _client.batch([
+                "SELECT DISTINCT ticker FROM aw_ticker_notes",
+                _LATEST_CARDS_SQL.format(tickers="SELECT DISTINCT ticker FROM aw_ticker_notes"),
+            ])
+            return [r[0] for r in watchlist_rs.rows], _screener_rows_to_dict(cards_rs.rows)
+        except Exception as e:
+            if _logger: _logger.log(f"DB Batch Error (Scan Prefetch): {e}. Falling back to sequential reads.")
+
+    watchlist = fetch_watchlist(_client, _logger)
+    return watchlist, get_eod_card_data_for_screener(_client, tuple(watchlist), benchmark_date, _logger)
+
 
 def get_all_tickers_from_db(_client, _logger: AppLogger) -> list[str]:
+    cache_key = ("all_tickers", id(_client))
+    cached = _query_cache_get(cache_key)
+    if cached is not None:
+        return list(cached)
     try:
         rs = _client.execute("SELECT user_ticker FROM symbol_map")
-        return [row[0] for row in rs.rows]
+        tickers = [row[0] for row in rs.rows]
+        if tickers: _query_cache_put(cache_key, tuple(tickers))
+        return tickers
     except Exception as e:
         if _logger: _logger.log(f"DB Error (Get Tickers): {e}")
         return []
 
+def get_symbol_map_from_db(_client, _logger: AppLogger) -> dict:
+    """user_ticker -> capital_epic for every mapped symbol, read once per cache TTL."""
+    cache_key = ("symbol_map", id(_client))
+    cached = _query_cache_get(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        rs = _client.execute("SELECT user_ticker, capital_epic FROM symbol_map")
+        mapping = {row[0].upper(): row[1] for row in rs.rows if row[0] and row[1]}
+        if mapping: _query_cache_put(cache_key, mapping)
+        return mapping
+    except Exception as e:
+        if _logger: _logger.log(f"DB Error (Symbol Map): {e}")
+        return {}
+
+# keyActionLog entries of a ticker's latest card as rows: json_each unpacks the array
+# inside the database, so only (date, action) columns travel instead of whole cards.
+_KEY_ACTION_LOG_SQL = """
+    SELECT json_extract(e.value, '$.date'), json_extract(e.value, '$.action')
+    FROM aw_company_cards c,
+         json_each(c.company_card_json, '$.technicalStructure.keyActionLog') e
+    WHERE c.ticker = ?
+      AND c.date = (SELECT MAX(date) FROM aw_company_cards WHERE ticker = ? AND date <= ?)
+      AND json_extract(e.value, '$.date') >= ?
+    ORDER BY e.key
+"""
+
+def get_key_action_log(_client, ticker: str, since_date: str = "", as_of: str = "9999-12-31", _logger: AppLogger = None) -> list[dict]:
+    """
+    The keyActionLog (oldest first) of the latest card on or before `as_of`, limited to
+    entries dated on or after `since_date`. Each card carries the cumulative log, so one
+    card answers the whole scrollback.
+    """
+    try:
+        rs = _client.execute(_KEY_ACTION_LOG_SQL, [ticker, ticker, as_of, since_date])
+        return [{"date": r[0], "action": r[1]} for r in rs.rows]
+    except Exception as e:
+        if _logger: _logger.log(f"DB Error (Key Action Log {ticker}): {e}")
+        return []
+
+SNAPSHOT_COMPRESS_MIN_BYTES = 1024
+
+def compress_snapshot_text(text: Optional[str]):
+    """gzip large snapshot text into a BLOB; short values stay plain TEXT."""
+    if not text:
+        return text
+    raw = text.encode('utf-8')
+    if len(raw) < SNAPSHOT_COMPRESS_MIN_BYTES:
+        return text
+    return gzip.compress(raw, compresslevel=6)
+
+def decompress_snapshot_text(value) -> Optional[str]:
+    """Reverse of compress_snapshot_text; rows written before compression pass through."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value)
+        if value[:2] == b'\x1f\x8b':
+            return gzip.decompress(value).decode('utf-8')
+        return value.decode('utf-8')
+    return value
+
 def save_snapshot(client, news_input: str, eco_card: dict, live_stats: str, briefing: str, logger: AppLogger) -> bool:
     if not client or isinstance(client, LocalDBClient):
         return False
     try:
         ts = datetime.now().isoformat()
-        eco_json = json.dumps(eco_card)
+        eco_json = json.dumps(eco_card, ensure_ascii=False)
         client.execute(
             """
             INSERT INTO premarket_snapshots
             (run_timestamp, input_news_snapshot, economy_card_snapshot, live_stats_snapshot, final_briefing)
             VALUES (?, ?, ?, ?, ?)
             """,
-            (ts, news_input, eco_json, live_stats, briefing),
+            (ts, news_input, eco_json, compress_snapshot_text(live_stats), briefing),
         )
         if logger: logger.log("DB: Snapshot saved.")
         return True
@@ -243,11 +491,37 @@ def save_snapshot(client, news_input: str, eco_card: dict, live_stats: str, brie
         if logger: logger.log(f"DB Error (Save Snapshot): {e}")
         return False
 
-def save_deep_dive_card(client, ticker: str, date_str: str, card_json: str, logger: AppLogger) -> bool:
+def get_latest_snapshot(_client, _logger: AppLogger = None) -> Optional[dict]:
+    """The most recent premarket snapshot, with live_stats decompressed back to text."""
+    try:
+        rs = _client.execute(
+            """
+            SELECT run_timestamp, input_news_snapshot, economy_card_snapshot, live_stats_snapshot, final_briefing
+            FROM premarket_snapshots ORDER BY id DESC LIMIT 1
+            """
+        )
+        if not rs.rows:
+            return None
+        ts, news, eco_json, live_stats, briefing = rs.rows[0]
+        return {
+            "run_timestamp": ts,
+            "news_input": news,
+            "eco_card": json.loads(eco_json) if eco_json else {},
+            "live_stats": decompress_snapshot_text(live_stats),
+            "briefing": briefing,
+        }
+    except Exception as e:
+        if _logger: _logger.log(f"DB Error (Get Snapshot): {e}")
+        return None
+
+def save_deep_dive_card(client, ticker: str, date_str: str, card_json, logger: AppLogger) -> bool:
+    """Stores a deep-dive card; accepts the card dict (serialized compactly here) or a JSON string."""
     if not client or isinstance(client, LocalDBClient):
         return False
     try:
         ts = datetime.now().isoformat()
+        if not isinstance(card_json, str):
+            card_json = dumps_json(card_json)
         client.execute(
             "INSERT INTO deep_dive_cards (ticker, date, timestamp, card_json) VALUES (?, ?, ?, ?)",
             (ticker, date_str, ts, card_json)
@@ -263,20 +537,16 @@ def upsert_live_card(client, ticker: str, date_str: str, card_json: str) -> bool
         return False
     try:
         ts = datetime.now().isoformat()
-        rs = client.execute(
-            "SELECT id FROM deep_dive_cards WHERE ticker = ? AND date = ? ORDER BY timestamp DESC LIMIT 1",
-            (ticker, date_str)
-        )
-        if rs.rows:
-            client.execute(
-                "UPDATE deep_dive_cards SET card_json = ?, timestamp = ? WHERE id = ?",
-                (card_json, ts, rs.rows[0][0])
-            )
-        else:
-            client.execute(
-                "INSERT INTO deep_dive_cards (ticker, date, timestamp, card_json) VALUES (?, ?, ?, ?)",
-                (ticker, date_str, ts, card_json)
-            )
+        # No unique key on (ticker, date) here, so update-else-insert goes as one atomic batch:
+        # one HTTPS round trip instead of a read followed by a write
+        client.batch([
+            ("UPDATE deep_dive_cards SET card_json = ?, timestamp = ? WHERE id = "
+             "(SELECT id FROM deep_dive_cards WHERE ticker = ? AND date = ? ORDER BY timestamp DESC LIMIT 1)",
+             [card_json, ts, ticker, date_str]),
+            ("INSERT INTO deep_dive_cards (ticker, date, timestamp, card_json) SELECT ?, ?, ?, ? "
+             "WHERE NOT EXISTS (SELECT 1 FROM deep_dive_cards WHERE ticker = ? AND date = ?)",
+             [ticker, date_str, ts, card_json, ticker, date_str]),
+        ])
         return True
     except Exception:
         return False
@@ -287,20 +557,13 @@ def upsert_economy_card(client, date_str: str, card_json: str, logger: AppLogger
     if not client or isinstance(client, LocalDBClient):
         return False
     try:
-        rs = client.execute(
-            "SELECT id FROM aw_economy_cards WHERE date = ?",
-            [date_str]
+        # date is UNIQUE: a native upsert is one statement and one round trip
+        client.execute(
+            "INSERT INTO aw_economy_cards (date, economy_card_json) VALUES (?, ?) "
+            "ON CONFLICT(date) DO UPDATE SET economy_card_json = excluded.economy_card_json",
+            [date_str, card_json]
         )
-        if rs.rows:
-            client.execute(
-                "UPDATE aw_economy_cards SET economy_card_json = ? WHERE date = ?",
-                [card_json, date_str]
-            )
-        else:
-            client.execute(
-                "INSERT INTO aw_economy_cards (date, economy_card_json) VALUES (?, ?)",
-                [date_str, card_json]
-            )
+        clear_query_cache()
         if logger: logger.log(f"DB: Economy card saved for {date_str}")
         return True
     except Exception as e:
@@ -313,20 +576,11 @@ def upsert_company_card(client, ticker: str, date_str: str, card_json: str, logg
     if not client or isinstance(client, LocalDBClient):
         return False
     try:
-        rs = client.execute(
-            "SELECT id FROM aw_company_cards WHERE ticker = ? AND date = ?",
-            [ticker, date_str]
+        client.execute(
+            "INSERT INTO aw_company_cards (ticker, date, company_card_json) VALUES (?, ?, ?) "
+            "ON CONFLICT(ticker, date) DO UPDATE SET company_card_json = excluded.company_card_json",
+            [ticker, date_str, card_json]
         )
-        if rs.rows:
-            client.execute(
-                "UPDATE aw_company_cards SET company_card_json = ? WHERE ticker = ? AND date = ?",
-                [card_json, ticker, date_str]
-            )
-        else:
-            client.execute(
-                "INSERT INTO aw_company_cards (ticker, date, company_card_json) VALUES (?, ?, ?)",
-                [ticker, date_str, card_json]
-            )
         if logger: logger.log(f"DB: Company card saved for {ticker} ({date_str})")
         return True
     except Exception as e:
@@ -1,8 +1,9 @@
+import atexit
 import requests
-import json
+from requests.adapters import HTTPAdapter
 import time
 from backend.engine.key_manager import KeyManager
-from backend.engine.utils import AppLogger
+from backend.engine.utils import AppLogger, encode_json, loads_json
 
 AVAILABLE_MODELS = [
     "gemini-3-flash-free",
@@ -22,6 +23,16 @@ DIRECT_API_KEY = None # Hardcoded key removed. Use KeyManager.
 
 from typing import Union, Optional
 
+# Shared keep-alive session: reuses the TLS connection to the Gemini API across
+# retries, tickers and worker threads instead of a fresh handshake per request.
+_GEMINI_SESSION = requests.Session()
+_GEMINI_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+_GEMINI_SESSION.headers.update({'Content-Type': 'application/json'})
+atexit.register(_GEMINI_SESSION.close)
+
+# A dead connect should fail fast and rotate; only the generation itself is slow.
+GEMINI_CONNECT_TIMEOUT = 10
+
 def call_gemini_with_rotation(
     prompt: str,
     system_prompt: str,
@@ -43,6 +54,13 @@ def call_gemini_with_rotation(
     estimated_tokens = key_manager.estimate_tokens(prompt + system_prompt)
     log(f"📊 Estimated Tokens: {estimated_tokens}")
 
+    # Payload does not depend on the key/model, so serialize it once for all attempts
+    body = encode_json({
+        "contents": [{"parts": [{"text": prompt}]}],
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "generationConfig": {"temperature": 0.5, "maxOutputTokens": 8192}
+    })
+
     # 4. Execute Request
     MAX_ATTEMPTS = 3
     attempt_logs = []
@@ -61,24 +79,18 @@ def call_gemini_with_rotation(
             return None, f"No API keys available for {config_id} tier.\n\nAttempt History:\n{history}"
 
         gemini_url = f"{API_BASE_URL}/{model_id}:generateContent?key={key_val}"
-        payload = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "systemInstruction": {"parts": [{"text": system_prompt}]},
-            "generationConfig": {"temperature": 0.5, "maxOutputTokens": 8192}
-        }
-        headers = {'Content-Type': 'application/json'}
 
         try:
             log(f"🚀 Sending Request to {model_id} (Attempt {attempt+1}/{MAX_ATTEMPTS}) using {key_name}...")
             start_ts = time.time()
-            response = requests.post(gemini_url, headers=headers, data=json.dumps(payload), timeout=90)
+            response = _GEMINI_SESSION.post(gemini_url, data=body, timeout=(GEMINI_CONNECT_TIMEOUT, 90))
             elapsed = time.time() - start_ts
             
             log(f"📡 Response Code: {response.status_code} (Took {elapsed:.2f}s)")
 
             if response.status_code == 200:
                 try:
-                    res_json = response.json()
+                    res_json = loads_json(response.content)
                     text = res_json['candidates'][0]['content']['parts'][0]['text'].strip()
                     log(f"✅ REQUEST SUCCESS ({key_name})")
                     
@@ -95,8 +107,9 @@ def call_gemini_with_rotation(
                 err_msg = f"Key '{key_name}': 429 Rate Limit - {response.text}"
                 attempt_logs.append(err_msg)
                 log(f"⚠️ {err_msg}. Rotating...")
+                # The key is now cooling down; the next get_key() hands out a
+                # fresh one (or a wait_time), so no fixed pause is needed here.
                 key_manager.report_failure(key_val)
-                time.sleep(2)
                 continue
 
             elif response.status_code in [400, 401, 403, 404]:
@@ -132,4 +145,3 @@ def call_gemini_with_rotation(
             
     final_report = "\n".join(attempt_logs)
     return None, f"Failed after {MAX_ATTEMPTS} attempts.\n\n📋 **Attempt Log:**\n{final_report}"
-
@@ -1,13 +1,14 @@
 from __future__ import annotations
 import time
+import threading
 from collections import deque
 import logging
 import random
 import hashlib
-import libsql_client
 import traceback
 import requests
 import json
+from backend.engine.database import get_db_connection
 
 log = logging.getLogger(__name__)
 
@@ -141,20 +142,26 @@ class KeyManager:
     MAX_STRIKES = 5
     FATAL_STRIKE_COUNT = 999
 
-    def __init__(self, db_url: str, auth_token: str):
+    def __init__(self, db_url: str, auth_token: str, db_client=None):
         if not db_url:
             raise ValueError("KeyManager cannot initialize: db_url is missing. Check your credentials.")
         
         self.raw_http_base = db_url.replace("libsql://", "https://")
         self.db_url = db_url
         self.auth_token = auth_token
+        # One keep-alive session for the raw pipeline calls (report_usage runs after every Gemini call)
+        self._http = requests.Session()
         
         is_remote = self.db_url.startswith("https://") or self.db_url.startswith("libsql://")
         target_name = "Remote Turso" if is_remote else "Local SQLite"
         
         try:
             # FORCE REMOTE FOR KEYS (Requirement: API key management must be Turso)
-            self.db_client = libsql_client.create_client_sync(url=self.db_url, auth_token=auth_token)
+            # Callers that already hold a client pass it in; otherwise share the process-wide
+            # client for these credentials instead of paying a second handshake
+            self.db_client = db_client if db_client is not None else get_db_connection(self.db_url, auth_token)
+            if self.db_client is None:
+                raise ConnectionError("Turso client could not be created.")
             log.info(f"✅ KeyManager: Connected to {target_name} ({self.db_url[:40]}...)")
             
             # Create tables
@@ -172,6 +179,9 @@ class KeyManager:
         self.key_metadata = {} 
         
         self.available_keys = deque()
+        # Deep-dive batches call get_key()/report_failure() from worker threads;
+        # the rotation deque is only touched under this lock.
+        self._rotation_lock = threading.RLock()
         self.cooldown_keys = {}
         self.key_failure_strikes = {}
         self.dead_keys = set()
@@ -230,11 +240,10 @@ class KeyManager:
         self.name_to_key = {}
         self.key_metadata = {}
         
-        if keys_rs.rows:
-            for row in keys_rs.rows:
-                d = self._row_to_dict(keys_rs.columns, row)
-                self.name_to_key[d["key_name"]] = d["key_value"]
-                self.key_metadata[d["key_value"]] = {'tier': d.get('tier', 'free')}
+        # Fixed column lists: unpack rows positionally instead of building a dict per row
+        for key_name, key_value, tier in keys_rs.rows:
+            self.name_to_key[key_name] = key_value
+            self.key_metadata[key_value] = {'tier': tier}
 
         self.key_to_name = {v: k for k, v in self.name_to_key.items()}
         all_real_keys = list(self.name_to_key.values())
@@ -249,12 +258,7 @@ class KeyManager:
             now = time.time()
             hash_to_key = {v: k for k, v in self.key_to_hash.items()}
             
-            for h_row in health_rs.rows:
-                h_dict = self._row_to_dict(health_rs.columns, h_row)
-                k_hash = h_dict['key_hash']
-                strikes = h_dict['strikes']
-                release_t = h_dict['release_time']
-                
+            for k_hash, strikes, release_t in health_rs.rows:
                 real_key = hash_to_key.get(k_hash)
                 if not real_key: continue
                 
@@ -343,7 +347,14 @@ class KeyManager:
             - wait_time == -1.0: FATAL. Request exceeds absolute model capacity.
             - wait_time > 0.0: COMPACITY REACHED. Seconds to wait for next minute window.
             - model_id: The internal string Google expects (e.g. 'gemini-3-pro-preview').
+
+        Keys are handed out round-robin (a used key goes to the back of the queue),
+        and the scan is serialized so concurrent callers never see a half-rotated queue.
         """
+        with self._rotation_lock:
+            return self._next_key(config_id, estimated_tokens)
+
+    def _next_key(self, config_id: str, estimated_tokens: int) -> Tuple[Optional[str], Optional[str], float, Optional[str]]:
         self._reclaim_keys()
         
         config = self.MODELS_CONFIG.get(config_id)
@@ -471,7 +482,8 @@ class KeyManager:
         if not released: return
         for key in released:
             del self.cooldown_keys[key]
-            self.available_keys.append(key)
+            if key not in self.available_keys:
+                self.available_keys.append(key)
     
     # --- RAW HTTP HELPER (Bypassing buggy client) ---
     def _raw_http_execute(self, sql: str, args: list):
@@ -490,7 +502,7 @@ class KeyManager:
         payload = {"requests": [{"type": "execute", "stmt": {"sql": sql, "args": encoded_args}}]}
         
         try:
-            resp = requests.post(url, json=payload, headers=headers, timeout=5)
+            resp = self._http.post(url, json=payload, headers=headers, timeout=5)
             if resp.status_code != 200:
                 msg = f"Raw DB Exec Failed: {resp.status_code} {resp.text}"
                 log.error(msg)
@@ -568,15 +580,18 @@ class KeyManager:
             log.error(f"Report Usage Failed: {e}\n{traceback.format_exc()}")
 
     def report_failure(self, key: str, is_info_error=False):
-        if is_info_error:
-            self.available_keys.append(key)
-            return
-            
-        strikes = self.key_failure_strikes.get(key, 0) + 1
-        self.key_failure_strikes[key] = strikes
-        penalty = self.COOLDOWN_PERIODS.get(strikes, 60)
-        
-        self.cooldown_keys[key] = time.time() + penalty
+        with self._rotation_lock:
+            if is_info_error:
+                # get_key() already re-queued the key; appending again would double its share of the rotation
+                if key not in self.available_keys:
+                    self.available_keys.append(key)
+                return
+
+            strikes = self.key_failure_strikes.get(key, 0) + 1
+            self.key_failure_strikes[key] = strikes
+            penalty = self.COOLDOWN_PERIODS.get(strikes, 60)
+
+            self.cooldown_keys[key] = time.time() + penalty
         
         try:
             key_hash = self.key_to_hash[key]
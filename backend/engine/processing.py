@@ -1,14 +1,28 @@
+import hashlib
+import os
+import threading
 import pandas as pd
 import pytz
 import numpy as np
 from datetime import datetime, timedelta, time as dt_time
 import yfinance as yf
-from backend.engine.time_utils import US_EASTERN, MARKET_OPEN_TIME, to_et, to_utc, now_et, get_staleness_score
+from backend.engine.time_utils import US_EASTERN, MARKET_OPEN_MINUTE, to_utc, now_et, get_staleness_score
 from backend.engine.utils import AppLogger
+from backend.engine.database import get_symbol_map_from_db
+
+try:
+    from numba import njit as _njit
+except ImportError:
+    def _njit(*args, **kwargs):
+        """No-op stand-in so numeric kernels run as plain NumPy without numba."""
+        return lambda fn: fn
+
+# One-byte codes per bar instead of a Python str object per row
+BAR_SOURCE_DTYPE = pd.CategoricalDtype(['Turso DB', 'Capital.com', 'Yahoo Finance'])
 
 # --- DB FETCHING UTILITIES ---
 
-from typing import Tuple, Optional, Union
+from typing import Dict, List, NamedTuple, Tuple, Optional, Union
 
 def get_latest_price_details(client, ticker: str, cutoff_str: str, logger: AppLogger) -> Tuple[Optional[float], Optional[str]]:
     query = "SELECT close, timestamp FROM market_data WHERE symbol = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1"
@@ -21,50 +35,151 @@ def get_latest_price_details(client, ticker: str, cutoff_str: str, logger: AppLo
         logger.log(f"DB Read Error {ticker}: {e}")
         return None, None
 
-def get_session_bars_from_db(client, epic: str, benchmark_date: str, cutoff_str: str, logger: AppLogger, premarket_only: bool = True) -> Optional[pd.DataFrame]:
+# Bars of a finished day never change, so simulation re-runs read them back from local
+# parquet instead of going to Turso again. Set BARS_CACHE_DIR="" to switch it off.
+# The cache is optional: without pyarrow (no parquet engine) every read goes to the DB.
+try:
+    import pyarrow  # noqa: F401
+    _PARQUET_AVAILABLE = True
+except ImportError:
+    _PARQUET_AVAILABLE = False
+
+BARS_CACHE_DIR = os.environ.get("BARS_CACHE_DIR", os.path.join("data", "bars_cache"))
+# A day's bars can keep syncing into market_data after midnight, so a day only counts as
+# finished this many hours after it ends (Eastern).
+BARS_CACHE_SETTLE_HOURS = float(os.environ.get("BARS_CACHE_SETTLE_HOURS", "12"))
+
+def _bars_settled_at(benchmark_date: str) -> datetime:
+    """Moment after which a day's bars are treated as complete and safe to cache."""
+    day_end = US_EASTERN.localize(datetime.strptime(benchmark_date, '%Y-%m-%d') + timedelta(days=1))
+    return day_end + timedelta(hours=BARS_CACHE_SETTLE_HOURS)
+
+def _bars_cache_path(epic: str, benchmark_date: str, cutoff_str: str, premarket_only: bool) -> Optional[str]:
+    """Parquet path for a settled session's bars, or None when the day may still change."""
+    if not BARS_CACHE_DIR or not _PARQUET_AVAILABLE:
+        return None
     try:
-        # We need High/Low/Close for Impact logic. Volume is optional but good to have.
-        query = """
-            SELECT timestamp, open, high, low, close, volume, session
-            FROM market_data
-            WHERE symbol = ? AND date(timestamp) = ? AND timestamp <= ?
-            ORDER BY timestamp ASC
-        """
-        rs = client.execute(query, [epic, benchmark_date, cutoff_str])
-        if not rs.rows:
+        if now_et() < _bars_settled_at(benchmark_date):
             return None
-        df = pd.DataFrame(
-            rs.rows,
-            columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'session_db'],
-        )
+    except ValueError:
+        return None
+    key = f"{epic}|{benchmark_date}|{cutoff_str}|{int(premarket_only)}"
+    return os.path.join(BARS_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + ".parquet")
 
-        df['timestamp'] = pd.to_datetime(df['timestamp'].astype(str).str.replace('Z', '').str.replace(' ', 'T'))
-        
-        # Standardize to UTC aware
-        if df['timestamp'].dt.tz is None:
-            df['timestamp'] = df['timestamp'].dt.tz_localize(pytz.utc)
-        
-        # FIX: Database timestamps are UTC.
-        # We must localize to UTC then CONVERT to Eastern.
-        df['dt_eastern'] = df['timestamp'].apply(lambda x: to_et(x))
-        
-        # Filter for Pre-Market (04:00 - 09:30 ET) - OPTIONAL
-        if premarket_only:
-             time_eastern = df['dt_eastern'].dt.time
-             df = df[time_eastern < MARKET_OPEN_TIME].copy()
+def _read_cached_bars(cache_path: Optional[str], benchmark_date: str) -> Optional[pd.DataFrame]:
+    if cache_path and os.path.exists(cache_path):
+        try:
+            # An entry written before the day settled may miss late-synced bars: refetch
+            if os.path.getmtime(cache_path) >= _bars_settled_at(benchmark_date).timestamp():
+                return pd.read_parquet(cache_path)
+        except Exception:
+            pass  # Unreadable entry: fall through and rewrite it
+    return None
 
-        for col in ['open', 'high', 'low', 'close']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-        df.dropna(subset=['close'], inplace=True)
-        
-        # Normalize columns for the Engine
-        df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close'}, inplace=True)
-        df['source'] = 'Turso DB'
-        return df.reset_index(drop=True)
+def _write_cached_bars(cache_path: Optional[str], df: Optional[pd.DataFrame], epic: str, logger: AppLogger = None) -> None:
+    if not cache_path or df is None:
+        return
+    try:
+        os.makedirs(BARS_CACHE_DIR, exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees a half-written file
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        if logger: logger.log(f"   ⚠️ Bar cache write failed ({epic}): {e}")
+
+# High/Low/Close drive the impact logic; volume is optional.
+# {symbol_col} is empty for single-symbol reads, "symbol, " when one query serves many
+_SESSION_BARS_QUERY = """
+    SELECT {symbol_col}timestamp, open, high, low, close, volume, session
+    FROM market_data
+    WHERE symbol IN ({symbols}) AND date(timestamp) = ? AND timestamp <= ?
+    ORDER BY timestamp ASC
+"""
+
+def get_session_bars_from_db(client, epic: str, benchmark_date: str, cutoff_str: str, logger: AppLogger, premarket_only: bool = True) -> Optional[pd.DataFrame]:
+    cache_path = _bars_cache_path(epic, benchmark_date, cutoff_str, premarket_only)
+    df = _read_cached_bars(cache_path, benchmark_date)
+    if df is not None:
+        return df
+    try:
+        rs = client.execute(_SESSION_BARS_QUERY.format(symbols="?", symbol_col=""), [epic, benchmark_date, cutoff_str])
+        df = _shape_session_bars(rs.rows, premarket_only)
     except Exception as e:
         logger.log(f"Data Error ({epic}): {e}")
         return None
+    _write_cached_bars(cache_path, df, epic, logger)
+    return df
+
+def get_session_bars_from_db_bulk(client, epics: List[str], benchmark_date: str, cutoff_str: str, logger: AppLogger = None, premarket_only: bool = True) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    get_session_bars_from_db for many symbols: cache hits are read from disk and every
+    miss comes back in ONE query, split per symbol. Returns {epic: DataFrame or None}.
+    """
+    out: Dict[str, Optional[pd.DataFrame]] = {}
+    cache_paths = {e: _bars_cache_path(e, benchmark_date, cutoff_str, premarket_only) for e in epics}
+    misses = []
+    for e in dict.fromkeys(epics):
+        out[e] = _read_cached_bars(cache_paths[e], benchmark_date)
+        if out[e] is None:
+            misses.append(e)
+    if not misses:
+        return out
+    try:
+        query = _SESSION_BARS_QUERY.format(symbols=",".join("?" * len(misses)), symbol_col="symbol, ")
+        rs = client.execute(query, misses + [benchmark_date, cutoff_str])
+    except Exception as e:
+        if logger: logger.log(f"Data Error ({len(misses)} symbols): {e}")
+        return out
+    rows_by_symbol: Dict[str, list] = {}
+    for row in rs.rows:
+        rows_by_symbol.setdefault(row[0], []).append(row[1:])
+    for e in misses:
+        try:
+            out[e] = _shape_session_bars(rows_by_symbol.get(e, []), premarket_only)
+        except Exception as ex:
+            if logger: logger.log(f"Data Error ({e}): {ex}")
+            continue
+        _write_cached_bars(cache_paths[e], out[e], e, logger)
+    return out
+
+def _shape_session_bars(rows, premarket_only: bool = True) -> Optional[pd.DataFrame]:
+    """Turns market_data rows into the engine's bar layout (Title-case OHLC, UTC + ET stamps)."""
+    if not rows:
+        return None
+    df = pd.DataFrame(
+        rows,
+        columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'session_db'],
+    )
+
+    # Single C-level parse: accepts both 'T'/space separators and a trailing 'Z',
+    # and utc=True standardizes to UTC aware (naive DB values are UTC).
+    df['timestamp'] = pd.to_datetime(df['timestamp'].astype(str), utc=True, format='ISO8601')
+    
+    # FIX: Database timestamps are UTC.
+    # We must localize to UTC then CONVERT to Eastern.
+    df['dt_eastern'] = df['timestamp'].dt.tz_convert(US_EASTERN)
+    
+    # Convert + rename on the frame we own, then select rows ONCE (no filter-then-copy,
+    # no separate dropna pass, no reset_index copy)
+    for col in ['open', 'high', 'low', 'close']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    # Normalize columns for the Engine
+    df.rename(columns={'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close'}, inplace=True)
+    df['source'] = pd.Series('Turso DB', index=df.index, dtype=BAR_SOURCE_DTYPE)
+
+    keep = df['Close'].notna().to_numpy()
+    # Filter for Pre-Market (04:00 - 09:30 ET) - OPTIONAL
+    if premarket_only:
+        # Integer minute-of-day instead of .dt.time, which boxes a Python time per bar.
+        # Seconds never matter: anything inside 09:30 is already >= 09:30:00.
+        et = df['dt_eastern'].dt
+        keep &= ((et.hour * 60 + et.minute) < MARKET_OPEN_MINUTE).to_numpy()
+    if not keep.all():
+        df = df.take(np.flatnonzero(keep))
+        df.index = pd.RangeIndex(len(df))
+    return df
 
 def get_previous_session_stats(client, ticker: str, current_date_str: str, logger: AppLogger) -> dict:
     """
@@ -101,10 +216,88 @@ def get_previous_session_stats(client, ticker: str, current_date_str: str, logge
     except Exception:
         return {"yesterday_close": 0, "yesterday_high": 0, "yesterday_low": 0}
 
+_EMPTY_SESSION_STATS = {"yesterday_close": 0, "yesterday_high": 0, "yesterday_low": 0}
+
+def get_previous_session_stats_bulk(client, tickers: List[str], current_date_str: str, logger: AppLogger = None) -> Dict[str, dict]:
+    """
+    get_previous_session_stats for many tickers in ONE query: each symbol's last
+    session before current_date_str is found and aggregated with a single GROUP BY,
+    instead of two round-trips per ticker. Tickers without history get the zero stats.
+    If the query itself fails the result is {}, so callers fall back to the per-ticker lookup.
+    """
+    out = {t: dict(_EMPTY_SESSION_STATS) for t in tickers}
+    symbols = sorted(set(tickers))
+    if not symbols:
+        return out
+    placeholders = ",".join("?" * len(symbols))
+    query = f"""
+        WITH prev AS (
+            SELECT symbol, MAX(date(timestamp)) AS d
+            FROM market_data
+            WHERE symbol IN ({placeholders}) AND date(timestamp) < ?
+            GROUP BY symbol
+        )
+        SELECT m.symbol, MAX(m.high), MIN(m.low),
+               (SELECT c.close FROM market_data c
+                 WHERE c.symbol = m.symbol AND date(c.timestamp) = p.d
+                 ORDER BY c.timestamp DESC LIMIT 1),
+               p.d
+        FROM market_data m
+        JOIN prev p ON m.symbol = p.symbol AND date(m.timestamp) = p.d
+        GROUP BY m.symbol, p.d
+    """
+    try:
+        rs = client.execute(query, symbols + [current_date_str])
+    except Exception as e:
+        if logger: logger.log(f"   ❌ Previous-session stats query failed: {e}")
+        return {}
+    for sym, high, low, close, prev_date in rs.rows:
+        if sym in out:
+            out[sym] = {
+                "yesterday_high": high if high else 0,
+                "yesterday_low": low if low else 0,
+                "yesterday_close": close if close else 0,
+                "date": prev_date
+            }
+    return out
+
 from backend.engine.capital_api import create_capital_session_v2, fetch_capital_data_range
 
 # --- DATA SOURCE ROUTING ---
 
+# Explicit ticker -> Capital.com epic overrides (based on database symbols).
+# Built once at import; ticker_to_epic runs once per ticker on every scan.
+EXPLICIT_EPIC_MAP = {
+    "BTCUSDT": "BTCUSD",
+    "CL=F": "OIL_CRUDE",
+    "EURUSDT": "EURUSD",
+    "PAXGUSDT": "GOLD",
+    "QQQ": "US100",    # CHANGED: Use US100 (Nasdaq CFD) for 24/5 Live Data
+    "SPY": "US500",    # CHANGED: Use US500 (S&P CFD) for 24/5 Live Data
+    "^VIX": "VIX",
+    "NDAQ": "US100",
+    # Major Indices
+    "DIA": "US30",
+    "IWM": "RTY",    # CHANGED: Use RTY (Russell 2000 CFD) for 24/5 Live Data
+    "US30": "US30",
+    "RTY": "RTY",
+    
+    # Sector ETFs (Direct Mapping)
+    "XLC": "XLCP", # Proxy: UCITS Version (No US ETF)
+    "XLF": "XLF",
+    "XLI": "XLI",
+    "XLP": "XLP",
+    "XLU": "XLU",
+    "XLV": "XLV",
+    "XLE": "XLEP", # Energy Proxy
+    "XLK": "XLK",
+    "XLY": "XLYP", # Cons Discretionary Proxy
+    "XLB": "XLB",
+    "SMH": "SOXX", # Proxy (SMH not on Cap, SOXX is)
+    "TLT": "TLT",
+    "UUP": "DXY"   # Proxy: US Dollar Index
+}
+
 def ticker_to_epic(ticker: str, client=None, logger=None) -> str:
     """
     Maps database tickers to Capital.com Epics.
@@ -112,50 +305,17 @@ def ticker_to_epic(ticker: str, client=None, logger=None) -> str:
     """
     normalized = ticker.upper().strip()
     
-    # 1. EXPLICIT MAPPING (Based on database symbols)
-    EXPLICIT_MAP = {
-        "BTCUSDT": "BTCUSD",
-        "CL=F": "OIL_CRUDE",
-        "EURUSDT": "EURUSD",
-        "PAXGUSDT": "GOLD",
-        "QQQ": "US100",    # CHANGED: Use US100 (Nasdaq CFD) for 24/5 Live Data
-        "SPY": "US500",    # CHANGED: Use US500 (S&P CFD) for 24/5 Live Data
-        "^VIX": "VIX",
-        "NDAQ": "US100",
-        # Major Indices
-        "DIA": "US30",
-        "IWM": "RTY",    # CHANGED: Use RTY (Russell 2000 CFD) for 24/5 Live Data
-        "US30": "US30",
-        "RTY": "RTY",
-        
-        # Sector ETFs (Direct Mapping)
-        "XLC": "XLCP", # Proxy: UCITS Version (No US ETF)
-        "XLF": "XLF",
-        "XLI": "XLI",
-        "XLP": "XLP",
-        "XLU": "XLU",
-        "XLV": "XLV",
-        "XLE": "XLEP", # Energy Proxy
-        "XLK": "XLK",
-        "XLY": "XLYP", # Cons Discretionary Proxy
-        "XLB": "XLB",
-        "SMH": "SOXX", # Proxy (SMH not on Cap, SOXX is)
-        "TLT": "TLT",
-        "UUP": "DXY"   # Proxy: US Dollar Index
-    }
-
-    if normalized in EXPLICIT_MAP:
-        return EXPLICIT_MAP[normalized]
+    # 1. EXPLICIT MAPPING
+    epic = EXPLICIT_EPIC_MAP.get(normalized)
+    if epic:
+        return epic
     
     # 2. DB LOOKUP
     if client:
-        try:
-            # Attempt to find the Epic mapping from Turso symbol_map table
-            rs = client.execute("SELECT capital_epic FROM symbol_map WHERE user_ticker = ?", [normalized])
-            if rs.rows and rs.rows[0][0]:
-                return rs.rows[0][0]
-        except Exception:
-            pass
+        # Whole symbol_map table is cached, so a scan of N tickers costs one query
+        epic = get_symbol_map_from_db(client, logger).get(normalized)
+        if epic:
+            return epic
             
     # 3. FINAL DEFAULT
     return normalized
@@ -173,7 +333,7 @@ def get_live_bars_from_capital(ticker: str, client=None, days: int = 5, logger:
     now_utc = datetime.now(pytz.utc)
     start_utc = now_utc - timedelta(days=days)
     
-    df = fetch_capital_data_range(epic, cst, xst, start_utc, now_utc, logger, resolution=resolution)
+    df = fetch_capital_data_range(epic, cst, xst, start_utc, now_utc, logger, resolution=resolution, now_utc=now_utc)
     if df.empty:
         return None
         
@@ -185,64 +345,118 @@ def get_live_bars_from_capital(ticker: str, client=None, days: int = 5, logger:
     if 'SnapshotTime' in df.columns:
         df.rename(columns={'SnapshotTime': 'timestamp'}, inplace=True)
         
-    df['source'] = 'Capital.com'
+    df['source'] = pd.Series('Capital.com', index=df.index, dtype=BAR_SOURCE_DTYPE)
     return df
 
-def get_live_bars_from_yahoo(ticker: str, days: int = 5, resolution: str = "MINUTE_5", logger: AppLogger = None) -> Optional[pd.DataFrame]:
-    """Fallback: Fetches data from Yahoo Finance."""
-    try:
-        # Map resolution to YF interval and enforce lookback limits
-        interval_map = {
-            "MINUTE": "1m",
-            "MINUTE_1": "1m",
-            "MINUTE_5": "5m",
-            "MINUTE_15": "15m",
-            "MINUTE_30": "30m",
-            "HOUR": "1h",
-            "HOUR_4": "4h",
-            "DAY": "1d",
-        }
-        interval = interval_map.get(resolution.upper(), "5m")
-
-        # YF lookback limits per interval
-        max_days_map = {
-            "1m": 7,
-            "5m": 60,
-            "15m": 60,
-            "30m": 60,
-            "1h": 730,
-            "4h": 730,
-            "1d": 3650,
-        }
-        max_days = max_days_map.get(interval, 60)
-        days = min(days, max_days)
-
-        # Map requested days to valid YF period
-        if days <= 1:
-            yf_period = "1d"
-        elif days <= 5:
-            yf_period = "5d"
-        elif days <= 30:
-            yf_period = "1mo"
-        elif days <= 90:
-            yf_period = "3mo"
-        elif days <= 180:
-            yf_period = "6mo"
-        elif days <= 365:
-            yf_period = "1y"
-        elif days <= 730:
-            yf_period = "2y"
+def _yahoo_request_params(ticker: str, days: int, resolution: str) -> Tuple[str, str, str, bool]:
+    """Maps our ticker/resolution/lookback onto yfinance (symbol, period, interval, prepost)."""
+    # Map resolution to YF interval and enforce lookback limits
+    interval_map = {
+        "MINUTE": "1m",
+        "MINUTE_1": "1m",
+        "MINUTE_5": "5m",
+        "MINUTE_15": "15m",
+        "MINUTE_30": "30m",
+        "HOUR": "1h",
+        "HOUR_4": "4h",
+        "DAY": "1d",
+    }
+    interval = interval_map.get(resolution.upper(), "5m")
+
+    # YF lookback limits per interval
+    max_days_map = {
+        "1m": 7,
+        "5m": 60,
+        "15m": 60,
+        "30m": 60,
+        "1h": 730,
+        "4h": 730,
+        "1d": 3650,
+    }
+    max_days = max_days_map.get(interval, 60)
+    days = min(days, max_days)
+
+    # Map requested days to valid YF period
+    if days <= 1:
+        yf_period = "1d"
+    elif days <= 5:
+        yf_period = "5d"
+    elif days <= 30:
+        yf_period = "1mo"
+    elif days <= 90:
+        yf_period = "3mo"
+    elif days <= 180:
+        yf_period = "6mo"
+    elif days <= 365:
+        yf_period = "1y"
+    elif days <= 730:
+        yf_period = "2y"
+    else:
+        yf_period = "max"
+
+    # YFinance tickers for indices might differ
+    yf_ticker = ticker
+    if ticker == "BTCUSDT": yf_ticker = "BTC-USD"
+    elif ticker == "EURUSDT": yf_ticker = "EURUSD=X"
+    elif ticker == "CL=F": yf_ticker = "CL=F"
+
+    # prepost only relevant for intraday intervals
+    use_prepost = interval in ('1m', '5m', '15m', '30m')
+    return yf_ticker, yf_period, interval, use_prepost
+
+def _normalize_yahoo_frame(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Turns a raw yfinance frame into the engine layout (UTC 'timestamp' column, sorted, unique)."""
+    # Flatten MultiIndex columns if still present (safety net)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+        
+    # Reset index to get timestamp column
+    df.reset_index(inplace=True)
+    
+    # Renaissance of Column Names
+    # YF gives: Date/Datetime, Open, High, Low, Close, Volume
+    rename_map = {
+        'Datetime': 'timestamp', 
+        'Date': 'timestamp',
+        'Open': 'Open', 'High': 'High', 'Low': 'Low', 'Close': 'Close', 'Volume': 'Volume'
+    }
+    df.rename(columns=rename_map, inplace=True)
+    
+    # Ensure timestamp is UTC
+    if 'timestamp' not in df.columns:
+        # Fallback: use first column if it looks like a datetime
+        first_col = df.columns[0]
+        if pd.api.types.is_datetime64_any_dtype(df[first_col]):
+            df.rename(columns={first_col: 'timestamp'}, inplace=True)
         else:
-            yf_period = "max"
+            return None
+        
+    if df['timestamp'].dt.tz is None:
+         # Daily bars from YF are timezone-naive; localize to exchange TZ (US/Eastern)
+         df['timestamp'] = df['timestamp'].dt.tz_localize('US/Eastern').dt.tz_convert('UTC')
+    else:
+         df['timestamp'] = df['timestamp'].dt.tz_convert('UTC')
 
-        # YFinance tickers for indices might differ
-        yf_ticker = ticker
-        if ticker == "BTCUSDT": yf_ticker = "BTC-USD"
-        elif ticker == "EURUSDT": yf_ticker = "EURUSD=X"
-        elif ticker == "CL=F": yf_ticker = "CL=F"
+    # Deduplicate and sort chronologically. yfinance normally hands back a strictly
+    # increasing index, so one O(n) check lets us skip the hash dedup and the sort.
+    ts = df['timestamp'].values
+    if not (ts[1:] > ts[:-1]).all():
+        df = df.drop_duplicates(subset='timestamp').sort_values('timestamp').reset_index(drop=True)
 
-        # prepost only relevant for intraday intervals
-        use_prepost = interval in ('1m', '5m', '15m', '30m')
+    df['source'] = pd.Series('Yahoo Finance', index=df.index, dtype=BAR_SOURCE_DTYPE)
+    
+    # ENSURE UNIQUE COLUMNS: Sometimes YF returns duplicate names after MultiIndex flattening.
+    # Boolean .loc already returns a new frame, and the common case needs no copy at all.
+    dup = df.columns.duplicated()
+    if dup.any():
+        df = df.loc[:, ~dup]
+    
+    return df
+
+def get_live_bars_from_yahoo(ticker: str, days: int = 5, resolution: str = "MINUTE_5", logger: AppLogger = None) -> Optional[pd.DataFrame]:
+    """Fallback: Fetches data from Yahoo Finance."""
+    try:
+        yf_ticker, yf_period, interval, use_prepost = _yahoo_request_params(ticker, days, resolution)
 
         df = yf.download(
             yf_ticker,
@@ -258,51 +472,86 @@ def get_live_bars_from_yahoo(ticker: str, days: int = 5, resolution: str = "MINU
             if logger: logger.log(f"   ⚠️ Yahoo Finance: No data for {yf_ticker}")
             return None
             
-        # Flatten MultiIndex columns if still present (safety net)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-            
-        # Reset index to get timestamp column
-        df.reset_index(inplace=True)
-        
-        # Renaissance of Column Names
-        # YF gives: Date/Datetime, Open, High, Low, Close, Volume
-        rename_map = {
-            'Datetime': 'timestamp', 
-            'Date': 'timestamp',
-            'Open': 'Open', 'High': 'High', 'Low': 'Low', 'Close': 'Close', 'Volume': 'Volume'
-        }
-        df.rename(columns=rename_map, inplace=True)
-        
-        # Ensure timestamp is UTC
-        if 'timestamp' not in df.columns:
-            # Fallback: use first column if it looks like a datetime
-            first_col = df.columns[0]
-            if pd.api.types.is_datetime64_any_dtype(df[first_col]):
-                df.rename(columns={first_col: 'timestamp'}, inplace=True)
-            else:
-                return None
-            
-        if df['timestamp'].dt.tz is None:
-             # Daily bars from YF are timezone-naive; localize to exchange TZ (US/Eastern)
-             df['timestamp'] = df['timestamp'].dt.tz_localize('US/Eastern').dt.tz_convert('UTC')
-        else:
-             df['timestamp'] = df['timestamp'].dt.tz_convert('UTC')
-
-        # Deduplicate and sort chronologically
-        df = df.drop_duplicates(subset='timestamp').sort_values('timestamp').reset_index(drop=True)
-
-        df['source'] = 'Yahoo Finance'
-        
-        # ENSURE UNIQUE COLUMNS: Sometimes YF returns duplicate names after MultiIndex flattening
-        df = df.loc[:, ~df.columns.duplicated()].copy()
-        
-        return df
+        return _normalize_yahoo_frame(df)
         
     except Exception as e:
         if logger: logger.log(f"   ❌ Yahoo Fallback Error ({ticker}): {e}")
         return None
 
+def get_live_bars_from_yahoo_bulk(tickers: List[str], days: int = 5, resolution: str = "MINUTE_5", logger: AppLogger = None) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Fetches bars for many tickers in ONE yf.download call (yfinance fans out internally).
+    Separate concurrent yf.download calls are not safe: they share yfinance's module-level
+    result dict. Returns {ticker: DataFrame or None}, same layout as get_live_bars_from_yahoo.
+    """
+    out: Dict[str, Optional[pd.DataFrame]] = {t: None for t in tickers}
+    if not tickers:
+        return out
+    symbol_of = {}
+    yf_period = interval = None
+    use_prepost = False
+    for t in tickers:
+        symbol_of[t], yf_period, interval, use_prepost = _yahoo_request_params(t, days, resolution)
+    try:
+        raw = yf.download(
+            sorted(set(symbol_of.values())),
+            period=yf_period,
+            interval=interval,
+            progress=False,
+            prepost=use_prepost,
+            auto_adjust=True,
+            group_by='ticker',
+            multi_level_index=True,
+            threads=True,
+        )
+    except Exception as e:
+        if logger: logger.log(f"   ❌ Yahoo Bulk Error ({len(tickers)} tickers): {e}")
+        return out
+    if raw is None or raw.empty or not isinstance(raw.columns, pd.MultiIndex):
+        return out
+
+    # Every symbol shares the union index: convert it to UTC once here so the
+    # per-symbol tz_convert in _normalize_yahoo_frame is a no-op relabel.
+    if isinstance(raw.index, pd.DatetimeIndex):
+        idx = raw.index
+        raw.index = idx.tz_localize('US/Eastern').tz_convert('UTC') if idx.tz is None else idx.tz_convert('UTC')
+
+    frames = _split_yahoo_bulk_frame(raw)
+    for t, sym in symbol_of.items():
+        if sym not in frames:
+            continue
+        try:
+            sub = frames[sym]
+            if not sub.empty:
+                out[t] = _normalize_yahoo_frame(sub)
+        except Exception as e:
+            if logger: logger.log(f"   ❌ Yahoo Bulk Parse Error ({t}): {e}")
+    return out
+
+def _split_yahoo_bulk_frame(raw: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Splits a group_by='ticker' download into {symbol: frame}, dropping each symbol's
+    all-NaN rows (the union index covers every symbol's bars). When the columns are the
+    full symbol x field grid of floats, one reshape to (rows, symbols, fields) replaces a
+    MultiIndex lookup + copy per symbol; anything else takes the per-symbol path.
+    """
+    cols = raw.columns
+    symbols = cols.get_level_values(0).unique()
+    fields = cols.get_level_values(1).unique()
+    grid = pd.MultiIndex.from_product([symbols, fields])
+    if len(cols) != len(grid) or not cols.equals(grid) or not (raw.dtypes == np.float64).all():
+        # dropna returns a new frame, so normalizing it in place cannot touch `raw`
+        return {sym: raw[sym].dropna(how='all') for sym in symbols}
+
+    block = raw.to_numpy().reshape(len(raw), len(symbols), len(fields))
+    has_data = ~np.isnan(block).all(axis=2)
+    field_index = pd.Index(fields, name=cols.names[1])
+    frames = {}
+    for i, sym in enumerate(symbols):
+        rows = has_data[:, i]
+        frames[sym] = pd.DataFrame(block[rows, i, :], index=raw.index[rows], columns=field_index)
+    return frames
+
 def get_historical_bars_for_chart(client, ticker: str, cutoff_str: str, days: int = 5, mode: str = "Simulation", logger: AppLogger = None) -> Optional[pd.DataFrame]:
     """
     Fetches multi-day price history.
@@ -315,7 +564,7 @@ def get_historical_bars_for_chart(client, ticker: str, cutoff_str: str, days: in
         if df is not None:
              # Normalize Capital (Title) to Chart (Lower)
              df.rename(columns={'Open': 'open', 'High': 'high', 'Low': 'low', 'Close': 'close', 'Volume': 'volume'}, inplace=True)
-             df['source'] = 'Capital.com'
+             df['source'] = pd.Series('Capital.com', index=df.index, dtype=BAR_SOURCE_DTYPE)
         return df
     
     # --- SIMULATION (DB) LOGIC ---
@@ -345,7 +594,7 @@ def get_historical_bars_for_chart(client, ticker: str, cutoff_str: str, days: in
             return None
             
         df = pd.DataFrame(rs.rows, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        df['source'] = 'Turso DB'
+        df['source'] = pd.Series('Turso DB', index=df.index, dtype=BAR_SOURCE_DTYPE)
         
         # Convert timestamp to datetime objects for Pandas
         df['timestamp'] = pd.to_datetime(df['timestamp'])
@@ -363,29 +612,40 @@ def get_historical_bars_for_chart(client, ticker: str, cutoff_str: str, days: in
         if logger: logger.log(f"Chart History DB Error ({ticker}): {e}")
         return None
 
+def _fresh_capital_bars(client, epic: str, days, resolution: str, logger: AppLogger = None) -> Optional[pd.DataFrame]:
+    """Capital.com bars, or None when missing or stale."""
+    df = get_live_bars_from_capital(epic, client=client, days=days, logger=logger, resolution=resolution)
+
+    # STALENESS CHECK: If Capital returns "Yesterday's Close" (stale) during Pre-Market, TREAT AS EMPTY.
+    if df is not None and not df.empty:
+        last_ts = df['timestamp'].iloc[-1]
+        age_mins = get_staleness_score(last_ts)
+
+        # If data is > 60 mins old, it's stale (likely yesterday's data)
+        if age_mins > 60:
+            if logger: logger.warn(f"   ⚠️ Capital.com data for {epic} is STALE ({int(age_mins)}m old). Discarding...")
+            return None
+    return df
+
+def _finalize_live_bars(df: Optional[pd.DataFrame]) -> Tuple[Optional[pd.DataFrame], Optional[float]]:
+    if df is not None and not df.empty:
+        # ENSURE UNIQUE COLUMNS: Prevents "cannot convert series to float" errors
+        dup = df.columns.duplicated()
+        if dup.any():
+            df = df.loc[:, ~dup]
+        return df, get_staleness_score(df['timestamp'].iloc[-1])
+    return df, None
+
 def get_session_bars_routed(client, epic: str, benchmark_date_str: str, cutoff_str: str, mode: str = "Simulation", logger: AppLogger = None, db_fallback: bool = False, premarket_only: bool = True, days: int = 3, resolution: str = "MINUTE_5") -> Tuple[Optional[pd.DataFrame], Optional[float]]:
     """
     Routes data fetching for the Analysis Engine.
     Returns: (DataFrame with TITLE CASE columns, staleness_score_minutes or None)
     """
-    df = None
-    staleness = None
-
     if mode == "Live":
         # Strategy: Try Capital -> Fail? Try Yahoo -> Fail? Try DB Fallback if enabled -> Fail? Give Up.
         
         # 1. Capital.com
-        df = get_live_bars_from_capital(epic, client=client, days=days, logger=logger, resolution=resolution)
-        
-        # STALENESS CHECK: If Capital returns "Yesterday's Close" (stale) during Pre-Market, TREAT AS EMPTY.
-        if df is not None and not df.empty:
-            last_ts = df['timestamp'].iloc[-1]
-            age_mins = get_staleness_score(last_ts)
-            
-            # If data is > 60 mins old, it's stale (likely yesterday's data)
-            if age_mins > 60:
-                if logger: logger.warn(f"   ⚠️ Capital.com data for {epic} is STALE ({int(age_mins)}m old). Discarding...")
-                df = None
+        df = _fresh_capital_bars(client, epic, days, resolution, logger)
 
         # 2. Yahoo Finance Fallback
         if df is None or df.empty:
@@ -398,18 +658,119 @@ def get_session_bars_routed(client, epic: str, benchmark_date_str: str, cutoff_s
              if logger: logger.warn(f"   ⚠️ Live Fetch Failed for {epic}. Attempting DB Fallback...")
              df = get_session_bars_from_db(client, epic, benchmark_date_str, cutoff_str, logger, premarket_only=premarket_only)
         
-        if df is not None and not df.empty:
-            # ENSURE UNIQUE COLUMNS: Prevents "cannot convert series to float" errors
-            df = df.loc[:, ~df.columns.duplicated()].copy()
-            
-            last_ts = df['timestamp'].iloc[-1]
-            staleness = get_staleness_score(last_ts)
-            
-        return df, staleness
+        return _finalize_live_bars(df)
     else:
         df = get_session_bars_from_db(client, epic, benchmark_date_str, cutoff_str, logger, premarket_only=premarket_only)
         return df, None
 
+def get_session_bars_routed_bulk(client, tickers: List[str], benchmark_date_str: str, cutoff_str: str, mode: str = "Simulation", logger: AppLogger = None, db_fallback: bool = False, premarket_only: bool = True, days: int = 3, resolution: str = "MINUTE_5", max_workers: int = 5) -> Dict[str, Tuple[Optional[pd.DataFrame], Optional[float]]]:
+    """
+    get_session_bars_routed for a whole ticker list: {ticker: (df, staleness)}.
+    Live mode fetches Capital.com per ticker in parallel, then sends every ticker that
+    Capital could not serve to Yahoo in ONE bulk download, then applies the DB fallback.
+    Simulation (and the DB fallback) reads every ticker's session in a single query.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if mode != "Live":
+        # One market_data query for the whole list instead of one per ticker
+        bars = get_session_bars_from_db_bulk(client, tickers, benchmark_date_str, cutoff_str, logger, premarket_only=premarket_only)
+        return {t: (bars.get(t), None) for t in tickers}
+
+    # 1. Capital.com (per ticker, parallel)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        bars = dict(zip(tickers, executor.map(lambda t: _fresh_capital_bars(client, t, days, resolution, logger), tickers)))
+
+    # 2. Yahoo Finance Fallback (single request for all misses)
+    misses = [t for t, df in bars.items() if df is None or df.empty]
+    if misses:
+        if logger: logger.warn(f"   ⚠️ Capital.com missing {', '.join(misses)}. Attempting Yahoo Finance Fallback...")
+        bars.update({t: df for t, df in get_live_bars_from_yahoo_bulk(misses, days, resolution, logger).items() if df is not None})
+
+    # 3. DB Fallback (if requested and Live/Yahoo failed)
+    if db_fallback:
+        failed = [t for t, df in bars.items() if df is None or df.empty]
+        if failed:
+            if logger: logger.warn(f"   ⚠️ Live Fetch Failed for {', '.join(failed)}. Attempting DB Fallback...")
+            bars.update(get_session_bars_from_db_bulk(client, failed, benchmark_date_str, cutoff_str, logger, premarket_only=premarket_only))
+
+    return {t: _finalize_live_bars(bars[t]) for t in tickers}
+
+@_njit(cache=True)
+def _pivot_excursions(pivots, price, away, ts_ns, is_resistance, has_ts, ts_tail):
+    """
+    Numeric core of detect_impact_levels. For each pivot position, finds the first
+    later bar that trades back through the pivot and returns, per pivot:
+      magnitude - max adverse excursion up to and including that bar (or session end)
+      duration  - minutes until the return (or until the last bar)
+    Works on plain ndarrays so it can be JIT-compiled when numba is installed.
+    """
+    n = price.shape[0]
+    k = pivots.shape[0]
+    magnitude = np.full(k, np.nan)
+    duration = np.full(k, np.nan)
+    for j in range(k):
+        p = pivots[j]
+        if p + 1 >= n:
+            continue
+        pivot = price[p]
+        # argmax on the crossing mask gives the first crossing without building the
+        # index array of every later crossing; a False at that slot means none happened
+        if is_resistance:
+            crossed = price[p + 1:] >= pivot
+        else:
+            crossed = price[p + 1:] <= pivot
+        first = crossed.argmax()
+        recovered = crossed[first]
+        end = p + 1 + first if recovered else n - 1
+        if is_resistance:
+            magnitude[j] = pivot - np.nanmin(away[p + 1:end + 1])
+        else:
+            magnitude[j] = np.nanmax(away[p + 1:end + 1]) - pivot
+        if (recovered and has_ts) or (not recovered and ts_tail):
+            duration[j] = (ts_ns[end] - ts_ns[p]) / 1e9 / 60.0
+        else:
+            duration[j] = end - p  # bar count when there is no clock to read
+    return magnitude, duration
+
+def _pivot_positions(highs: np.ndarray, lows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    3-bar local extremes as positional indices: a peak is >= the bar before and > the
+    bar after; a valley mirrors that. Edge bars and NaN neighbours never qualify,
+    matching the old shift(1)/shift(-1) Series comparisons.
+    """
+    peak = np.zeros(highs.shape[0], dtype=bool)
+    valley = np.zeros(lows.shape[0], dtype=bool)
+    mid_h, mid_l = highs[1:-1], lows[1:-1]
+    peak[1:-1] = (highs[:-2] <= mid_h) & (highs[2:] < mid_h)
+    valley[1:-1] = (lows[:-2] >= mid_l) & (lows[2:] > mid_l)
+    return np.flatnonzero(peak), np.flatnonzero(valley)
+
+class _SessionArrays(NamedTuple):
+    """Per-ticker column arrays shared by analyze_market_context and detect_impact_levels."""
+    highs: np.ndarray
+    lows: np.ndarray
+    closes: np.ndarray
+    ts: pd.DatetimeIndex  # bar times; a stand-in epoch index when the frame has no clock
+    has_ts: bool
+    ts_tail: bool  # times come from the 'timestamp' column rather than the index
+
+def _session_arrays(df: pd.DataFrame) -> _SessionArrays:
+    """Pulls High/Low/Close and the bar clock out of a session frame once."""
+    # Bar times: 'timestamp' column (RangeIndex frames) or a DatetimeIndex (Engine Lab style)
+    if 'timestamp' in df.columns:
+        ts, has_ts, ts_tail = pd.DatetimeIndex(df['timestamp']).as_unit('ns'), True, True
+    elif isinstance(df.index, pd.DatetimeIndex):
+        ts, has_ts, ts_tail = df.index.as_unit('ns'), True, False
+    else:
+        ts, has_ts, ts_tail = pd.DatetimeIndex(np.zeros(len(df), dtype='datetime64[ns]')), False, False
+    return _SessionArrays(
+        df['High'].to_numpy(dtype=np.float64),
+        df['Low'].to_numpy(dtype=np.float64),
+        df['Close'].to_numpy(dtype=np.float64),
+        ts, has_ts, ts_tail,
+    )
+
 def detect_impact_levels(df, session_start_dt=None):
     """
     Identifies Levels based on IMPACT (Depth & Duration).
@@ -419,144 +780,43 @@ def detect_impact_levels(df, session_start_dt=None):
     4. De-duplicate (remove nearby weaker signals).
     """
     if df.empty: return []
+    return _impact_levels(df, _session_arrays(df), session_start_dt)
+
+def _impact_levels(df, arrays: _SessionArrays, session_start_dt=None):
+    """detect_impact_levels over arrays the caller already extracted from df."""
+    highs, lows = arrays.highs, arrays.lows
+    ts_ns, has_ts, ts_tail = arrays.ts.asi8, arrays.has_ts, arrays.ts_tail
 
-    avg_price = df['Close'].mean()
+    avg_price = np.nanmean(arrays.closes)
 
     # Define "Nearby" for de-duplication (e.g. 0.15% of price)
     proximity_threshold = max(0.10, avg_price * 0.0015)
 
     # 1. Find ALL Pivots (Local Extremes)
-    # We use a small window (3) because we want to catch the exact moment of rejection
-    df['is_peak'] = df['High'][(df['High'].shift(1) <= df['High']) & (df['High'].shift(-1) < df['High'])]
-    df['is_valley'] = df['Low'][(df['Low'].shift(1) >= df['Low']) & (df['Low'].shift(-1) > df['Low'])]
-
-    potential_peaks = df[df['is_peak'].notna()]
-    potential_valleys = df[df['is_valley'].notna()]
+    # We use a small window (3) because we want to catch the exact moment of rejection.
+    # Computed on the arrays, so the caller's frame is left untouched.
+    peak_pos, valley_pos = _pivot_positions(highs, lows)
 
     scored_levels = []
 
     # 2. Score Every Pivot Individually
-
-    # --- RESISTANCE SCORING ---
-    for idx, row in potential_peaks.iterrows():
-        pivot_price = row['High']
-        pivot_time = idx # Index in df (RangeIndex in processing.py usually, need to check access)
-        
-        # NOTE: df in processing.py has RangeIndex. 
-        # But wait, logic below uses df.loc[idx, 'timestamp'].
-        # In Engine Lab, df has DateTimeIndex so idx IS timestamp.
-        # Here df has RangeIndex, so idx is int.
-        # We need to adapt logic to handle RangeIndex OR ensure we access timestamps correctly.
-
-        # Look forward
-        # If RangeIndex, loc_idx is just idx? 
-        # df.index.get_loc(pivot_time) -> if pivot_time is int index, this works.
-        
-        # Adaptation: processing.py df is RangeIndex.
-        # So pivot_time is an integer.
-        
-        if isinstance(df.index, pd.RangeIndex):
-             loc_idx = idx
-        else:
-             loc_idx = df.index.get_loc(pivot_time)
-
-        future_df = df.iloc[loc_idx+1:]
-
-        if future_df.empty: continue
-
-        # Did price ever return to this level?
-        # Return condition: Price crosses ABOVE the pivot again
-        recovery_mask = future_df['High'] >= pivot_price
-
-        if recovery_mask.any():
-            recovery_time = recovery_mask.idxmax() # This will be an Integer Index if RangeIndex
-            interval_df = future_df.loc[:recovery_time]
-            # Max Adverse Excursion
-            lowest_point = interval_df['Low'].min()
-            magnitude = pivot_price - lowest_point
-            
-            # Duration Calculation Adaptation
-            if 'timestamp' in df.columns:
-                 t1 = df.loc[idx]['timestamp'] # idx is integer
-                 t2 = df.loc[recovery_time]['timestamp']
-                 duration_mins = (t2 - t1).total_seconds() / 60
-            else:
-                 # Fallback if using DateTimeIndex (Engine Lab style)
-                 duration_mins = (recovery_time - pivot_time).total_seconds() / 60
-        else:
-            # Price NEVER returned
-            lowest_point = future_df['Low'].min()
-            magnitude = pivot_price - lowest_point
-            # Duration is rest of session
-            if 'timestamp' in df.columns:
-                 t_start = df.loc[idx]['timestamp']
-                 t_end = df.iloc[-1]['timestamp']
-                 duration_mins = (t_end - t_start).total_seconds() / 60
-            else:
-                 duration_mins = len(future_df) # Rough estimate or calc from index
-
-        # SCORE CALCULATION (NORMALIZED)
-        magnitude_pct = (magnitude / pivot_price) * 100
-        score = magnitude_pct * np.log1p(duration_mins)
-
+    for level_type, pos, price, away, is_res in (
+        ("RESISTANCE", peak_pos, highs, lows, True),
+        ("SUPPORT", valley_pos, lows, highs, False),
+    ):
+        magnitude, duration = _pivot_excursions(pos, price, away, ts_ns, is_res, has_ts, ts_tail)
+        pivot_px = price[pos]
+        score = (magnitude / pivot_px) * 100 * np.log1p(duration)
         # LOWERED THRESHOLD TO 0.00015 (0.015%) to catch more levels
-        if magnitude > (avg_price * 0.00015): 
+        keep = magnitude > (avg_price * 0.00015)
+        for k in np.flatnonzero(keep):
             scored_levels.append({
-                "type": "RESISTANCE",
-                "level": pivot_price,
-                "score": score,
-                "magnitude": magnitude,
-                "duration": duration_mins,
-                "time": pivot_time
-            })
-
-    # --- SUPPORT SCORING ---
-    for idx, row in potential_valleys.iterrows():
-        pivot_price = row['Low']
-        
-        if isinstance(df.index, pd.RangeIndex):
-             loc_idx = idx
-        else:
-             loc_idx = df.index.get_loc(idx)
-
-        future_df = df.iloc[loc_idx+1:]
-        if future_df.empty: continue
-
-        recovery_mask = future_df['Low'] <= pivot_price
-
-        if recovery_mask.any():
-            recovery_time = recovery_mask.idxmax()
-            interval_df = future_df.loc[:recovery_time]
-            highest_point = interval_df['High'].max()
-            magnitude = highest_point - pivot_price
-            
-            if 'timestamp' in df.columns:
-                 t1 = df.loc[idx]['timestamp']
-                 t2 = df.loc[recovery_time]['timestamp']
-                 duration_mins = (t2 - t1).total_seconds() / 60
-            else:
-                 duration_mins = (recovery_time - idx).total_seconds() / 60
-        else:
-            highest_point = future_df['High'].max()
-            magnitude = highest_point - pivot_price
-            if 'timestamp' in df.columns:
-                 t_start = df.loc[idx]['timestamp']
-                 t_end = df.iloc[-1]['timestamp']
-                 duration_mins = (t_end - t_start).total_seconds() / 60
-            else:
-                 duration_mins = len(future_df)
-
-        score = ((magnitude / pivot_price) * 100) * np.log1p(duration_mins)
-
-        # LOWERED THRESHOLD TO 0.00015 (0.015%)
-        if magnitude > (avg_price * 0.00015):
-            scored_levels.append({
-                "type": "SUPPORT",
-                "level": pivot_price,
-                "score": score,
-                "magnitude": magnitude,
-                "duration": duration_mins,
-                "time": idx
+                "type": level_type,
+                "level": float(pivot_px[k]),
+                "score": float(score[k]),
+                "magnitude": float(magnitude[k]),
+                "duration": float(duration[k]),
+                "time": df.index[pos[k]]
             })
 
     # 3. Sort by Score (Impact)
@@ -620,6 +880,64 @@ def detect_impact_levels(df, session_start_dt=None):
 
     return summary
 
+@_njit(cache=True)
+def _block_poc_ticks(lows, highs, starts, ends, tick):
+    """
+    Time-at-price POC for every block in one call (blocks are [starts[b], ends[b]) slices):
+    each bar votes once for each tick it spans. Returns per block the POC as an integer
+    tick index and its vote count (0 when the block has no usable bars). Buckets come from
+    integer tick arithmetic and a difference array, so there is no per-row tick list; the
+    loop over blocks is JIT-compiled when numba is installed. Ties on votes go to the
+    tick covered by the earliest bar, then the lowest such tick.
+    """
+    nb = starts.shape[0]
+    poc_idx = np.zeros(nb, dtype=np.int64)
+    hits = np.zeros(nb, dtype=np.int64)
+    scale = 1.0 / tick
+    for b in range(nb):
+        lo_b = lows[starts[b]:ends[b]]
+        hi_b = highs[starts[b]:ends[b]]
+        mask = ~(np.isnan(lo_b) | np.isnan(hi_b))
+        if not mask.any():
+            continue
+        l = np.floor(lo_b[mask] * scale) / scale
+        h = np.ceil(hi_b[mask] * scale) / scale
+        lo_idx = np.rint(l * scale).astype(np.int64)
+        # Same tick count as np.arange(l, h + tick, tick) so POCs match the old per-row walk
+        n_ticks = np.where(h > l, np.ceil((h + tick - l) / tick), 1.0).astype(np.int64)
+        hi_idx = lo_idx + n_ticks - 1
+
+        base = lo_idx.min()
+        nbins = hi_idx.max() - base + 2
+        diff = np.zeros(nbins, dtype=np.int64)
+        opens = np.bincount(lo_idx - base)
+        closes = np.bincount(hi_idx - base + 1)
+        diff[:opens.shape[0]] += opens
+        diff[:closes.shape[0]] -= closes
+        counts = np.cumsum(diff[:-1])
+
+        # Ties go to the tick first reached by the earliest bar (then the lower tick),
+        # the order in which the old per-row dict walk inserted its keys.
+        top = counts.max()
+        max_idx = -1
+        best_bar = lo_idx.shape[0]
+        for c in np.flatnonzero(counts == top):
+            t = base + c
+            first_bar = np.argmax((lo_idx <= t) & (hi_idx >= t))
+            if first_bar < best_bar:
+                best_bar = first_bar
+                max_idx = c
+        poc_idx[b] = base + max_idx
+        hits[b] = top
+    return poc_idx, hits
+
+def _block_poc(lows: np.ndarray, highs: np.ndarray, tick: float = 0.05) -> Tuple[Optional[float], int]:
+    """Single-block form of _block_poc_ticks: (POC price or None, votes at the POC)."""
+    poc_idx, hits = _block_poc_ticks(lows, highs, np.array([0]), np.array([len(lows)]), tick)
+    if hits[0] == 0:
+        return None, 0
+    return round(int(poc_idx[0]) * tick, 2), int(hits[0])
+
 def analyze_market_context(df, ref_levels, ticker="UNKNOWN", session_start_dt=None) -> dict:
     """
     The Master Function.
@@ -628,18 +946,32 @@ def analyze_market_context(df, ref_levels, ticker="UNKNOWN", session_start_dt=No
     if df is None or df.empty:
         return {"status": "No Data", "meta": {"ticker": ticker}}
 
-    # Pre-calc
-    if 'timestamp' in df.columns:
-        # Ensure correct resampling if index is not datetime
-        # df index is RangeIndex, column 'timestamp' exists
-        blocks = df.resample('30min', on='timestamp')
-    else:
-        # Fallback if DF has DateTimeIndex
-        blocks = df.resample('30min')
-
-    session_high = df['High'].max()
-    session_low = df['Low'].min()
-    current_price = df.iloc[-1]['Close']
+    # Pre-calc: pull columns out as ndarrays once (shared with the impact-level pass) and
+    # bucket rows into 30-min blocks by integer epoch key, so per-block stats are array
+    # slices instead of DataFrame copies.
+    arrays = _session_arrays(df)
+    ts = arrays.ts
+
+    block_ns = 30 * 60 * 10**9
+    block_keys = ts.asi8 // block_ns
+    H, L, C = arrays.highs, arrays.lows, arrays.closes
+    O = df['Open'].to_numpy(dtype=float)
+    # Session bars arrive in time order; only reorder when they do not
+    if not (block_keys[1:] >= block_keys[:-1]).all():
+        order = np.argsort(block_keys, kind='stable')
+        block_keys, H, L, O, C = block_keys[order], H[order], L[order], O[order], C[order]
+    unique_keys, block_starts = np.unique(block_keys, return_index=True)
+    block_ends = np.append(block_starts[1:], len(block_keys))
+
+    # Per-block OHLC in one ufunc pass each; fmax/fmin skip NaN bars like nanmax/nanmin
+    block_highs = np.fmax.reduceat(H, block_starts)
+    block_lows = np.fmin.reduceat(L, block_starts)
+    block_opens = O[block_starts]
+    block_closes = C[block_ends - 1]
+
+    session_high = np.nanmax(arrays.highs)
+    session_low = np.nanmin(arrays.lows)
+    current_price = arrays.closes[-1]
     total_range = session_high - session_low
 
     value_migration_log = []
@@ -648,32 +980,24 @@ def analyze_market_context(df, ref_levels, ticker="UNKNOWN", session_start_dt=No
     # Helper to track POCs for Time-Based Support detection
     all_block_pocs = []
 
-    for time_window, block_data in blocks:
-        if len(block_data) == 0: continue
+    # Every block's volume-profile POC in one kernel call over the block offsets
+    tick = 0.05
+    poc_ticks, poc_votes = _block_poc_ticks(L, H, block_starts, block_ends, tick)
 
-        price_counts = {}
-        for _, row in block_data.iterrows():
-            l = np.floor(row['Low'] * 20) / 20
-            h = np.ceil(row['High'] * 20) / 20
-            if h > l: ticks = np.arange(l, h + 0.05, 0.05)
-            else: ticks = [l]
-            for t in ticks:
-                p = round(t, 2)
-                price_counts[p] = price_counts.get(p, 0) + 1
+    for key, start, end, block_h, block_l, block_o, block_c, poc_tick, poc_hits in zip(
+        unique_keys, block_starts, block_ends, block_highs, block_lows, block_opens, block_closes,
+        poc_ticks.tolist(), poc_votes.tolist()
+    ):
+        time_window = pd.Timestamp(int(key) * block_ns, tz='UTC')
+        time_window = time_window.tz_convert(ts.tz) if ts.tz is not None else time_window.tz_localize(None)
 
-        if not price_counts: poc = (block_data['High'].max() + block_data['Low'].min()) / 2
-        else: poc = max(price_counts, key=price_counts.get)
+        poc = round(poc_tick * tick, 2) if poc_hits else (block_h + block_l) / 2
 
         all_block_pocs.append(poc) # Collect POC for clustering later
 
-        total_minutes = len(block_data)
-        poc_hits = price_counts.get(poc, 0)
+        total_minutes = int(end - start)
         time_at_poc_pct = round((poc_hits / total_minutes) * 100, 1) if total_minutes > 0 else 0
 
-        block_h = block_data['High'].max()
-        block_l = block_data['Low'].min()
-        block_c = block_data['Close'].iloc[-1]
-        block_o = block_data['Open'].iloc[0]
         range_val = block_h - block_l
         
         if total_range > 0: range_ratio = range_val / total_range
@@ -718,13 +1042,14 @@ def analyze_market_context(df, ref_levels, ticker="UNKNOWN", session_start_dt=No
         block_id += 1
 
     # 3. IMPACT-BASED REJECTION SYSTEM (Rank 1 Priority)
-    ranked_rejections = detect_impact_levels(df.copy(), session_start_dt=session_start_dt)
+    # Same frame and arrays as above, so the impact pass skips re-extracting columns
+    ranked_rejections = _impact_levels(df, arrays, session_start_dt=session_start_dt)
 
     # 4. TIME-BASED ACCEPTANCE (Stacked POCs - Rank 2 Priority)
     all_block_pocs.sort()
     time_based_levels = []
     if all_block_pocs:
-        tolerance = max(0.05, df['Close'].mean() * 0.001)
+        tolerance = max(0.05, np.nanmean(arrays.closes) * 0.001)
 
         current_cluster = [all_block_pocs[0]]
         for i in range(1, len(all_block_pocs)):
@@ -789,12 +1114,16 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> float:
     l = df['Low'] if 'Low' in df.columns else df['low']
     c = df['Close'] if 'Close' in df.columns else df['close']
     
-    # Calculate True Range
-    tr1 = h - l
-    tr2 = abs(h - c.shift(1))
-    tr3 = abs(l - c.shift(1))
-    
-    tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
-    atr = tr.rolling(window=period).mean().iloc[-1]
+    # Only the last `period` true ranges feed the result, so work on that tail as plain
+    # arrays instead of concatenating three full-length Series into a frame.
+    tail = period + 1
+    h = h.to_numpy(dtype=float)[-tail:]
+    l = l.to_numpy(dtype=float)[-tail:]
+    c = c.to_numpy(dtype=float)[-tail:]
+    prev_c, h, l = c[:-1], h[1:], l[1:]
+
+    # True Range; fmax skips NaN legs like DataFrame.max(axis=1) did
+    tr = np.fmax(h - l, np.fmax(np.abs(h - prev_c), np.abs(l - prev_c)))
+    atr = tr.mean()
     
     return float(atr) if not np.isnan(atr) else 0.0
\ No newline at end of file
@@ -1,5 +1,6 @@
 import logging
 import math
+import numpy as np
 from typing import Dict, List, Optional, Tuple
 from backend.engine.processing import calculate_atr
 
@@ -71,25 +72,44 @@ class ProximityRankingEngine:
             ...
         }
         """
-        for card in cards:
-            score, l_type, l_val = self.calculate_proximity_score(
-                card.get("current_price"),
-                card.get("plan_a"),
-                card.get("plan_b"),
-                card.get("atr", 0)
-            )
-            card["proximity_score"] = score
-            card["nearest_level_type"] = l_type
-            card["nearest_level_value"] = l_val
-            
+        if not cards:
+            return []
+
+        # Vectorized pass over all cards: same rules as calculate_proximity_score,
+        # computed as whole-array ops instead of one Python call per card.
+        def _col(key):
+            return np.array([float(c.get(key) or np.nan) for c in cards], dtype=np.float64)
+
+        price = _col("current_price")
+        plan_a = _col("plan_a")
+        plan_b = _col("plan_b")
+        atr = np.nan_to_num(_col("atr"), nan=0.0)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            dist_a = np.where(np.isnan(plan_a), np.inf, np.abs(price - plan_a))
+            dist_b = np.where(np.isnan(plan_b), np.inf, np.abs(price - plan_b))
+            use_a = dist_a <= dist_b
+            nearest = np.where(use_a, dist_a, dist_b)
+            scores = np.where(atr > 0, nearest / atr, (nearest / price) * 100)
+
+        valid = ~np.isnan(price) & ~(np.isnan(plan_a) & np.isnan(plan_b))
+        scores = np.where(valid, scores, np.inf)
+
+        for i, card in enumerate(cards):
+            if valid[i]:
+                card["proximity_score"] = float(scores[i])
+                card["nearest_level_type"] = "PLAN A" if use_a[i] else "PLAN B"
+                card["nearest_level_value"] = card.get("plan_a") if use_a[i] else card.get("plan_b")
+            else:
+                card["proximity_score"] = float('inf')
+                card["nearest_level_type"] = None
+                card["nearest_level_value"] = None
+
         # Sort by proximity score (ascending, lower is better)
-        # Tie-breaker: If scores are equal, prioritize PLAN A
-        def sort_key(c):
-            # level_type priority: PLAN A (0) < PLAN B (1)
-            type_prio = 0 if c["nearest_level_type"] == "PLAN A" else 1
-            return (c["proximity_score"], type_prio)
-            
-        return sorted(cards, key=sort_key)
+        # Tie-breaker: If scores are equal, prioritize PLAN A (0) over PLAN B (1)
+        type_prio = np.where(valid & use_a, 0, 1)
+        order = np.lexsort((type_prio, scores))
+        return [cards[i] for i in order]
 
 # Global Instance
 ranking_engine = ProximityRankingEngine()
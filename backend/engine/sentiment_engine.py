@@ -5,16 +5,20 @@ from backend.engine.gemini import call_gemini_with_rotation
 from backend.engine.utils import AppLogger
 from backend.engine.key_manager import KeyManager
 
+_JSON_RE = re.compile(r"(\{.*\})", re.DOTALL)
+
+_SYS_SENTIMENT = (
+    "You are an Institutional News Analyst. Your job is to extract market sentiment from headlines.\n"
+    "Provide a score from -1.0 (Extremely Bearish) to 1.0 (Extremely Bullish) for each significant sector and the overall market.\n"
+    "Output ONLY valid JSON."
+)
+
 def analyze_headline_sentiment(headlines: str, model_name: str, key_manager: KeyManager, logger: AppLogger) -> Dict:
     """
     Rapidly analyzes a batch of headlines for sentiment and sector impact.
     Returns a structured dictionary of sentiment scores.
     """
-    system_prompt = (
-        "You are an Institutional News Analyst. Your job is to extract market sentiment from headlines.\n"
-        "Provide a score from -1.0 (Extremely Bearish) to 1.0 (Extremely Bullish) for each significant sector and the overall market.\n"
-        "Output ONLY valid JSON."
-    )
+    system_prompt = _SYS_SENTIMENT
     
     prompt = f"""
     Analyze the following headlines:
@@ -37,7 +41,7 @@ def analyze_headline_sentiment(headlines: str, model_name: str, key_manager: Key
     if resp:
         try:
             # Extract JSON from potential markdown blocks
-            clean = re.search(r"(\{.*\})", resp, re.DOTALL).group(1)
+            clean = _JSON_RE.search(resp).group(1)
             return json.loads(clean)
         except Exception as e:
             logger.error(f"Sentiment JSON Parse Error: {e}")
@@ -3,6 +3,21 @@ import json
 import os
 from datetime import datetime
 
+# The mirror is built from bare column lists, so it carries none of Turso's
+# UNIQUE constraints; these cover the ticker/date lookups the app runs locally.
+_LOCAL_INDEXES = {
+    "aw_ticker_notes": "ticker",
+    "aw_company_cards": "ticker, date",
+    "aw_economy_cards": "date",
+    "market_data": "symbol, timestamp",
+}
+
+def _ensure_local_index(conn, table):
+    cols = _LOCAL_INDEXES.get(table)
+    if cols:
+        name = "idx_" + table + "_" + "_".join(c.strip() for c in cols.split(","))
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+
 def sync_turso_to_local(turso_client, local_db_path, logger):
     """
     Downloads key tables from Turso to a local SQLite database atomically.
@@ -33,6 +48,7 @@ def sync_turso_to_local(turso_client, local_db_path, logger):
                     rs.rows
                 )
                 logger.log(f"  ✅ '{table}': {len(rs.rows)} rows.")
+            _ensure_local_index(local_conn, table)
 
         local_conn.commit()
         
@@ -53,6 +69,7 @@ def sync_turso_to_local(turso_client, local_db_path, logger):
             cols = [col for col in rs_schema.columns]
             col_defs = ", ".join([f'"{c}"' for c in cols])
             local_conn.execute(f'CREATE TABLE IF NOT EXISTS "market_data" ({col_defs})')
+            _ensure_local_index(local_conn, "market_data")
             
             # We sync the core tickers first to ensure the app works
             # Using a list derived from the 22 tickers we identified
@@ -1,4 +1,6 @@
 import pytz
+import numpy as np
+import pandas as pd
 from datetime import datetime, time as dt_time
 from typing import Optional, Union
 
@@ -6,6 +8,8 @@ US_EASTERN = pytz.timezone('US/Eastern')
 UTC = pytz.utc
 MARKET_OPEN_TIME = dt_time(9, 30)
 MARKET_CLOSE_TIME = dt_time(16, 0)
+# Minute-of-day form for vectorized masks (integer compare, no Python time objects)
+MARKET_OPEN_MINUTE = MARKET_OPEN_TIME.hour * 60 + MARKET_OPEN_TIME.minute
 
 def now_et() -> datetime:
     """Returns the current time in US/Eastern."""
@@ -50,3 +54,19 @@ def get_staleness_score(dt: datetime) -> float:
     dt_utc = to_utc(dt)
     current_utc = now_utc()
     return (current_utc - dt_utc).total_seconds() / 60.0
+
+def get_staleness_scores(timestamps) -> np.ndarray:
+    """
+    Vectorized get_staleness_score: minutes since each timestamp, in one pass.
+    Naive datetimes are read as US/Eastern (like to_utc); unparseable values become NaN.
+    """
+    values = list(timestamps)
+    if not values:
+        return np.empty(0, dtype=np.float64)
+    ts = pd.Series(pd.to_datetime(values, errors='coerce', utc=True))
+    naive = np.fromiter((isinstance(v, datetime) and v.tzinfo is None for v in values), dtype=bool, count=len(values))
+    if naive.any():
+        local = pd.DatetimeIndex([v for v, m in zip(values, naive) if m])
+        ts[naive] = local.tz_localize(US_EASTERN, ambiguous='NaT', nonexistent='NaT').tz_convert(UTC)
+    lag = (pd.Timestamp(now_utc()) - ts).dt.total_seconds() / 60.0
+    return lag.to_numpy(dtype=np.float64)
@@ -1,7 +1,13 @@
 import os
+import json
 import logging
 from datetime import datetime, timezone
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Setup standard logging
 logging.basicConfig(level=logging.INFO)
 logger_stdout = logging.getLogger("backend")
@@ -41,11 +47,26 @@ class AppLogger:
 
 from backend.engine.infisical_manager import InfisicalManager
 
-def get_turso_credentials():
+# Resolved (db_url, auth_token); only a successful lookup is kept, so a missing
+# secret is retried on the next call.
+_TURSO_CREDENTIALS = None
+
+def get_turso_credentials(refresh: bool = False):
     """
     Retrieves Turso DB credentials.
     Priority: 1. Infisical Secrets, 2. Environment Variables.
+    Resolved once per process: Streamlit pages call this on every rerun, and each
+    lookup is several Infisical round-trips. Pass refresh=True to look up again.
     """
+    global _TURSO_CREDENTIALS
+    if _TURSO_CREDENTIALS is None or refresh:
+        db_url, auth_token = _resolve_turso_credentials()
+        if not (db_url and auth_token):
+            return db_url, auth_token
+        _TURSO_CREDENTIALS = (db_url, auth_token)
+    return _TURSO_CREDENTIALS
+
+def _resolve_turso_credentials():
     try:
         # 1. Attempt Infisical Logic
         mgr = InfisicalManager()
@@ -101,3 +122,34 @@ def get_turso_credentials():
     except Exception as e:
         print(f"[ERROR] Critical Initialization Error: {e}")
         return None, None
+
+
+def dumps_json(obj, indent: bool = False) -> str:
+    """
+    Serializes prompt payloads, preferring orjson when it is installed.
+    Falls back to stdlib json for anything orjson rejects (e.g. non-str keys);
+    both paths emit raw UTF-8 rather than \\uXXXX escapes.
+    """
+    if orjson is not None:
+        try:
+            option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, option=option).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
+def encode_json(obj) -> bytes:
+    """Request bodies: orjson emits UTF-8 bytes directly, skipping the str -> bytes copy."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def loads_json(data):
+    """Parses str or bytes with orjson when available. orjson.JSONDecodeError subclasses
+    json.JSONDecodeError, so existing except clauses keep working."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
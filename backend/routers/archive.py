@@ -1,5 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from backend.services.context import context
+from backend.engine.database import get_key_action_log
+from backend.engine.utils import loads_json
 import asyncio
 import json
 import logging
@@ -30,6 +32,7 @@ def _safe_execute(query, params=None):
 @router.get("/cards/{category}")
 async def get_cards(category: str, date: str = None):
     try:
+        # Listing every archived card: orjson parse + positional unpacking per row
         if category == "economy":
             query = "SELECT date, economy_card_json FROM aw_economy_cards"
             if date:
@@ -42,8 +45,8 @@ async def get_cards(category: str, date: str = None):
             return {
                 "status": "success",
                 "data": [
-                    {"date": r[0], "economy_card_json": json.loads(r[1]) if r[1] else {}}
-                    for r in rs.rows
+                    {"date": d, "economy_card_json": loads_json(card) if card else {}}
+                    for d, card in rs.rows
                 ]
             }
         
@@ -59,8 +62,8 @@ async def get_cards(category: str, date: str = None):
             return {
                 "status": "success",
                 "data": [
-                    {"ticker": r[0], "date": r[1], "company_card_json": json.loads(r[2]) if r[2] else {}}
-                    for r in rs.rows
+                    {"ticker": t, "date": d, "company_card_json": loads_json(card) if card else {}}
+                    for t, d, card in rs.rows
                 ]
             }
             
@@ -69,10 +72,20 @@ async def get_cards(category: str, date: str = None):
         log.error(f"Archive cards error: {e}")
         return {"status": "error", "message": str(e)}
 
+@router.get("/cards/company/{ticker}/action-log")
+async def get_company_action_log(ticker: str, since: str = "", date: str = "9999-12-31"):
+    """Scrollback of a ticker's keyActionLog without shipping the full card documents."""
+    try:
+        entries = await asyncio.to_thread(get_key_action_log, context.get_db(), ticker.upper(), since, date)
+        return {"status": "success", "data": entries}
+    except Exception as e:
+        log.error(f"Archive action log error: {e}")
+        return {"status": "error", "message": str(e)}
+
 @router.post("/cards/{category}/update")
 async def update_card(category: str, card_data: dict, date: str, ticker: str = None):
     try:
-        card_json = json.dumps(card_data)
+        card_json = json.dumps(card_data, ensure_ascii=False)
         if category == "economy":
             await asyncio.to_thread(
                 _safe_execute,
@@ -13,12 +13,16 @@ import pandas as pd
 import numpy as np
 from backend.engine.time_utils import get_staleness_score
 from backend.engine.database import get_latest_economy_card_date, get_eod_economy_card, upsert_economy_card
-from backend.engine.processing import get_session_bars_routed, get_previous_session_stats
+from backend.engine.processing import get_session_bars_routed_bulk, get_previous_session_stats, get_previous_session_stats_bulk
 from backend.engine.sentiment_engine import analyze_headline_sentiment
 from backend.engine.gemini import call_gemini_with_rotation
+from backend.engine.utils import dumps_json, loads_json
 
 router = APIRouter()
 
+# Outermost JSON object in the Gemini reply (compiled once at import)
+_JSON_RE = re.compile(r"(\{.*\})", re.DOTALL)
+
 # STANDARDIZED TICKERS + DATABASE FALLBACKS
 RAW_FETCH_LIST = ["SPY", "QQQ", "NDAQ", "IWM", "PAXGUSDT", "BTCUSDT", "EURUSDT", "CL=F", "UUP", "TLT", "SMH", "^VIX", "XLF", "XLK", "XLV", "XLE", "XLI", "XLP", "XLY", "XLC", "XLU"]
 
@@ -65,7 +69,7 @@ def save_cached_card(data):
     except Exception as e:
         print(f"Cache Save Error: {e}")
 
-def analyze_macro_worker(ticker, df: pd.DataFrame, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt=None):
+def analyze_macro_worker(ticker, df: pd.DataFrame, turso, benchmark_date_str, simulation_cutoff_dt, mode, session_start_dt=None, ref_levels=None):
     try:
         from backend.engine.processing import analyze_market_context
         
@@ -74,7 +78,8 @@ def analyze_macro_worker(ticker, df: pd.DataFrame, turso, benchmark_date_str, si
         last_bar = df['timestamp'].iloc[-1]
         nat_count = df['timestamp'].isna().sum()
         
-        ref_levels = get_previous_session_stats(turso, ticker, benchmark_date_str, logger=None)
+        if ref_levels is None:
+            ref_levels = get_previous_session_stats(turso, ticker, benchmark_date_str, logger=None)
         card = analyze_market_context(df, ref_levels, ticker=ticker, session_start_dt=session_start_dt)
         
         mig_log = card.get('value_migration_log', [])
@@ -132,21 +137,15 @@ async def run_macro(request: MacroRequest, background_tasks: BackgroundTasks):
     
     await logger.info(f"📡 [1/4] INGESTION: Querying {len(RAW_FETCH_LIST)} symbols...")
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        loop = asyncio.get_event_loop()
-        fetch_tasks = []
-        for t in RAW_FETCH_LIST:
-            fetch_tasks.append(loop.run_in_executor(executor, get_session_bars_routed, turso, t, request.benchmark_date, request.simulation_cutoff, request.mode, None, request.db_fallback, True, 3, "MINUTE_5"))
-            
-        results = await asyncio.gather(*fetch_tasks)
-        for i, (df, staleness) in enumerate(results):
-            ticker = RAW_FETCH_LIST[i]
-            if df is not None and not df.empty:
-                raw_datafeeds[ticker] = df
-            elif df is not None and df.empty:
-                await logger.warn(f"   ⚠️ {ticker}: No data bars found.")
-            else:
-                await logger.error(f"   ❌ {ticker}: Fetch failure.")
+    # Capital.com per symbol in parallel; Yahoo fallbacks go out as one bulk download
+    routed = await asyncio.to_thread(get_session_bars_routed_bulk, turso, list(RAW_FETCH_LIST), request.benchmark_date, request.simulation_cutoff, request.mode, None, request.db_fallback, True, 3, "MINUTE_5")
+    for ticker, (df, staleness) in routed.items():
+        if df is not None and not df.empty:
+            raw_datafeeds[ticker] = df
+        elif df is not None and df.empty:
+            await logger.warn(f"   ⚠️ {ticker}: No data bars found.")
+        else:
+            await logger.error(f"   ❌ {ticker}: Fetch failure.")
         
     # Alias NDAQ to QQQ for AI consistency
     if "NDAQ" in raw_datafeeds and "QQQ" not in raw_datafeeds:
@@ -162,10 +161,12 @@ async def run_macro(request: MacroRequest, background_tasks: BackgroundTasks):
     analysis_results = []
     # Gemini targets
     target_list = [t for t in RAW_FETCH_LIST if t in raw_datafeeds and t != "NDAQ"]
+    # Yesterday's H/L/C for every target in one query instead of two per worker
+    ref_levels_by_ticker = await asyncio.to_thread(get_previous_session_stats_bulk, turso, target_list, request.benchmark_date)
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
         loop = asyncio.get_event_loop()
-        analysis_tasks = [loop.run_in_executor(executor, analyze_macro_worker, t, raw_datafeeds[t], turso, request.benchmark_date, cutoff_dt, request.mode, session_start_dt) for t in target_list]
+        analysis_tasks = [loop.run_in_executor(executor, analyze_macro_worker, t, raw_datafeeds[t], turso, request.benchmark_date, cutoff_dt, request.mode, session_start_dt, ref_levels_by_ticker.get(t)) for t in target_list]
         analysis_results = await asyncio.gather(*analysis_tasks)
 
     valid_results = [r for r in analysis_results if r.get('status') == "SUCCESS"]
@@ -242,8 +243,8 @@ async def run_macro(request: MacroRequest, background_tasks: BackgroundTasks):
     
     if resp:
         try:
-            clean = re.search(r"(\{.*\})", resp, re.DOTALL).group(1)
-            final_card = json.loads(clean)
+            clean = _JSON_RE.search(resp).group(1)
+            final_card = loads_json(clean)
             
             leads = len(final_card.get('sectorRotation', {}).get('leadingSectors', []))
             lags = len(final_card.get('sectorRotation', {}).get('laggingSectors', []))
@@ -254,7 +255,7 @@ async def run_macro(request: MacroRequest, background_tasks: BackgroundTasks):
             # --- PERSIST TO DB ---
             try:
                 turso = context.get_db()
-                upsert_economy_card(turso, request.benchmark_date, json.dumps(final_card))
+                upsert_economy_card(turso, request.benchmark_date, dumps_json(final_card))
             except Exception as db_err:
                 await logger.warn(f"⚠️ Failed to persist economy card to DB: {db_err}")
             # ------------------------
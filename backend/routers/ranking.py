@@ -7,9 +7,30 @@ import json
 import re
 from datetime import datetime
 from backend.engine.gemini import call_gemini_with_rotation
+from backend.engine.utils import dumps_json
 
 router = APIRouter()
 
+# Outermost JSON list in the Head Trader reply
+_JSON_LIST_RE = re.compile(r"(\[[\s\S]*\])")
+
+# Fixed Head Trader scaffolding; only the bracketed slots change per request.
+_SYS_TRADER = "You are a Head Trader."
+_ROLE_TMPL = "[ROLE]\nYou are Head Trader.\n[GLOBAL MACRO CONTEXT]\n{macro}"
+_BATCH_TMPL = "[CANDIDATE ANALYSIS - BATCH {n}]\n{batch}"
+_TASK_TMPL = "[TASK]\nRank Candidates. Return TOP 5 JSON LIST.\n**PARAMS**: context_mode={mode}, confluence={confluence}{rr}{prox}\n[JSON SCHEMA]..."
+
+def _plan_from_row(json_str, notes):
+    card_data = json.loads(json_str) if json_str else {}
+    return {
+        "narrative_note": card_data.get('marketNote', 'N/A'),
+        "strategic_bias": card_data.get('basicContext', {}).get('priceTrend', 'N/A'),
+        "full_briefing": card_data.get('screener_briefing', 'N/A'),
+        "key_levels_note": notes,
+        "planned_support": card_data.get('technicalStructure', {}).get('majorSupport', 'N/A'),
+        "planned_resistance": card_data.get('technicalStructure', {}).get('majorResistance', 'N/A')
+    }
+
 def fetch_plan_safe(client_obj, ticker):
     query = """
         SELECT cc.company_card_json, s.historical_level_notes 
@@ -20,19 +41,40 @@ def fetch_plan_safe(client_obj, ticker):
     try:
         rows = client_obj.execute(query, [ticker]).rows
         if rows and rows[0]:
-            json_str, notes = rows[0][0], rows[0][1]
-            card_data = json.loads(json_str) if json_str else {}
-            return {
-                "narrative_note": card_data.get('marketNote', 'N/A'),
-                "strategic_bias": card_data.get('basicContext', {}).get('priceTrend', 'N/A'),
-                "full_briefing": card_data.get('screener_briefing', 'N/A'),
-                "key_levels_note": notes,
-                "planned_support": card_data.get('technicalStructure', {}).get('majorSupport', 'N/A'),
-                "planned_resistance": card_data.get('technicalStructure', {}).get('majorResistance', 'N/A')
-            }
+            return _plan_from_row(rows[0][0], rows[0][1])
     except Exception: pass
     return "No Plan Found in DB"
 
+PLAN_BATCH_SIZE = 500  # Stay well under SQLite's bound-parameter limit
+
+def fetch_plans_bulk(client_obj, tickers):
+    """Fetches the latest plan for every ticker in chunked IN queries instead of one round-trip per ticker."""
+    plans = {}
+    for i in range(0, len(tickers), PLAN_BATCH_SIZE):
+        chunk = tickers[i:i + PLAN_BATCH_SIZE]
+        placeholders = ','.join(['?'] * len(chunk))
+        query = f"""
+            WITH LatestCards AS (
+                SELECT ticker, company_card_json,
+                ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) as rn
+                FROM aw_company_cards
+                WHERE ticker IN ({placeholders})
+            )
+            SELECT lc.ticker, lc.company_card_json, s.historical_level_notes
+            FROM LatestCards lc
+            LEFT JOIN aw_ticker_notes s ON lc.ticker = s.ticker
+            WHERE lc.rn = 1
+        """
+        try:
+            for row in client_obj.execute(query, chunk).rows:
+                try: plans[row[0]] = _plan_from_row(row[1], row[2])
+                except Exception: pass
+        except Exception:
+            # Batch failed (e.g. transient Turso error): fall back to per-ticker reads for this chunk
+            for tkr in chunk:
+                plans[tkr] = fetch_plan_safe(client_obj, tkr)
+    return {tkr: plans.get(tkr, "No Plan Found in DB") for tkr in tickers}
+
 @router.post("/rank", response_model=GenericResponse)
 async def run_ranking(request: RankingRequest):
     logger = BackendAppLogger(manager, task_id="ranking_synthesis")
@@ -44,9 +86,7 @@ async def run_ranking(request: RankingRequest):
     cutoff_dt_str = datetime.strptime(request.simulation_cutoff, '%Y-%m-%d %H:%M:%S').strftime('%H:%M')
     
     # 1. Gather Context
-    strategic_plans = {}
-    for tkr in request.selected_tickers:
-        strategic_plans[tkr] = fetch_plan_safe(turso, tkr)
+    strategic_plans = fetch_plans_bulk(turso, list(request.selected_tickers))
         
     macro_summary = {
         "bias": request.macro_context.get('marketBias', 'Neutral'),
@@ -84,22 +124,22 @@ async def run_ranking(request: RankingRequest):
             })
 
     # 2. Prompt Construction
-    p1 = f"[ROLE]\nYou are Head Trader.\n[GLOBAL MACRO CONTEXT]\n{json.dumps(macro_summary, indent=2)}"
-    chunks = [f"[CANDIDATE ANALYSIS - BATCH {i//3 + 1}]\n{json.dumps(context_packet[i:i+3], indent=2)}" for i in range(0, len(context_packet), 3)]
-    p2_full = "\n".join(chunks)
+    p1 = _ROLE_TMPL.format(macro=dumps_json(macro_summary, indent=True))
+    chunks = [_BATCH_TMPL.format(n=i//3 + 1, batch=dumps_json(context_packet[i:i+3], indent=True)) for i in range(0, len(context_packet), 3)]
     rr_i = "\n- **OVERRIDE: HIGH R/R**: YES." if request.prioritize_rr else ""
     prox_i = "\n- **OVERRIDE: PROXIMITY**: YES." if request.prioritize_prox else ""
     context_mode = "FULL CONTEXT" if use_full else "SCREENER BRIEFING (Token-Saving)"
-    p3 = f"[TASK]\nRank Candidates. Return TOP 5 JSON LIST.\n**PARAMS**: context_mode={context_mode}, confluence={request.confluence_mode}{rr_i}{prox_i}\n[JSON SCHEMA]..."
+    p3 = _TASK_TMPL.format(mode=context_mode, confluence=request.confluence_mode, rr=rr_i, prox=prox_i)
     
-    full_prompt = p1 + "\n" + p2_full + "\n" + p3
+    # One join over all parts: no intermediate batch string or chained concatenation
+    full_prompt = "\n".join((p1, *chunks, p3))
     
     # 3. Gemini Call
-    resp, err = call_gemini_with_rotation(full_prompt, "You are a Head Trader.", None, request.model_name, km)
+    resp, err = call_gemini_with_rotation(full_prompt, _SYS_TRADER, None, request.model_name, km)
     
     if resp:
         try:
-            match = re.search(r"(\[[\s\S]*\])", resp)
+            match = _JSON_LIST_RE.search(resp)
             recommendations = json.loads(match.group(1)) if match else json.loads(resp)
             await logger.success("Head Trader Synthesis Complete.")
             return GenericResponse(status="success", message="Ranking complete", data=recommendations)
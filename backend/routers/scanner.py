@@ -6,13 +6,17 @@ from backend.services.logger import BackendAppLogger
 from backend.services.socket_manager import manager
 from backend.services.capital_socket import capital_ws
 from backend.engine.ranking_engine import ranking_engine
-from backend.engine.database import fetch_watchlist, get_eod_card_data_for_screener
+from backend.engine.database import prefetch_scan_context
 from backend.engine.card_extractor import extract_screener_briefing
-from backend.engine.processing import get_live_bars_from_yahoo, get_live_bars_from_capital, calculate_atr, ticker_to_epic
+from backend.engine.processing import get_live_bars_from_yahoo, get_live_bars_from_yahoo_bulk, get_live_bars_from_capital, calculate_atr, ticker_to_epic
 import asyncio
+import concurrent.futures
 import json
+import pandas as pd
 from datetime import datetime
 
+_EPOCH_UTC = pd.Timestamp(0, tz='UTC')
+
 router = APIRouter()
 
 @router.post("/scan", response_model=GenericResponse)
@@ -28,12 +32,10 @@ async def run_proximity_scan(request: ScannerRequest):
     await logger.info("🚀 Initializing Proximity Engine...")
 
     turso = context.get_db()
-    watchlist = fetch_watchlist(turso, logger)
+    # 1. Fetch watchlist + card data from Turso (aw_company_cards only) in one batch
+    watchlist, db_plans = prefetch_scan_context(turso, request.benchmark_date, logger)
     if not watchlist:
         return GenericResponse(status="error", message="Watchlist is empty.")
-
-    # 1. Fetch card data from Turso (aw_company_cards only)
-    db_plans = get_eod_card_data_for_screener(turso, tuple(watchlist), request.benchmark_date, logger)
     
     # 2. Setup WebSocket (non-fatal)
     try:
@@ -43,21 +45,25 @@ async def run_proximity_scan(request: ScannerRequest):
     except Exception as e:
         await logger.warn(f"⚠️ Capital.com WS unavailable: {e}. Using historical data.")
 
-    async def process_ticker(ticker):
+    # Bars for ATR (not charting): one bulk Yahoo request for the whole watchlist, run off
+    # the event loop, instead of one blocking download per ticker inside the coroutines
+    atr_bars = await asyncio.to_thread(get_live_bars_from_yahoo_bulk, watchlist, 3, "MINUTE_5")
+    epics = {t: ticker_to_epic(t) for t in watchlist}
+
+    def process_ticker(ticker):
         try:
-            # Get bars from Yahoo Finance (fast) — only needed for ATR, not charting
-            df = get_live_bars_from_yahoo(ticker, days=3, resolution="MINUTE_5")
+            df = atr_bars.get(ticker)
             atr = calculate_atr(df) if df is not None else 0.0
             
             plan_data = db_plans.get(ticker, {})
             raw_card_json = plan_data.get("raw_card_json", "{}")
+            card = json.loads(raw_card_json) if raw_card_json and raw_card_json != "{}" else None
 
-            # Use the dedicated card_extractor for robust extraction
-            extracted = extract_screener_briefing(raw_card_json)
+            # Use the dedicated card_extractor for robust extraction (reuses the parsed card)
+            extracted = extract_screener_briefing(card or {})
 
             # Get current price from WebSocket cache or fallback to last bar
-            epic = ticker_to_epic(ticker)
-            ws_data = capital_ws.prices.get(epic, {})
+            ws_data = capital_ws.prices.get(epics[ticker], {})
             current_price = ws_data.get("mid")
             
             if not current_price and df is not None and not df.empty:
@@ -74,17 +80,25 @@ async def run_proximity_scan(request: ScannerRequest):
                 "plan_a_nature": extracted["plan_a_nature"],
                 "plan_b_nature": extracted["plan_b_nature"],
                 "setup_bias": extracted["setup_bias"],
-                "card": json.loads(raw_card_json) if raw_card_json and raw_card_json != "{}" else None,
+                "card": card,
                 "card_date": plan_data.get("card_date", "N/A")
             }
         except Exception as e:
-            await logger.error(f"Error processing {ticker}: {e}")
-            return None
-
-    # Process all tickers in parallel
-    tasks = [process_ticker(t) for t in watchlist]
-    results = await asyncio.gather(*tasks)
-    valid_results = [r for r in results if r is not None]
+            return {"ticker": ticker, "error": str(e)}
+
+    # ATR + card parsing per ticker are independent; fan them out on worker threads (map keeps
+    # watchlist order) instead of running every coroutine back-to-back on the event loop
+    def process_all():
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(8, len(watchlist)))) as executor:
+            return list(executor.map(process_ticker, watchlist))
+
+    results = await asyncio.to_thread(process_all)
+    valid_results = []
+    for r in results:
+        if "error" in r:
+            await logger.error(f"Error processing {r['ticker']}: {r['error']}")
+        else:
+            valid_results.append(r)
 
     # 3. Calculate Proximity & Rank (only for tickers with a price)
     priced_results = [r for r in valid_results if r.get("current_price")]
@@ -125,6 +139,7 @@ async def run_proximity_scan(request: ScannerRequest):
             "plan_a_nature": r.get("plan_a_nature", "UNKNOWN"),
             "plan_b_nature": r.get("plan_b_nature", "UNKNOWN"),
             "atr": r.get("atr", 0),
+            "current_price": cur_price if (has_price and cur_price) else None,
             "card_date": r.get("card_date", "N/A"),
             "prox_alert": {
                 "Ticker": ticker,
@@ -165,6 +180,20 @@ async def run_proximity_scan(request: ScannerRequest):
         }
     )
 
+def _bars_payload(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Column-wise conversion of an OHLCV frame into lightweight-charts bars (unix seconds)."""
+    ts = pd.to_datetime(df['timestamp'], utc=True, errors='coerce')
+    seconds = ((ts - _EPOCH_UTC) // pd.Timedelta(seconds=1)).fillna(0).astype('int64')
+    volume = df['Volume'].fillna(0).astype(float) if 'Volume' in df.columns else 0.0
+    return pd.DataFrame({
+        "time": seconds,
+        "open": df['Open'].astype(float),
+        "high": df['High'].astype(float),
+        "low": df['Low'].astype(float),
+        "close": df['Close'].astype(float),
+        "volume": volume,
+    }).to_dict('records')
+
 
 @router.get("/bars/{ticker}")
 async def get_chart_bars(ticker: str, days: int = 1, resolution: str = "MINUTE_5"):
@@ -180,23 +209,7 @@ async def get_chart_bars(ticker: str, days: int = 1, resolution: str = "MINUTE_5
         if df is None or df.empty:
             return GenericResponse(status="empty", message=f"No Capital.com data for {ticker}", data={"bars": []})
         
-        # Convert to JSON-serializable list of dicts
-        bars = []
-        for _, row in df.iterrows():
-            ts = row.get('timestamp')
-            # Convert timestamp to unix seconds
-            if hasattr(ts, 'timestamp'):
-                time_val = int(ts.timestamp())
-            else:
-                time_val = 0
-            bars.append({
-                "time": time_val,
-                "open": float(row['Open']),
-                "high": float(row['High']),
-                "low": float(row['Low']),
-                "close": float(row['Close']),
-                "volume": float(row.get('Volume', 0) or 0),
-            })
+        bars = _bars_payload(df)
         
         return GenericResponse(
             status="success",
@@ -220,28 +233,7 @@ async def get_yahoo_chart_bars(ticker: str, days: int = 3, resolution: str = "MI
         if df is None or df.empty:
             return GenericResponse(status="empty", message=f"No Yahoo Finance data for {ticker}", data={"bars": []})
         
-        # Convert to JSON-serializable list of dicts formatted for lightweight-charts
-        bars = []
-        for _, row in df.iterrows():
-            ts = row.get('timestamp') or row.name
-            # Convert timestamp to unix seconds
-            if hasattr(ts, 'timestamp'):
-                time_val = int(ts.timestamp())
-            else:
-                try:
-                    import pandas as pd
-                    time_val = int(pd.to_datetime(ts).timestamp())
-                except:
-                    time_val = 0
-            
-            bars.append({
-                "time": time_val,
-                "open": float(row['Open']),
-                "high": float(row['High']),
-                "low": float(row['Low']),
-                "close": float(row['Close']),
-                "volume": float(row.get('Volume', 0) or 0),
-            })
+        bars = _bars_payload(df)
         
         return GenericResponse(
             status="success",
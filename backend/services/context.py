@@ -28,7 +28,7 @@ class AppContext:
         self.turso = get_db_connection(self.db_url, self.auth_token)
         
         try:
-            self.key_manager = KeyManager(self.db_url, self.auth_token)
+            self.key_manager = KeyManager(self.db_url, self.auth_token, db_client=self.turso)
         except Exception as e:
             log.error(f"⚠️ AppContext: KeyManager init failed: {e}. Running without key management.")
             self.key_manager = None
@@ -53,7 +53,7 @@ class AppContext:
                         with open(cache_path, 'r') as f:
                             cache = json.load(f)
                         date_str = cache['timestamp'].split('T')[0]
-                        upsert_economy_card(self.turso, date_str, json.dumps(cache['data']))
+                        upsert_economy_card(self.turso, date_str, json.dumps(cache['data'], ensure_ascii=False))
                         log.info(f"✅ Migrated cached economy card to DB for {date_str}")
             except Exception as e:
                 log.warning(f"⚠️ Economy card migration skipped: {e}")
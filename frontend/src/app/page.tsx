@@ -198,10 +198,10 @@ export default function UnifiedCommandPage() {
       const atr = item.atr || 0;
       const cardDate = item.card_date || "N/A";
 
-      // Price: backend provides prox_alert.Price, or live WS price if streaming
-      const backendPrice = item.prox_alert.Price !== "N/A"
+      // Price: backend provides numeric current_price, or live WS price if streaming
+      const backendPrice = item.current_price ?? (item.prox_alert.Price !== "N/A"
         ? parseFloat(item.prox_alert.Price.replace('$', ''))
-        : null;
+        : null);
 
       let currentPrice: number | null = null;
       let currentAsk: number | null = null;
@@ -8,7 +8,7 @@ import os
 # Add parent dir to path so we can import backend.engine
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from backend.engine.processing import detect_impact_levels
+from backend.engine.processing import detect_impact_levels, _block_poc, _block_poc_ticks, _pivot_excursions, _pivot_positions
 
 class TestImpactAlgo(unittest.TestCase):
     
@@ -64,5 +64,85 @@ class TestImpactAlgo(unittest.TestCase):
         except Exception as e:
             self.fail(f"Algo crashed on NaNs: {e}")
 
+    def test_input_frame_not_modified(self):
+        """Pivot detection runs on arrays and leaves the caller's frame alone."""
+        df = pd.DataFrame({"High": [100.0, 105.0, 101.0], "Low": [99.0, 95.0, 100.0], "Close": [100.0, 100.0, 100.0]})
+        detect_impact_levels(df)
+        self.assertEqual(list(df.columns), ["High", "Low", "Close"])
+
+class TestPivotPositions(unittest.TestCase):
+
+    def test_peaks_and_valleys(self):
+        """Ties on the left count; ties on the right, NaN neighbours and edge bars do not."""
+        highs = np.array([1.0, 3.0, 3.0, 2.0, np.nan, 4.0, 1.0])
+        lows = np.array([5.0, 2.0, 2.0, 3.0, 1.0, 2.0, 2.0])
+        peaks, valleys = _pivot_positions(highs, lows)
+        self.assertEqual(peaks.tolist(), [2])  # bar 5 sits next to a NaN
+        self.assertEqual(valleys.tolist(), [2, 4])
+
+class TestPivotExcursions(unittest.TestCase):
+
+    def test_recovered_and_unrecovered_pivots(self):
+        """Excursion stops at the first bar back through the pivot; otherwise runs to the end."""
+        highs = np.array([100.0, 105.0, 103.0, 104.0, 106.0, 102.0])
+        lows = highs - 1.0
+        ts_ns = np.arange(6, dtype=np.int64) * 5 * 60 * 10**9  # 5-minute bars
+        mag, dur = _pivot_excursions(np.array([1, 4]), highs, lows, ts_ns, True, True, True)
+        self.assertAlmostEqual(mag[0], 105.0 - 102.0)  # returns above 105 at bar 4
+        self.assertAlmostEqual(dur[0], 15.0)
+        self.assertAlmostEqual(mag[1], 106.0 - 101.0)  # never returns
+        self.assertAlmostEqual(dur[1], 5.0)
+
+class TestBlockPOC(unittest.TestCase):
+
+    def test_matches_tick_walk(self):
+        """POC and hit count match the per-row $0.05 tick walk."""
+        lows = np.array([100.02, 100.10, 100.11, 99.96])
+        highs = np.array([100.18, 100.21, 100.14, 100.07])
+        counts = {}
+        for lo, hi in zip(lows, highs):
+            l, h = np.floor(lo * 20) / 20, np.ceil(hi * 20) / 20
+            for t in (np.arange(l, h + 0.05, 0.05) if h > l else [l]):
+                counts[round(t, 2)] = counts.get(round(t, 2), 0) + 1
+        poc, hits = _block_poc(lows, highs)
+        self.assertEqual(hits, max(counts.values()))
+        self.assertEqual(counts[poc], hits)
+        self.assertEqual(poc, max(counts, key=counts.get))
+
+    def test_tie_goes_to_earliest_bar(self):
+        """Tied ticks resolve like the dict walk: earliest covering bar, then lowest tick."""
+        self.assertEqual(_block_poc(np.array([101.0, 100.0]), np.array([101.0, 100.0])), (101.0, 1))
+        rng = np.random.default_rng(11)
+        for _ in range(200):
+            lows = np.round(100 + rng.integers(0, 8, 6) * 0.05, 2)
+            highs = np.round(lows + rng.integers(0, 4, 6) * 0.05, 2)
+            counts = {}
+            for lo, hi in zip(lows, highs):
+                l, h = np.floor(lo * 20) / 20, np.ceil(hi * 20) / 20
+                for t in (np.arange(l, h + 0.05, 0.05) if h > l else [l]):
+                    counts[round(t, 2)] = counts.get(round(t, 2), 0) + 1
+            poc, hits = _block_poc(lows, highs)
+            self.assertEqual(poc, max(counts, key=counts.get))
+            self.assertEqual(hits, counts[poc])
+
+    def test_all_nan_block(self):
+        """Edge Case: A block with no valid bars has no POC."""
+        self.assertEqual(_block_poc(np.array([np.nan]), np.array([np.nan])), (None, 0))
+
+    def test_all_blocks_in_one_call(self):
+        """The offset-based kernel gives each block the same POC as a single-block call."""
+        rng = np.random.default_rng(3)
+        lows = 100 + rng.random(40)
+        highs = lows + rng.random(40)
+        lows[12:15] = np.nan
+        starts, ends = np.array([0, 12, 15, 30]), np.array([12, 15, 30, 40])
+        ticks, votes = _block_poc_ticks(lows, highs, starts, ends, 0.05)
+        for b, (s, e) in enumerate(zip(starts, ends)):
+            poc, hits = _block_poc(lows[s:e], highs[s:e])
+            self.assertEqual(votes[b], hits)
+            if hits:
+                self.assertEqual(round(ticks[b] * 0.05, 2), poc)
+        self.assertEqual(votes[1], 0)
+
 if __name__ == '__main__':
     unittest.main()
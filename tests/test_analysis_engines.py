@@ -51,5 +51,16 @@ class TestAnalysisEngines(unittest.TestCase):
         self.assertIn("Narrative Clarity", system_prompt)
         self.assertIn("SPY", prompt)
 
+    def test_economy_prompt_sends_log_once_as_arc(self):
+        """Should drop keyActionLog from the anchor card and send the summarized arc instead."""
+        log = [{"date": f"2024-01-{i:02d}", "action": f"Action {i}"} for i in range(1, 21)]
+        eod_card = {"marketBias": "Bullish", "keyActionLog": log}
+        prompt, _ = generate_economy_card_prompt(eod_card, [], "", "2024-02-14", self.logger)
+        self.assertIn("### HISTORICAL MACRO ARC", prompt)
+        self.assertIn("Action 20", prompt)
+        self.assertNotIn("2024-01-05", prompt)
+        self.assertNotIn("keyActionLog", prompt)
+        self.assertIn("keyActionLog", eod_card)
+
 if __name__ == '__main__':
     unittest.main()
@@ -332,6 +332,15 @@ class TestPlanExtraction:
     def test_no_number(self):
         assert _extract_price("No level specified") is None
 
+    def test_string_briefing_single_pass(self):
+        from backend.engine.card_extractor import extract_screener_briefing
+        briefing = "Setup_Bias: Bearish\nPlan_A: Short the Resistance Rejection Setup_Bias: ignored\nPlan_A_Level: $255.84\nPlan_B_Level: 240\nPlan_B: Long Support Defense"
+        out = extract_screener_briefing({"screener_briefing": briefing})
+        assert out["plan_a_level"] == 255.84 and out["plan_b_level"] == 240.0
+        assert out["plan_a_text"] == "Short the Resistance Rejection Setup_Bias: ignored"
+        assert out["setup_bias"] == "Bearish"
+        assert (out["plan_a_nature"], out["plan_b_nature"]) == ("RESISTANCE", "SUPPORT")
+
 
 # ============================================================
 # MODULE 6: SOCKET MANAGER
@@ -441,6 +450,8 @@ class TestYahooProcessing:
         
         assert result is not None
         assert len(result) == 2, f"Expected 2 bars after dedup, got {len(result)}"
+        assert isinstance(result['source'].dtype, pd.CategoricalDtype)
+        assert result['source'].iloc[0] == 'Yahoo Finance'
 
     @patch('backend.engine.processing.yf')
     def test_yahoo_sorts_chronologically(self, mock_yf):
@@ -486,6 +497,73 @@ class TestYahooProcessing:
         
         assert result is None
 
+    @patch('backend.engine.processing.yf')
+    def test_yahoo_bulk_splits_one_download(self, mock_yf):
+        """Bulk fetch issues a single download and splits it back per ticker."""
+        from backend.engine.processing import get_live_bars_from_yahoo_bulk
+
+        dates = pd.to_datetime(['2024-01-01 10:00', '2024-01-01 10:05']).tz_localize('UTC')
+        cols = pd.MultiIndex.from_product([['AAPL', 'BTC-USD'], ['Open', 'High', 'Low', 'Close']])
+        raw = pd.DataFrame([[100, 105, 95, 102, 1, 2, 0.5, 1.5],
+                            [np.nan] * 4 + [2, 3, 1.5, 2.5]], index=dates, columns=cols)
+        raw.index.name = 'Datetime'
+        mock_yf.download.return_value = raw
+
+        bars = get_live_bars_from_yahoo_bulk(["AAPL", "BTCUSDT", "MSFT"], days=3, resolution="MINUTE_5")
+
+        assert mock_yf.download.call_count == 1
+        assert mock_yf.download.call_args[0][0] == ['AAPL', 'BTC-USD', 'MSFT']
+        assert len(bars["AAPL"]) == 1  # the all-NaN row belongs to the other symbol
+        assert list(bars["BTCUSDT"]['Close']) == [1.5, 2.5]
+        assert bars["MSFT"] is None
+
+    @patch('backend.engine.processing.yf')
+    def test_yahoo_bulk_converts_shared_index_to_utc(self, mock_yf):
+        """The exchange-tz union index is converted once; every split frame comes back in UTC."""
+        from backend.engine.processing import get_live_bars_from_yahoo_bulk
+
+        dates = pd.date_range('2024-01-02 09:30', periods=3, freq='5min', tz='America/New_York', name='Datetime')
+        cols = pd.MultiIndex.from_product([['AAPL', 'SPY'], ['Open', 'Close']])
+        mock_yf.download.return_value = pd.DataFrame(np.arange(12, dtype=float).reshape(3, 4), index=dates, columns=cols)
+
+        bars = get_live_bars_from_yahoo_bulk(["AAPL", "SPY"], days=1, resolution="MINUTE_5")
+
+        assert mock_yf.download.call_args[1]["threads"] is True
+        for t in ("AAPL", "SPY"):
+            assert str(bars[t]['timestamp'].dt.tz) == 'UTC'
+            assert bars[t]['timestamp'].iloc[0] == pd.Timestamp('2024-01-02 14:30', tz='UTC')
+
+    def test_yahoo_bulk_reshape_matches_per_symbol_slices(self):
+        """The numpy reshape split equals slicing each symbol and dropping its all-NaN rows."""
+        from backend.engine.processing import _split_yahoo_bulk_frame
+
+        dates = pd.date_range('2024-01-01 14:30', periods=6, freq='5min', tz='UTC', name='Datetime')
+        cols = pd.MultiIndex.from_product([['AAPL', 'SPY'], ['Open', 'Close', 'Volume']], names=['Ticker', 'Price'])
+        values = np.arange(36, dtype=float).reshape(6, 6)
+        values[[1, 4], :3] = np.nan
+        values[0, 3:] = np.nan
+        raw = pd.DataFrame(values, index=dates, columns=cols)
+
+        frames = _split_yahoo_bulk_frame(raw)
+        for sym in ('AAPL', 'SPY'):
+            pd.testing.assert_frame_equal(frames[sym], raw[sym].dropna(how='all'))
+        assert len(frames['AAPL']) == 4 and len(frames['SPY']) == 5
+
+    def test_routed_bulk_sends_capital_misses_to_one_yahoo_call(self):
+        """Live routing: tickers Capital.com cannot serve share a single Yahoo request."""
+        from backend.engine import processing
+        now = pd.Timestamp.now(tz='UTC').floor('min')
+        fresh = pd.DataFrame({'timestamp': [now], 'Open': [1.0], 'High': [1.0], 'Low': [1.0], 'Close': [1.0]})
+        yahoo = {"QQQ": fresh.copy(), "TLT": None}
+        with patch.object(processing, 'get_live_bars_from_capital', side_effect=lambda t, **kw: fresh.copy() if t == "SPY" else None), \
+             patch.object(processing, 'get_live_bars_from_yahoo_bulk', return_value=yahoo) as mock_bulk:
+            out = processing.get_session_bars_routed_bulk(None, ["SPY", "QQQ", "TLT"], "2024-01-02", "2024-01-02 09:00:00", mode="Live")
+
+        mock_bulk.assert_called_once()
+        assert mock_bulk.call_args[0][0] == ["QQQ", "TLT"]
+        assert out["SPY"][0] is not None and out["QQQ"][0] is not None
+        assert out["TLT"] == (None, None)
+
 class TestBarEndpointVolume:
     """Tests that bar endpoints include volume data."""
 
@@ -513,3 +591,719 @@ class TestBarEndpointVolume:
         row_none = {'Open': 100, 'High': 105, 'Low': 95, 'Close': 102, 'Volume': None}
         volume_none = float(row_none.get('Volume', 0) or 0)
         assert volume_none == 0.0
+
+
+# ============================================================
+# MODULE 8: SCREENER CARD PARSING
+# ============================================================
+from backend.engine import database as db_module
+
+
+class TestScreenerCardParsing:
+    """Tests level extraction and memoization for stored company cards."""
+
+    def _client(self, card_json):
+        client = MagicMock()
+        client.execute.return_value.rows = [("AAPL", card_json, "2025-01-02")]
+        return client
+
+    def test_text_briefing_levels(self):
+        blob = json.dumps({"screener_briefing": "**S_Levels**: [$180.5, 178]\nR-Levels: 185, 190.25"})
+        s, r = db_module._parse_levels_from_json_blob(blob, None)
+        assert s == [180.5, 178.0]
+        assert r == [185.0, 190.25]
+
+    def test_dict_briefing_levels(self):
+        blob = json.dumps({"screener_briefing": {"S_Levels": ["$180.5", "n/a"], "R_Levels": [185]}})
+        data = db_module.get_eod_card_data_for_screener(self._client(blob), ("AAPL",), "2025-01-02", None)
+        assert data["AAPL"]["s_levels"] == [180.5]
+        assert data["AAPL"]["r_levels"] == [185.0]
+
+    def test_repeat_scan_uses_cache(self):
+        db_module._parse_screener_card.cache_clear()
+        blob = json.dumps({"screener_briefing": {"S_Levels": [1], "R_Levels": [2]}})
+        client = self._client(blob)
+        db_module.get_eod_card_data_for_screener(client, ("AAPL",), "2025-01-02", None)
+        db_module.get_eod_card_data_for_screener(client, ("AAPL",), "2025-01-02", None)
+        assert db_module._parse_screener_card.cache_info().hits == 1
+
+    def test_scan_prefetch_uses_single_batch(self):
+        blob = json.dumps({"screener_briefing": {"S_Levels": [1], "R_Levels": [2]}})
+        client = MagicMock()
+        watchlist_rs, cards_rs = MagicMock(), MagicMock()
+        watchlist_rs.rows = [("AAPL",), ("MSFT",)]
+        cards_rs.rows = [("AAPL", blob, "2025-01-02")]
+        client.batch.return_value = [watchlist_rs, cards_rs]
+        watchlist, plans = db_module.prefetch_scan_context(client, "2025-01-02", None)
+        assert watchlist == ["AAPL", "MSFT"]
+        assert list(plans) == ["AAPL"]
+        client.batch.assert_called_once()
+        client.execute.assert_not_called()
+
+
+# ============================================================
+# MODULE 9: GEMINI KEY ROTATION
+# ============================================================
+from backend.engine import gemini as gemini_module
+
+
+class TestGeminiRotation:
+    """Tests that Gemini calls rotate keys on rate limits and reuse cached context."""
+
+    def test_rate_limit_rotates_without_sleeping(self):
+        km = MagicMock()
+        km.estimate_tokens.return_value = 10
+        km.get_key.side_effect = [("k1", "v1", 0, "m"), ("k2", "v2", 0, "m")]
+        limited = MagicMock(status_code=429, text="slow down")
+        ok = MagicMock(status_code=200)
+        ok.content = b'{"candidates": [{"content": {"parts": [{"text": "done"}]}}]}'
+        with patch.object(gemini_module._GEMINI_SESSION, "post", side_effect=[limited, ok]), \
+             patch.object(gemini_module.time, "sleep") as mock_sleep:
+            text, err = gemini_module.call_gemini_with_rotation("p", "sys", None, "gemini-3-flash-free", km)
+        assert text == "done" and err is None
+        km.report_failure.assert_called_once_with("v1")
+        mock_sleep.assert_not_called()
+
+    def test_detail_engine_rotates_on_429_without_backoff(self):
+        from backend.engine.analysis import detail_engine
+        km = MagicMock()
+        km.estimate_tokens.return_value = 10
+        km.get_key.side_effect = [("k1", "v1", 0, "m"), ("k2", "v2", 0, "m")]
+        limited = MagicMock(status_code=429, text="slow down")
+        ok = MagicMock(status_code=200)
+        ok.content = b'{"candidates": [{"content": {"parts": [{"text": "card"}]}}]}'
+        with patch.object(gemini_module._GEMINI_SESSION, "post", side_effect=[limited, ok]), \
+             patch.object(detail_engine.time, "sleep") as mock_sleep:
+            text = detail_engine.call_gemini_api("p", "sys", MagicMock(), "gemini-3-flash-free", km)
+        assert text == "card"
+        mock_sleep.assert_not_called()
+
+    def test_static_prompt_served_from_context_cache(self):
+        from backend.engine.analysis import detail_engine
+        detail_engine._CONTEXT_CACHE.clear()
+        km = MagicMock()
+        km.estimate_tokens.return_value = 10
+        km.get_key.return_value = ("k1", "v1", 0, "m")
+        created = MagicMock(status_code=200, content=b'{"name": "cachedContents/abc"}')
+        ok = MagicMock(status_code=200)
+        ok.content = b'{"candidates": [{"content": {"parts": [{"text": "card"}]}}]}'
+        with patch.object(gemini_module._GEMINI_SESSION, "post", side_effect=[created, ok, ok]) as mock_post:
+            for _ in range(2):
+                assert detail_engine.call_gemini_api("tickers", "sys", MagicMock(), "gemini-3-flash-free", km,
+                                                     static_prompt="masterclass") == "card"
+        urls = [c[0][0] for c in mock_post.call_args_list]
+        assert sum("cachedContents" in u for u in urls) == 1
+        body = json.loads(mock_post.call_args_list[-1][1]["data"])
+        assert body["cachedContent"] == "cachedContents/abc"
+        assert "masterclass" not in json.dumps(body) and "systemInstruction" not in body
+
+    def test_context_cache_create_runs_outside_global_lock(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        from backend.engine.analysis import detail_engine
+        detail_engine._CONTEXT_CACHE.clear()
+        lock_free = []
+
+        def create(*args, **kwargs):
+            lock_free.append(detail_engine._CONTEXT_CACHE_LOCK.acquire(blocking=False))
+            if lock_free[-1]:
+                detail_engine._CONTEXT_CACHE_LOCK.release()
+            threading.Event().wait(0.05)  # keep the create in flight while the others arrive
+            return MagicMock(status_code=200, content=b'{"name": "cachedContents/abc"}')
+
+        with patch.object(gemini_module._GEMINI_SESSION, "post", side_effect=create) as mock_post:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                names = list(pool.map(lambda _: detail_engine._cached_content_name("v1", "m", "sys", "static", MagicMock()), range(4)))
+        assert names == ["cachedContents/abc"] * 4
+        assert mock_post.call_count == 1 and lock_free == [True]
+        assert not detail_engine._CONTEXT_CACHE_PENDING
+
+    def test_streamed_reply_stops_after_json_closes(self):
+        from backend.engine.analysis import detail_engine
+        km = MagicMock()
+        km.estimate_tokens.return_value = 10
+        km.get_key.return_value = ("k1", "v1", 0, "m")
+
+        def event(text, usage=None):
+            payload = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+            if usage:
+                payload["usageMetadata"] = usage
+            return b"data: " + json.dumps(payload).encode()
+
+        # usageMetadata only arrives with the final event, after the JSON has closed
+        events = [event('{"note": "a } in'), b"", event(' text", "n": {"x": 1}}'),
+                  event("trailing chatter", {"totalTokenCount": 42})]
+        ok = MagicMock(status_code=200)
+        ok.iter_lines.return_value = iter(events)
+        with patch.object(gemini_module._GEMINI_SESSION, "post", return_value=ok) as mock_post:
+            text = detail_engine.call_gemini_api("p", "sys", MagicMock(), "gemini-3-flash-free", km, stream=True)
+        assert json.loads(text) == {"note": "a } in text", "n": {"x": 1}}
+        assert ":streamGenerateContent?alt=sse" in mock_post.call_args[0][0]
+        km.report_usage.assert_called_once_with("v1", tokens=42, model_id="m")
+        ok.close.assert_called_once()
+
+    def test_streamed_error_and_empty_replies_release_connection(self):
+        from backend.engine.analysis import detail_engine
+        km = MagicMock()
+        km.estimate_tokens.return_value = 10
+        km.get_key.return_value = ("k1", "v1", 0, "m")
+        server_error = MagicMock(status_code=503)
+        empty = MagicMock(status_code=200)
+        empty.iter_lines.return_value = iter([b""])
+        logger = MagicMock()
+        with patch.object(gemini_module._GEMINI_SESSION, "post", side_effect=[server_error, empty]), \
+             patch.object(detail_engine.time, "sleep"):
+            assert detail_engine.call_gemini_api("p", "sys", logger, "gemini-3-flash-free", km, max_retries=2, stream=True) is None
+        server_error.close.assert_called_once()
+        empty.close.assert_called_once()
+        logged = " ".join(str(c[0][0]) for c in logger.log.call_args_list)
+        assert "Empty stream" in logged and "Invalid JSON" not in logged
+
+
+# ============================================================
+# MODULE 10: DAILY LOOKUP CACHE
+# ============================================================
+class TestDailyLookupCache:
+    """Tests that slow-changing DB lookups are served from the in-process cache."""
+
+    def setup_method(self):
+        db_module.clear_query_cache()
+
+    def test_latest_economy_date_cached_per_day(self):
+        client = MagicMock()
+        client.execute.return_value.rows = [("2025-01-02",)]
+        assert db_module.get_latest_economy_card_date(client, "2025-01-03 09:00:00", None) == "2025-01-02"
+        assert db_module.get_latest_economy_card_date(client, "2025-01-03 13:30:00", None) == "2025-01-02"
+        assert client.execute.call_count == 1
+
+    def test_economy_upsert_invalidates_cache(self):
+        client = MagicMock()
+        client.execute.return_value.rows = [("2025-01-02",)]
+        db_module.get_latest_economy_card_date(client, "2025-01-03 09:00:00", None)
+        db_module.upsert_economy_card(client, "2025-01-03", "{}")
+        db_module.get_latest_economy_card_date(client, "2025-01-03 09:00:00", None)
+        assert client.execute.call_count == 3
+
+    def test_ticker_list_cached(self):
+        client = MagicMock()
+        client.execute.return_value.rows = [("AAPL",), ("MSFT",)]
+        assert db_module.get_all_tickers_from_db(client, None) == ["AAPL", "MSFT"]
+        assert db_module.get_all_tickers_from_db(client, None) == ["AAPL", "MSFT"]
+        assert client.execute.call_count == 1
+
+    def test_symbol_map_read_once_for_many_epics(self):
+        from backend.engine.processing import ticker_to_epic
+        client = MagicMock()
+        client.execute.return_value.rows = [("NVDA", "NVDA.US"), ("AMD", "AMD.US")]
+        assert ticker_to_epic("nvda", client=client) == "NVDA.US"
+        assert ticker_to_epic("AMD", client=client) == "AMD.US"
+        assert ticker_to_epic("XYZ", client=client) == "XYZ"
+        assert client.execute.call_count == 1
+
+
+# ============================================================
+# MODULE 11: HEAD TRADER PLAN FETCH
+# ============================================================
+class TestPlanBulkFetch:
+    """Tests that strategic plans for all selected tickers load in one query."""
+
+    def test_single_query_for_all_tickers(self):
+        from backend.routers.ranking import fetch_plans_bulk
+        client = MagicMock()
+        client.execute.return_value.rows = [("AAPL", json.dumps({"marketNote": "Gap up"}), "notes")]
+        plans = fetch_plans_bulk(client, ["AAPL", "MSFT"])
+        assert client.execute.call_count == 1
+        assert plans["AAPL"]["narrative_note"] == "Gap up"
+        assert plans["AAPL"]["key_levels_note"] == "notes"
+        assert plans["MSFT"] == "No Plan Found in DB"
+
+
+# ============================================================
+# MODULE 12: PROMPT SERIALIZATION
+# ============================================================
+class TestDumpsJson:
+    """Tests that prompt payloads serialize identically with or without orjson."""
+
+    def test_round_trips_nested_payload(self):
+        from backend.engine.utils import dumps_json
+        payload = {"ticker": "SPY", "levels": [101.5, 99.25], "note": "Gap ↑"}
+        assert json.loads(dumps_json(payload, indent=True)) == payload
+        assert json.loads(dumps_json(payload)) == payload
+
+    def test_falls_back_for_non_string_keys(self):
+        from backend.engine.utils import dumps_json
+        assert json.loads(dumps_json({1: "a"})) == {"1": "a"}
+
+    def test_non_ascii_kept_unescaped(self):
+        from backend.engine.utils import dumps_json
+        assert "Gap ↑" in dumps_json({"note": "Gap ↑"})
+        assert "Gap ↑" in dumps_json({1: "Gap ↑"}, indent=True)
+
+    def test_request_body_bytes_and_parse(self):
+        from backend.engine.utils import encode_json, loads_json
+        payload = {"contents": [{"parts": [{"text": "Gap ↑"}]}]}
+        body = encode_json(payload)
+        assert isinstance(body, bytes)
+        assert loads_json(body) == payload
+        with pytest.raises(json.JSONDecodeError):
+            loads_json(b"not json")
+
+
+# ============================================================
+# MODULE 13: STALENESS SCORING
+# ============================================================
+class TestStalenessScores:
+    """Tests that the vectorized staleness pass matches the per-timestamp helper."""
+
+    def test_matches_scalar_helper(self):
+        from datetime import datetime, timedelta
+        from backend.engine.time_utils import get_staleness_score, get_staleness_scores, now_utc
+        aware = now_utc() - timedelta(minutes=30)
+        naive = datetime.now() - timedelta(hours=2)
+        lags = get_staleness_scores([aware, aware - timedelta(minutes=15)])
+        assert abs(lags[0] - get_staleness_score(aware)) < 0.1
+        assert abs(lags[1] - lags[0] - 15) < 0.01
+        assert abs(get_staleness_scores([naive])[0] - get_staleness_score(naive)) < 0.1
+
+    def test_unparseable_is_nan(self):
+        import numpy as np
+        from backend.engine.time_utils import get_staleness_scores
+        assert np.isnan(get_staleness_scores([None])[0])
+        assert get_staleness_scores([]).size == 0
+
+
+# ============================================================
+# MODULE 14: SNAPSHOT COMPRESSION
+# ============================================================
+class TestSnapshotCompression:
+    """Tests that live-stats snapshots are stored compressed and read back intact."""
+
+    def test_large_text_round_trips_as_blob(self):
+        text = "SPY: Value migrated higher through 30m blocks. " * 200
+        blob = db_module.compress_snapshot_text(text)
+        assert isinstance(blob, bytes) and len(blob) < len(text) // 5
+        assert db_module.decompress_snapshot_text(blob) == text
+
+    def test_short_and_legacy_values_pass_through(self):
+        assert db_module.compress_snapshot_text("short") == "short"
+        assert db_module.decompress_snapshot_text("legacy text row") == "legacy text row"
+
+    def test_save_snapshot_writes_blob(self):
+        client = MagicMock()
+        db_module.save_snapshot(client, "news", {}, "x" * 4096, "brief", None)
+        args = client.execute.call_args[0][1]
+        assert isinstance(args[3], bytes)
+
+    def test_latest_snapshot_reads_blob_back(self):
+        client = db_module.LocalDBClient(":memory:")
+        client.execute(db_module._SCHEMA_DDL[0])
+        text = "QQQ: Acceptance above the prior high. " * 100
+        client.execute(
+            "INSERT INTO premarket_snapshots (run_timestamp, input_news_snapshot, economy_card_snapshot, live_stats_snapshot, final_briefing) VALUES (?, ?, ?, ?, ?)",
+            ("2024-02-14T08:00:00", "news", '{"marketNarrative": "risk-on"}', db_module.compress_snapshot_text(text), "brief"),
+        )
+        assert client.execute("SELECT typeof(live_stats_snapshot) FROM premarket_snapshots").rows[0][0] == "blob"
+        snap = db_module.get_latest_snapshot(client)
+        assert snap["live_stats"] == text
+        assert snap["eco_card"] == {"marketNarrative": "risk-on"}
+        client.close()
+
+
+# ============================================================
+# MODULE 15: SCHEMA BATCHING
+# ============================================================
+class TestSchemaBatch:
+    """Tests that schema setup goes to Turso in a single batch round trip."""
+
+    def test_schema_sent_in_one_batch(self):
+        client = MagicMock()
+        db_module.init_db_schema(client, None)
+        client.batch.assert_called_once()
+        assert len(client.batch.call_args[0][0]) == len(db_module._SCHEMA_DDL)
+        client.execute.assert_not_called()
+
+    def test_falls_back_to_execute_without_batch(self):
+        client = MagicMock(spec=["execute"])
+        db_module.init_db_schema(client, None)
+        assert client.execute.call_count == len(db_module._SCHEMA_DDL)
+
+
+# ============================================================
+# MODULE 16: CAPITAL PRICE PARSING
+# ============================================================
+class TestCapitalPriceParsing:
+    """Tests that Capital.com price JSON flattens into the engine's OHLCV frame."""
+
+    def test_bid_prices_flattened(self):
+        from backend.engine import capital_api
+        from datetime import datetime, timedelta
+        import pytz
+        resp = MagicMock(status_code=200)
+        resp.json.return_value = {"prices": [
+            {"snapshotTime": "2025-01-02T10:00:00", "openPrice": {"bid": 1.0, "ask": 1.1},
+             "highPrice": {"bid": 2.0}, "lowPrice": {"bid": 0.5}, "closePrice": {"bid": 1.5},
+             "lastTradedVolume": 100},
+            {"snapshotTime": "2025-01-02T10:01:00", "openPrice": {"bid": 1.5}},
+        ]}
+        end = datetime.now(pytz.utc)
+        with patch.object(capital_api, "get_retry_session") as mock_session:
+            mock_session.return_value.get.return_value = resp
+            df = capital_api.fetch_capital_data_range("AAPL", "c", "x", end - timedelta(hours=1), end, None)
+        assert list(df["Open"]) == [1.0, 1.5]
+        assert df["Volume"].iloc[0] == 100 and math.isnan(df["Close"].iloc[1])
+        assert {"timestamp", "dt_utc", "dt_eastern"} <= set(df.columns)
+        # snapshotTime is naive Bahrain time (UTC+3)
+        assert str(df["dt_utc"].iloc[0]) == "2025-01-02 07:00:00+00:00"
+
+    def test_expired_session_refreshes_and_retries(self):
+        from backend.engine import capital_api
+        from datetime import datetime, timedelta
+        import pytz
+        expired = MagicMock(status_code=401)
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = {"prices": [{"snapshotTime": "2025-01-02T10:00:00", "closePrice": {"bid": 1.5}}]}
+        end = datetime.now(pytz.utc)
+        with patch.object(capital_api, "get_retry_session") as mock_session, \
+             patch.object(capital_api, "create_capital_session_v2", return_value=("c2", "x2")) as mock_login:
+            mock_session.return_value.get.side_effect = [expired, ok]
+            df = capital_api.fetch_capital_data_range("AAPL", "c", "x", end - timedelta(hours=1), end, None)
+            second_headers = mock_session.return_value.get.call_args_list[1].kwargs["headers"]
+        mock_login.assert_called_once()
+        assert second_headers == {'X-SECURITY-TOKEN': 'x2', 'CST': 'c2'}
+        assert list(df["Close"]) == [1.5]
+
+
+# ============================================================
+# MODULE 17: CHART BAR PAYLOAD
+# ============================================================
+class TestChartBarPayload:
+    """Tests the OHLCV frame -> lightweight-charts bar conversion."""
+
+    def test_bars_match_row_conversion(self):
+        from backend.routers.scanner import _bars_payload
+        ts = pd.to_datetime(['2024-01-02 09:30', '2024-01-02 09:35']).tz_localize('US/Eastern')
+        df = pd.DataFrame({'timestamp': ts, 'Open': [1, 2], 'High': [3, 4],
+                           'Low': [0.5, 1.5], 'Close': [2, 3], 'Volume': [None, 7]})
+        bars = _bars_payload(df)
+        assert bars[0] == {"time": int(ts[0].timestamp()), "open": 1.0, "high": 3.0,
+                           "low": 0.5, "close": 2.0, "volume": 0.0}
+        assert bars[1]["volume"] == 7.0 and type(bars[1]["time"]) is int
+
+    def test_missing_volume_defaults_to_zero(self):
+        from backend.routers.scanner import _bars_payload
+        df = pd.DataFrame({'timestamp': pd.to_datetime(['2024-01-02 14:30'], utc=True),
+                           'Open': [1], 'High': [1], 'Low': [1], 'Close': [1]})
+        assert _bars_payload(df)[0]["volume"] == 0.0
+
+
+# ============================================================
+# MODULE 18: LOCAL DB CLIENT
+# ============================================================
+class TestLocalDBClient:
+    """Tests that the local sqlite mirror keeps one tuned connection open."""
+
+    def test_connection_reused_with_pragmas(self, tmp_path):
+        client = db_module.LocalDBClient(str(tmp_path / "local.db"))
+        conn = client._conn
+        client.execute("CREATE TABLE t (a INTEGER)")
+        client.execute("INSERT INTO t VALUES (?)", [7])
+        assert client.execute("SELECT a FROM t").rows == [(7,)]
+        assert client._conn is conn
+        assert client.execute("PRAGMA journal_mode").rows[0][0] == "wal"
+        client.close()
+
+
+# ============================================================
+# MODULE 19: KEY ROTATION
+# ============================================================
+class TestKeyRotation:
+    """Tests KeyManager's round-robin key hand-out without a database."""
+
+    def _manager(self, keys):
+        from collections import deque
+        import threading
+        from backend.engine.key_manager import KeyManager
+        km = KeyManager.__new__(KeyManager)
+        km.available_keys = deque(keys)
+        km._rotation_lock = threading.RLock()
+        km.cooldown_keys, km.key_failure_strikes, km.dead_keys = {}, {}, set()
+        km.key_metadata = {k: {'tier': 'free'} for k in keys}
+        km.key_to_name = {k: f"name-{k}" for k in keys}
+        km.key_to_hash = {}
+        return km
+
+    def test_keys_cycle_round_robin(self):
+        km = self._manager(["a", "b", "c"])
+        picked = [km.get_key("gemini-2.5-flash-free")[1] for _ in range(6)]
+        assert picked == ["a", "b", "c", "a", "b", "c"]
+
+    def test_concurrent_get_key_keeps_every_key(self):
+        import concurrent.futures
+        km = self._manager(["a", "b", "c", "d"])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            picked = list(executor.map(lambda _: km.get_key("gemini-2.5-flash-free")[1], range(200)))
+        assert None not in picked
+        km.report_failure("a", is_info_error=True)
+        assert sorted(km.available_keys) == ["a", "b", "c", "d"]
+
+
+# ============================================================
+# MODULE 20: PREVIOUS SESSION STATS
+# ============================================================
+class TestPreviousSessionStatsBulk:
+    """Tests the grouped previous-session query against the per-ticker lookup."""
+
+    def test_bulk_matches_single_lookups(self, tmp_path):
+        from backend.engine.processing import get_previous_session_stats, get_previous_session_stats_bulk
+        client = db_module.LocalDBClient(str(tmp_path / "md.db"))
+        client.execute("CREATE TABLE market_data (symbol TEXT, timestamp TEXT, high REAL, low REAL, close REAL)")
+        rows = [
+            ("AAPL", "2024-02-12 15:00:00", 190.0, 185.0, 188.0),
+            ("AAPL", "2024-02-13 14:00:00", 192.0, 187.0, 189.0),
+            ("AAPL", "2024-02-13 20:00:00", 191.0, 186.5, 190.5),
+            ("AAPL", "2024-02-14 14:00:00", 199.0, 195.0, 198.0),
+            ("MSFT", "2024-02-09 20:00:00", 410.0, 402.0, 405.0),
+        ]
+        for r in rows:
+            client.execute("INSERT INTO market_data VALUES (?, ?, ?, ?, ?)", list(r))
+        tickers = ["AAPL", "MSFT", "NVDA"]
+        bulk = get_previous_session_stats_bulk(client, tickers, "2024-02-14")
+        for t in tickers:
+            assert bulk[t] == get_previous_session_stats(client, t, "2024-02-14", logger=None)
+        assert bulk["AAPL"] == {"yesterday_high": 192.0, "yesterday_low": 186.5, "yesterday_close": 190.5, "date": "2024-02-13"}
+        client.close()
+
+    def test_bulk_failure_leaves_tickers_to_single_lookup(self):
+        from backend.engine.processing import get_previous_session_stats_bulk
+        client = MagicMock()
+        client.execute.side_effect = RuntimeError("turso down")
+        assert get_previous_session_stats_bulk(client, ["AAPL", "MSFT"], "2024-02-14").get("AAPL") is None
+
+
+# ============================================================
+# MODULE 21: PAST-SESSION BAR CACHE
+# ============================================================
+class TestSessionBarCache:
+    """Tests that finished sessions are served from the parquet cache."""
+
+    def _client(self, tmp_path):
+        client = db_module.LocalDBClient(str(tmp_path / "bars.db"))
+        client.execute("CREATE TABLE market_data (symbol TEXT, timestamp TEXT, open REAL, high REAL, low REAL, close REAL, volume REAL, session TEXT)")
+        for i, ts in enumerate(["2024-02-13 09:00:00", "2024-02-13 09:05:00"]):
+            client.execute("INSERT INTO market_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ["SPY", ts, 1.0 + i, 2.0 + i, 0.5 + i, 1.5 + i, 100, "PRE"])
+        return client
+
+    def test_past_day_read_back_from_disk(self, tmp_path, monkeypatch):
+        pytest.importorskip("pyarrow")
+        from backend.engine import processing
+        monkeypatch.setattr(processing, "BARS_CACHE_DIR", str(tmp_path / "cache"))
+        client = self._client(tmp_path)
+        first = processing.get_session_bars_from_db(client, "SPY", "2024-02-13", "2024-02-13 23:59:59", MagicMock())
+        client.execute("DELETE FROM market_data")
+        second = processing.get_session_bars_from_db(client, "SPY", "2024-02-13", "2024-02-13 23:59:59", MagicMock())
+        pd.testing.assert_frame_equal(first, second)
+        client.close()
+
+    def test_today_is_not_cached(self, tmp_path, monkeypatch):
+        from backend.engine import processing
+        monkeypatch.setattr(processing, "BARS_CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(processing, "_PARQUET_AVAILABLE", True)
+        today = processing.now_et().date().isoformat()
+        assert processing._bars_cache_path("SPY", today, f"{today} 23:59:59", True) is None
+        assert processing._bars_cache_path("SPY", "2024-02-13", "2024-02-13 23:59:59", True) is not None
+
+    def test_unsettled_day_and_early_entries_are_not_trusted(self, tmp_path, monkeypatch):
+        pytest.importorskip("pyarrow")
+        import os
+        from datetime import datetime
+        from backend.engine import processing
+        monkeypatch.setattr(processing, "BARS_CACHE_DIR", str(tmp_path / "cache"))
+        args = ("SPY", "2024-02-13", "2024-02-13 23:59:59", True)
+        monkeypatch.setattr(processing, "now_et", lambda: processing.US_EASTERN.localize(datetime(2024, 2, 14, 8, 0)))
+        assert processing._bars_cache_path(*args) is None  # bars may still be syncing
+        monkeypatch.setattr(processing, "now_et", lambda: processing.US_EASTERN.localize(datetime(2024, 2, 14, 13, 0)))
+        path = processing._bars_cache_path(*args)
+        processing._write_cached_bars(path, pd.DataFrame({"Close": [1.0]}), "SPY")
+        assert processing._read_cached_bars(path, "2024-02-13") is not None
+        early = processing._bars_settled_at("2024-02-13").timestamp() - 60
+        os.utime(path, (early, early))
+        assert processing._read_cached_bars(path, "2024-02-13") is None
+
+    def test_bulk_read_matches_single_reads(self, tmp_path, monkeypatch):
+        from backend.engine import processing
+        monkeypatch.setattr(processing, "BARS_CACHE_DIR", "")
+        client = self._client(tmp_path)
+        client.execute("INSERT INTO market_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)", ["QQQ", "2024-02-13 09:10:00", 5.0, 6.0, 4.0, 5.5, 10, "PRE"])
+        args = ("2024-02-13", "2024-02-13 23:59:59")
+        bulk = processing.get_session_bars_from_db_bulk(client, ["SPY", "QQQ", "TLT"], *args)
+        for sym in ("SPY", "QQQ"):
+            pd.testing.assert_frame_equal(bulk[sym], processing.get_session_bars_from_db(client, sym, *args, MagicMock()))
+        assert bulk["TLT"] is None
+        client.close()
+
+    def test_premarket_cut_at_open_to_the_second(self):
+        from backend.engine import processing
+        rows = [(ts, 1.0, 1.0, 1.0, 1.0, 1, "PRE") for ts in
+                ["2024-02-13 14:29:00", "2024-02-13 14:29:59", "2024-02-13 14:30:00", "2024-02-13 14:30:30"]]
+        df = processing._shape_session_bars(rows, premarket_only=True)
+        assert [t.strftime("%H:%M:%S") for t in df['dt_eastern']] == ["09:29:00", "09:29:59"]
+        assert list(df.index) == [0, 1]
+
+
+# ============================================================
+# MODULE 22: SHARED TURSO CLIENT
+# ============================================================
+class TestSharedTursoClient:
+    """Tests that remote clients are pooled once per credential pair."""
+
+    def test_client_reused_until_refresh(self, monkeypatch):
+        monkeypatch.setattr(db_module, "_REMOTE_CLIENTS", {})
+        created = []
+        monkeypatch.setattr(db_module, "create_client_sync", lambda url, auth_token: created.append(url) or object())
+        first = db_module.get_db_connection("https://a.turso.io", "tok")
+        assert db_module.get_db_connection("https://a.turso.io", "tok") is first
+        assert db_module.get_db_connection("https://b.turso.io", "tok") is not first
+        fresh = db_module.get_db_connection("https://a.turso.io", "tok", refresh=True)
+        assert fresh is not first
+        assert db_module.get_db_connection("https://a.turso.io", "tok") is fresh
+        assert created == ["https://a.turso.io", "https://b.turso.io", "https://a.turso.io"]
+
+    def test_refresh_closes_replaced_pool(self, monkeypatch):
+        monkeypatch.setattr(db_module, "_REMOTE_CLIENTS", {})
+        old_client = MagicMock()
+        clients = iter([old_client, MagicMock()])
+        monkeypatch.setattr(db_module, "create_client_sync", lambda url, auth_token: next(clients))
+        first = db_module.get_db_connection("https://a.turso.io", "tok")
+        fresh = db_module.get_db_connection("https://a.turso.io", "tok", refresh=True)
+        assert fresh is not first
+        old_client.close.assert_called_once()
+
+    def test_closed_pool_closes_clients_on_return(self):
+        client = MagicMock()
+        pool = db_module.ClientPool(MagicMock(), 2, client)
+        with pool.checkout() as held:
+            pool.close()
+            client.close.assert_not_called()
+        held.close.assert_called_once()
+
+    def test_pool_reuses_idle_clients_and_bounds_growth(self):
+        import threading
+        made = []
+
+        class FakeClient:
+            def __init__(self):
+                made.append(self)
+
+            def execute(self, stmt, args=None):
+                return stmt
+
+        pool = db_module.ClientPool(FakeClient, 2)
+        assert pool.execute("a") == "a" and pool.execute("b") == "b"
+        assert len(made) == 1  # sequential queries share the one idle client
+
+        done = threading.Event()
+        with pool.checkout() as a, pool.checkout() as b:
+            assert a is not b
+            waiter = threading.Thread(target=lambda: pool.execute("c") and done.set())
+            waiter.start()
+            assert not done.wait(0.05)  # both clients busy and the pool is full
+        waiter.join(1)
+        assert done.is_set() and len(made) == 2
+
+    def test_key_manager_uses_injected_client(self, tmp_path):
+        from backend.engine import key_manager as km_module
+        client = db_module.LocalDBClient(str(tmp_path / "keys.db"))
+        with patch.object(km_module, "get_db_connection", side_effect=AssertionError("opened a second client")):
+            km = km_module.KeyManager("https://a.turso.io", "tok", db_client=client)
+        assert km.db_client is client
+        client.close()
+
+
+# ============================================================
+# MODULE 23: SINGLE-TRIP CARD UPSERTS
+# ============================================================
+class _BatchingLocalClient(db_module.LocalDBClient):
+    """LocalDBClient with libsql's batch() so the remote-only write paths run on sqlite."""
+
+    def batch(self, stmts):
+        return [self.execute(sql, args) for sql, args in stmts]
+
+
+class TestCardUpserts:
+    """Tests that the card upserts insert once and overwrite on re-save."""
+
+    def _client(self, tmp_path):
+        client = _BatchingLocalClient(str(tmp_path / "cards.db"))
+        for ddl in db_module._SCHEMA_DDL:
+            client.execute(ddl)
+        return client
+
+    def test_company_and_economy_cards_overwrite(self, tmp_path, monkeypatch):
+        client = self._client(tmp_path)
+        monkeypatch.setattr(db_module, "LocalDBClient", type(None))
+        for body in ("{}", '{"v": 2}'):
+            assert db_module.upsert_company_card(client, "AAPL", "2025-01-03", body)
+            assert db_module.upsert_economy_card(client, "2025-01-03", body)
+        assert client.execute("SELECT ticker, company_card_json FROM aw_company_cards").rows == [("AAPL", '{"v": 2}')]
+        assert client.execute("SELECT date, economy_card_json FROM aw_economy_cards").rows == [("2025-01-03", '{"v": 2}')]
+        client.close()
+
+    def test_live_card_updates_latest_row(self, tmp_path, monkeypatch):
+        client = self._client(tmp_path)
+        monkeypatch.setattr(db_module, "LocalDBClient", type(None))
+        assert db_module.upsert_live_card(client, "AAPL", "2025-01-03", "first")
+        assert db_module.upsert_live_card(client, "AAPL", "2025-01-03", "second")
+        assert db_module.upsert_live_card(client, "MSFT", "2025-01-03", "other")
+        rows = client.execute("SELECT ticker, card_json FROM deep_dive_cards ORDER BY id").rows
+        assert rows == [("AAPL", "second"), ("MSFT", "other")]
+        client.close()
+
+    def test_key_action_log_read_column_wise(self, tmp_path):
+        client = self._client(tmp_path)
+        log = [{"date": f"2025-01-0{d}", "action": f"day {d}"} for d in range(1, 4)]
+        client.execute("INSERT INTO aw_company_cards (ticker, date, company_card_json) VALUES (?, ?, ?)",
+                       ["AAPL", "2025-01-02", json.dumps({"technicalStructure": {"keyActionLog": log[:2]}})])
+        client.execute("INSERT INTO aw_company_cards (ticker, date, company_card_json) VALUES (?, ?, ?)",
+                       ["AAPL", "2025-01-03", json.dumps({"technicalStructure": {"keyActionLog": log}})])
+        assert db_module.get_key_action_log(client, "AAPL") == log
+        assert db_module.get_key_action_log(client, "AAPL", since_date="2025-01-02") == log[1:]
+        assert db_module.get_key_action_log(client, "AAPL", as_of="2025-01-02") == log[:2]
+        assert db_module.get_key_action_log(client, "MSFT") == []
+        client.close()
+
+
+# ============================================================
+# MODULE 24: LOCAL MIRROR INDEXES
+# ============================================================
+from backend.engine import sync_engine
+
+
+class TestLocalMirrorIndexes:
+    """Tests that the sqlite mirror gets indexes for the ticker/date lookups."""
+
+    def test_sync_indexes_card_and_bar_tables(self, tmp_path):
+        def result(cols, rows=()):
+            return MagicMock(columns=cols, rows=list(rows))
+
+        def execute(sql, args=None):
+            if "aw_company_cards" in sql:
+                return result(["ticker", "date", "company_card_json"], [("AAPL", "2025-01-03", "{}")])
+            if "market_data" in sql:
+                return result(["symbol", "timestamp", "close"])
+            return result(["ticker", "date"])
+
+        turso = MagicMock()
+        turso.execute.side_effect = execute
+        db_path = str(tmp_path / "mirror.db")
+        assert sync_engine.sync_turso_to_local(turso, db_path, MagicMock())
+
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT company_card_json FROM aw_company_cards "
+            "WHERE ticker = ? AND date < ? ORDER BY date DESC LIMIT 1", ("AAPL", "2025-02-01")
+        ).fetchall()
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        assert "idx_aw_company_cards_ticker_date" in " ".join(str(r) for r in plan)
+        assert "idx_market_data_symbol_timestamp" in names
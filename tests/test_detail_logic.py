@@ -59,5 +59,131 @@ class TestDetailEngine(unittest.TestCase):
             self.assertEqual(log[-1]['action'], "New price action summary")
             self.assertEqual(log[-1]['date'], "2024-02-14")
 
+    def test_same_day_rerun_overwrites_log_entry(self):
+        """Should overwrite, not duplicate, a log entry for the same date."""
+        prev_card = {
+            "basicContext": {"tickerDate": "AAPL | 2024-02-14"},
+            "technicalStructure": {"keyActionLog": [
+                {"date": "2024-02-13", "action": "Day one"},
+                {"date": "2024-02-14", "action": "First run"},
+            ]}
+        }
+        with patch('backend.engine.analysis.detail_engine.call_gemini_api') as mock_api:
+            mock_api.return_value = json.dumps({"todaysAction": "Second run"})
+            result = json.loads(detail_engine.update_company_card(
+                ticker="AAPL",
+                previous_card_json=json.dumps(prev_card),
+                previous_card_date="2024-02-14",
+                historical_notes="",
+                new_eod_summary="",
+                new_eod_date=date(2024, 2, 14),
+                model_name="gemini-2.0-flash",
+                key_manager=MagicMock(),
+                pre_fetched_context="{}",
+                market_context_summary="",
+                logger=MagicMock(),
+            ))
+        log = result['technicalStructure']['keyActionLog']
+        self.assertEqual([e['action'] for e in log], ["Day one", "Second run"])
+
+    def test_batch_update_splits_reply_and_falls_back(self):
+        """Should fill cards from one batched reply and retry missing tickers singly."""
+        batched = json.dumps({"AAPL": {"todaysAction": "Batched action"}})
+        single = json.dumps({"todaysAction": "Single action"})
+        prev = json.dumps({"basicContext": {"tickerDate": ""}, "technicalStructure": {"keyActionLog": []}})
+        payloads = {
+            "AAPL": {"previous_card": prev, "impact_context": "{}"},
+            "MSFT": {"previous_card": prev, "impact_context": "{}"},
+        }
+        with patch('backend.engine.analysis.detail_engine.call_gemini_api') as mock_api:
+            mock_api.side_effect = [batched, single]
+            results = detail_engine.update_company_cards_batch(
+                payloads, date(2024, 2, 14), "gemini-2.0-flash", MagicMock(), "Bullish news"
+            )
+        self.assertEqual(mock_api.call_count, 2)
+        batch_prompt = mock_api.call_args_list[0][0][0]
+        self.assertIn("TICKER: AAPL", batch_prompt)
+        self.assertIn("TICKER: MSFT", batch_prompt)
+        self.assertEqual(batch_prompt.count("Bullish news"), 1)
+        self.assertEqual(mock_api.call_args_list[0][1]["generation_config"],
+                         {"responseMimeType": "application/json", "maxOutputTokens": 2 * detail_engine._CARD_OUTPUT_TOKENS})
+        self.assertIn("MASTERCLASS", mock_api.call_args_list[0][1]["static_prompt"])
+        self.assertNotIn("MASTERCLASS", batch_prompt)
+        aapl = results["AAPL"]
+        msft = results["MSFT"]
+        self.assertEqual(aapl['technicalStructure']['keyActionLog'][-1]['action'], "Batched action")
+        self.assertEqual(aapl['basicContext']['tickerDate'], "AAPL | 2024-02-14")
+        self.assertEqual(msft['technicalStructure']['keyActionLog'][-1]['action'], "Single action")
+
+    def test_batch_logs_rejected_cards_apart_from_missing_ones(self):
+        """Should tell a card that failed validation from a ticker the reply left out."""
+        prev = json.dumps({"basicContext": {"tickerDate": ""}, "technicalStructure": {"keyActionLog": []}})
+        payloads = {t: {"previous_card": prev, "impact_context": "{}"} for t in ("AAPL", "MSFT")}
+        logger = MagicMock()
+        with patch('backend.engine.analysis.detail_engine.call_gemini_api') as mock_api:
+            mock_api.side_effect = [json.dumps({"AAPL": {"marketNote": "no action"}}), None, None]
+            detail_engine.update_company_cards_batch(payloads, date(2024, 2, 14), "gemini-2.0-flash", MagicMock(), "", logger=logger)
+        logged = [c[0][0] for c in logger.log.call_args_list]
+        self.assertTrue(any("AAPL's batched card failed validation" in m for m in logged))
+        self.assertTrue(any("MSFT missing from batched reply" in m for m in logged))
+        self.assertFalse(any("AAPL missing" in m for m in logged))
+
+    def test_batch_split_to_fit_output_budget(self):
+        """Should split a batch larger than one reply's output budget into several requests."""
+        per_request = detail_engine._BATCH_OUTPUT_TOKEN_CAP // detail_engine._CARD_OUTPUT_TOKENS
+        tickers = [f"T{i}" for i in range(per_request + 1)]
+        prev = json.dumps({"basicContext": {"tickerDate": ""}, "technicalStructure": {"keyActionLog": []}})
+        payloads = {t: {"previous_card": prev, "impact_context": "{}"} for t in tickers}
+        with patch('backend.engine.analysis.detail_engine.call_gemini_api') as mock_api:
+            mock_api.side_effect = lambda prompt, *a, **k: json.dumps(
+                {t: {"todaysAction": t} for t in tickers if f"TICKER: {t} " in prompt})
+            results = detail_engine.update_company_cards_batch(payloads, date(2024, 2, 14), "gemini-2.0-flash", MagicMock(), "")
+        self.assertEqual(mock_api.call_count, 2)
+        self.assertEqual([results[t]['technicalStructure']['keyActionLog'][-1]['action'] for t in tickers], tickers)
+
+    def test_previous_card_text_is_memoized(self):
+        """Should serialize an unchanged previous card only once across re-runs."""
+        detail_engine._previous_card_text.cache_clear()
+        blob = json.dumps({"marketNote": "Old Note"})
+        first = detail_engine._previous_card_text(blob)
+        self.assertIs(detail_engine._previous_card_text(blob), first)
+        self.assertEqual(detail_engine._previous_card_text.cache_info().hits, 1)
+        self.assertEqual(json.loads(first), {"marketNote": "Old Note"})
+
+    def test_prompt_drops_full_log_from_previous_card(self):
+        """Should send only the trimmed recent log, not the card's whole keyActionLog."""
+        log = [{"date": f"2024-01-{d:02d}", "action": f"day {d} " + "x" * 1000} for d in range(1, 21)]
+        prev_card = {"basicContext": {"tickerDate": ""}, "technicalStructure": {"pattern": "Chop", "keyActionLog": log}}
+        _, slots = detail_engine.build_ticker_payload("AAPL", json.dumps(prev_card), "", "{}", MagicMock())
+        card_view = json.loads(slots["previous_card_json"])
+        self.assertEqual(card_view["technicalStructure"], {"pattern": "Chop"})
+        recent = json.loads(slots["recent_log_json"])
+        self.assertEqual([e["date"] for e in recent], [f"2024-01-{d}" for d in range(16, 21)])
+        self.assertTrue(all(len(e["action"]) == detail_engine._LOG_ACTION_MAX_CHARS for e in recent))
+
+    def test_default_company_card_is_fresh_copy(self):
+        """Should match the templated default and never share nested state between calls."""
+        expected = json.loads(detail_engine.DEFAULT_COMPANY_OVERVIEW_JSON.replace("TICKER", "AAPL"), strict=False)
+        card = detail_engine.default_company_card("AAPL")
+        self.assertEqual(card, expected)
+        card["technicalStructure"]["keyActionLog"].append({"date": "2024-01-01"})
+        self.assertEqual(detail_engine.default_company_card("MSFT")["technicalStructure"]["keyActionLog"], [])
+
+    def test_deep_update_merges_nested(self):
+        """Should merge nested dicts and overwrite non-dict leaves."""
+        dst = {"a": {"b": 1, "c": {"d": 2}}, "e": [1]}
+        src = {"a": {"c": {"d": 3, "f": 4}}, "e": [2], "g": 5}
+        result = detail_engine.deep_update(dst, src)
+        self.assertIs(result, dst)
+        self.assertEqual(result, {"a": {"b": 1, "c": {"d": 3, "f": 4}}, "e": [2], "g": 5})
+
+    def test_deep_update_does_not_alias_src(self):
+        """Should copy new nested dicts rather than storing the src subtree itself."""
+        dst = {"a": 1}
+        src = {"plan": {"levels": {"support": 10}}}
+        detail_engine.deep_update(dst, src)
+        src["plan"]["levels"]["support"] = 99
+        self.assertEqual(dst["plan"], {"levels": {"support": 10}})
+
 if __name__ == '__main__':
     unittest.main()
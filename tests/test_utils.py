@@ -12,5 +12,28 @@ class TestAppLogger(unittest.TestCase):
         self.assertEqual(len(logger.log_messages), 1)
         self.assertIn("test message", logger.log_messages[0])
 
+    def test_each_line_printed_immediately(self):
+        from unittest.mock import patch
+        logger = AppLogger(None)
+        with patch("builtins.print") as mock_print:
+            logger.log("first")
+            logger.error("boom")
+        self.assertEqual(mock_print.call_count, 2)
+        self.assertIn("❌ boom", mock_print.call_args[0][0])
+
+class TestTursoCredentials(unittest.TestCase):
+    def test_success_cached_failure_retried(self):
+        from unittest.mock import patch
+        import backend.engine.utils as utils
+        utils._TURSO_CREDENTIALS = None
+        try:
+            with patch.object(utils, "_resolve_turso_credentials", side_effect=[(None, None), ("https://db", "tok")]) as mock_resolve:
+                self.assertEqual(utils.get_turso_credentials(), (None, None))
+                self.assertEqual(utils.get_turso_credentials(), ("https://db", "tok"))
+                self.assertEqual(utils.get_turso_credentials(), ("https://db", "tok"))
+            self.assertEqual(mock_resolve.call_count, 2)
+        finally:
+            utils._TURSO_CREDENTIALS = None
+
 if __name__ == '__main__':
     unittest.main()